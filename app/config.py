@@ -1,5 +1,5 @@
 from __future__ import annotations
-import pathlib, yaml
+import os, pathlib, yaml
 from functools import lru_cache
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -24,6 +24,8 @@ class IMAPSettings(BaseModel):
     password: str = ""
     mailbox: str = "INBOX"
     two_factor: str = "none"  # none|app_password
+    ssl: bool = True
+    max_attachment_mb: int = 50  # fetch_mail_attachments: больше — не скачиваем
 
 class SchedulerSettings(BaseModel):
     interval_minutes: int = 60
@@ -38,7 +40,8 @@ class Settings(BaseSettings):
 
 def load_yaml_config() -> dict:
     here = pathlib.Path(__file__).resolve().parent.parent
-    config_path = here / ".." / "config.yaml"
+    # INLAB_CONFIG — как у скриптов импорта (например, конфиг на локальную заглушку IMAP)
+    config_path = pathlib.Path(os.getenv("INLAB_CONFIG") or here / ".." / "config.yaml")
     if config_path.is_file():
         with config_path.open("r", encoding="utf-8") as f:
             return yaml.safe_load(f) or {}
@@ -47,4 +50,4 @@ def load_yaml_config() -> dict:
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
     initial = load_yaml_config()
-    return Settings.model_validate(initial)
+    return Settings.model_validate(initial)
@@ -1,25 +1,143 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 APP_LOG = LOG_DIR / "app.log"
+JSON_LOG = LOG_DIR / "app.jsonl"
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Добавляет в запись request_id и route текущего запроса (из perf).
+    Висит на QueueHandler — то есть выполняется в потоке запроса, пока
+    ContextVar ещё виден; писатель работает уже в своём потоке.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        from app.services import perf
+
+        t = perf.current()
+        record.request_id = t.request_id if t is not None else ""
+        record.route = f"{t.method} {t.route_name()}" if t is not None else ""
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Одна запись — одна JSON-строка (для grep/jq и сборщиков логов).
+    Traceback уже внутри msg: QueueHandler.prepare() форматирует его заранее.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", "")
+        if rid:
+            out["request_id"] = rid
+            out["route"] = getattr(record, "route", "")
+        return json.dumps(out, ensure_ascii=False)
+
+
+def _logging_config() -> Dict[str, Any]:
+    try:
+        from app.services import config_store
+        return config_store.snapshot().section("logging")
+    except Exception:
+        return {}
+
+
+def _level(value: Any, default: int, where: str = "", bad: Optional[List[str]] = None) -> int:
+    """Имя или число уровня; неизвестное имя («verbose», опечатка) -> ``default`` и запись в ``bad``."""
+    if isinstance(value, int):
+        return value
+    if not value:
+        return default
+    lv = logging.getLevelName(str(value).upper())      # на неизвестное — строка «Level X»
+    if isinstance(lv, int):
+        return lv
+    if bad is not None:
+        bad.append(f"unknown log level {value!r} for {where or 'root'}, using {logging.getLevelName(default)}")
+    return default
+
+
+def setup_logging(level: Optional[int] = None) -> None:
+    """
+    Корневой логгер -> QueueHandler (в потоке запроса только постановка в
+    очередь) -> QueueListener с отдельным потоком-писателем: app.log
+    (ротация 5MB × 5), консоль и, если включено, app.jsonl.
+
+    config.yaml::
+
+        logging:
+          level: INFO            # или ENV LOG_LEVEL; по умолчанию DEBUG
+          json: true             # или ENV LOG_JSON=1 — дублировать в logs/app.jsonl
+          levels:                # уровни отдельных логгеров
+            sqlalchemy.engine: WARNING
+            app.routers.bookings: INFO
+    """
+    global _listener
+    cfg = _logging_config()
+    bad: List[str] = []           # предупреждения — после установки хендлеров, чтобы попали в app.log
+    if level is None:
+        level = _level(os.getenv("LOG_LEVEL") or cfg.get("level"), logging.DEBUG, "LOG_LEVEL / logging.level", bad)
+    want_json = str(os.getenv("LOG_JSON") or cfg.get("json") or "").lower() in ("1", "true", "yes", "on")
 
-def setup_logging(level=logging.DEBUG) -> None:
-    fmt = logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
     root = logging.getLogger()
     root.setLevel(level)
 
-    # убрать старые хендлеры (важно при --reload)
+    # убрать старые хендлеры и остановить прежний писатель (важно при --reload)
     for h in list(root.handlers):
         root.removeHandler(h)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    fmt = logging.Formatter(TEXT_FORMAT)
+    handlers = []
 
     fh = RotatingFileHandler(APP_LOG, maxBytes=5*1024*1024, backupCount=5, encoding="utf-8")
-    fh.setFormatter(fmt); fh.setLevel(level); root.addHandler(fh)
+    fh.setFormatter(fmt); fh.setLevel(level); handlers.append(fh)
 
     ch = logging.StreamHandler()
-    ch.setFormatter(fmt); ch.setLevel(level); root.addHandler(ch)
+    ch.setFormatter(fmt); ch.setLevel(level); handlers.append(ch)
+
+    if want_json:
+        jh = RotatingFileHandler(JSON_LOG, maxBytes=5*1024*1024, backupCount=5, encoding="utf-8")
+        jh.setFormatter(JsonLinesFormatter()); jh.setLevel(level); handlers.append(jh)
+
+    q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    qh = QueueHandler(q)
+    qh.addFilter(RequestContextFilter())
+    root.addHandler(qh)
+
+    _listener = QueueListener(q, *handlers, respect_handler_level=True)
+    _listener.start()
 
     for name in ("uvicorn", "uvicorn.error", "uvicorn.access", "fastapi"):
-        logging.getLogger(name).setLevel(level)
+        logging.getLogger(name).setLevel(level)
+    for name, lv in (cfg.get("levels") or {}).items():
+        logging.getLogger(name).setLevel(_level(lv, level, f"logging.levels.{name}", bad))
+    for msg in bad:
+        logging.getLogger("app").warning(msg)
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    # дописать очередь до выхода процесса
+    if _listener is not None:
+        _listener.stop()
@@ -5,7 +5,7 @@ from typing import Dict, Any
 from fastapi import APIRouter, Depends, Form, HTTPException, Request
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
 
-from auth import get_db, require_module, templates as auth_templates
+from auth import bump_auth_version, get_db, require_module, templates as auth_templates
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -97,6 +97,7 @@ def create_user(
             (login, password_hash, password, role_id),
         )
         db.commit()
+        bump_auth_version()
     except sqlite3.IntegrityError:
         # логин уже существует — молча игнорируем и возвращаемся на список
         pass
@@ -114,6 +115,7 @@ def change_user_role(
 ):
     db.execute("UPDATE users SET role_id = ? WHERE id = ?", (role_id, user_id))
     db.commit()
+    bump_auth_version()
     return RedirectResponse(url="/admin/users", status_code=303)
 
 
@@ -132,6 +134,7 @@ def toggle_user_active(
     new_value = 0 if row["is_active"] else 1
     db.execute("UPDATE users SET is_active = ? WHERE id = ?", (new_value, user_id))
     db.commit()
+    bump_auth_version()
     return RedirectResponse(url="/admin/users", status_code=303)
 
 
@@ -149,6 +152,7 @@ def change_user_password(
         (password_hash, password, user_id),
     )
     db.commit()
+    bump_auth_version()
     return RedirectResponse(url="/admin/users", status_code=303)
 
 
@@ -204,5 +208,6 @@ def toggle_permission(
         )
 
     db.commit()
+    bump_auth_version()
     # htmx сам уже переключил состояние чекбокса в DOM, разметку перерисовывать не нужно
     return Response(status_code=204)
@@ -6,6 +6,8 @@ import sqlite3, io, pandas as pd, json
 from pathlib import Path
 import os, re, time
 
+from app.services.ru_locale import to_date_iso, to_float, to_share
+
 
 router = APIRouter(prefix="/bookings", tags=["bookings"])
 templates = Jinja2Templates(directory="app/templates")
@@ -218,12 +220,6 @@ def list_bookings(request: Request, q: str = "", sort: str = "id", dir: str = "d
         "SELECT DISTINCT sales_manager FROM bookings WHERE sales_manager IS NOT NULL AND TRIM(sales_manager)!='' ORDER BY sales_manager"
     ).fetchall()]
 
-    # быстрый dbg (оставь, если удобно)
-    if rows:
-        sample = dict(rows[0])
-        print("DBG:/bookings keys:", list(sample.keys()))
-        print("DBG:/bookings sample:", {k: sample.get(k) for k in ("id","client_brand","brand","agency_name","sales_manager")})
-
     return templates.TemplateResponse("bookings.html", {
         "request": request, "rows": rows,
         "q": q, "sort": sort, "dir": dir, "period": period,
@@ -247,29 +243,6 @@ async def import_excel(request: Request, file: UploadFile = File(...), sheet: st
     cur = conn.cursor()
     inserted, updated = 0, 0
 
-    def as_date(x):
-        if pd.isna(x): return None
-        try:
-            if isinstance(x, (pd.Timestamp,)):
-                return x.strftime("%Y-%m-%d")
-            dt = pd.to_datetime(str(x), errors='coerce', dayfirst=True)
-            return None if pd.isna(dt) else dt.strftime("%Y-%m-%d")
-        except Exception:
-            return None
-
-    def coerce_float(x):
-        if pd.isna(x): return None
-        try:
-            return float(x)
-        except Exception:
-            try: return float(str(x).replace(" ", "").replace(",", "."))
-            except Exception: return None
-
-    def coerce_percent(x):
-        v = coerce_float(x)
-        if v is None: return None
-        return v/100.0 if abs(v) > 1 else v
-
     def get_cell(row, *alts):
         # сначала точные заголовки, затем case‑insensitive поиск
         for a in alts:
@@ -313,14 +286,14 @@ async def import_excel(request: Request, file: UploadFile = File(...), sheet: st
             "campaign_id": campaign_id,
             "client_id": client_id,
             "agency_id": agency_id,
-            "start_date": as_date(get_cell(r, "Дата старта", "Дата начала")),
-            "end_date":   as_date(get_cell(r, "Дата завершения", "Дата конца")),
-            "budget_client_net": coerce_float(get_cell(r, "Бюджет клиентский до НДС", "Бюджет до НДС")),
-            "inventory_total_plan": coerce_float(get_cell(r, "Тотал инвентарь", "Инвентарь план")),
-            "inventory_fact": coerce_float(get_cell(r, "Инвентарь факт", "Факт инвентарь")),
+            "start_date": to_date_iso(get_cell(r, "Дата старта", "Дата начала")),
+            "end_date":   to_date_iso(get_cell(r, "Дата завершения", "Дата конца")),
+            "budget_client_net": to_float(get_cell(r, "Бюджет клиентский до НДС", "Бюджет до НДС")),
+            "inventory_total_plan": to_float(get_cell(r, "Тотал инвентарь", "Инвентарь план")),
+            "inventory_fact": to_float(get_cell(r, "Инвентарь факт", "Факт инвентарь")),
             "format": (str(get_cell(r, "Формат", "Format", "формат")).strip() or None) if get_cell(r, "Формат", "Format", "формат") is not None else None,
             "buying_model": (str(get_cell(r, "Модель закупки", "Buying model", "Модель")).strip() or None) if get_cell(r, "Модель закупки", "Buying model", "Модель") is not None else None,
-            "vz_percent": coerce_percent(get_cell(r, "ВЗ%", "Б3%", "СК", "CK")),
+            "vz_percent": to_share(get_cell(r, "ВЗ%", "Б3%", "СК", "CK")),
             "month_str": str(get_cell(r, "Месяц размещения")) if get_cell(r, "Месяц размещения") is not None else None,
             "raw_json": json.dumps(
 {c: (None if pd.isna(r[c]) else r[c]) for c in df.columns},
@@ -461,12 +434,6 @@ def patch_booking(request: Request, booking_id: int, field: str = Form(...), val
     if field not in allowed:
         raise HTTPException(400, f"field '{field}' not allowed")
 
-    def to_float(v):
-        try:
-            return float(v.replace(",", ".")) if isinstance(v, str) else float(v)
-        except Exception:
-            return None
-
     def to_int(v):
         try:
             return int(v)
@@ -499,9 +466,8 @@ def patch_booking(request: Request, booking_id: int, field: str = Form(...), val
         "price_unit","price_unit_with_bonus","price_unit_with_vat","cpm_cpc_to_platform",
         "vz_percent","refund_amount", "client_price",
     }:
-        coerced = to_float(value)
-        if field == "vz_percent" and coerced is not None and abs(coerced) > 1:
-            coerced = coerced / 100.0  # в БД храним долей
+        # vz_percent в БД храним долей: «12,5» и «12,5%» -> 0.125
+        coerced = to_share(value) if field == "vz_percent" else to_float(value)
     else:
         coerced = value
 
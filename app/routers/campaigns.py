@@ -15,6 +15,8 @@ from fastapi import APIRouter, Request, Body
 from fastapi.responses import HTMLResponse, JSONResponse
 from sqlalchemy import text
 from app.database import engine
+from app.services import metrics
+from app.services.ru_locale import to_float
 import html
 from datetime import datetime
 import xml.etree.ElementTree as ET
@@ -133,25 +135,6 @@ def _parse_cats_shortage_xls(xml_bytes: bytes, metric_type: str) -> dict[int, fl
     if avg_idx is None:
         raise RuntimeError(f"Не нашёл колонку со средним {metric_type} в Cats-отчёте: {header}")
 
-    def parse_num(x):
-        if x is None:
-            return None
-        s = str(x)
-        s = (
-            s.replace("\xa0", "")
-             .replace(" ", "")
-             .replace(",", ".")
-             .replace("руб.", "")
-             .replace("р.", "")
-             .strip()
-        )
-        if not s or s.lower() in ("nan", "none"):
-            return None
-        try:
-            return float(s)
-        except Exception:
-            return None
-
     result: dict[int, float] = {}
     for row in rows[1:]:
         vals = row_vals(row)
@@ -169,7 +152,7 @@ def _parse_cats_shortage_xls(xml_bytes: bytes, metric_type: str) -> dict[int, fl
         except Exception:
             continue
 
-        avg_price = parse_num(avg_raw)
+        avg_price = to_float(avg_raw)      # «1 234,56 руб.»
         if avg_price is None:
             continue
 
@@ -208,13 +191,6 @@ def _sync_csv_daily_to_db(cid: int) -> int:
     if not c_date or not c_impr:
         return 0
 
-    def _num(x):
-        try:
-            s = str(x).replace("\xa0","").replace(" ","").replace(",",".").replace("%","").strip()
-            return float(s) if s not in ("", "nan", "None") else None
-        except Exception:
-            return None
-
     def _norm_date(x: str):
         s = str(x).strip()
         if len(s) >= 10 and s[4]=='-' and s[7]=='-':  # YYYY-MM-DD
@@ -237,13 +213,13 @@ def _sync_csv_daily_to_db(cid: int) -> int:
         if not dkey:
             continue
 
-        im = _num(r.get(c_impr))
-        cl = _num(r.get(c_clk)) if c_clk else None
-        un = _num(r.get(c_uni)) if c_uni else None
+        im = to_float(r.get(c_impr))
+        cl = to_float(r.get(c_clk)) if c_clk else None
+        un = to_float(r.get(c_uni)) if c_uni else None
 
-        v100 = _num(r.get(c_v100)) if c_v100 else None
+        v100 = to_float(r.get(c_v100)) if c_v100 else None
         if v100 is None and im is not None and c_vtrp:
-            vtrp = _num(r.get(c_vtrp))
+            vtrp = to_float(r.get(c_vtrp))
             if vtrp is not None:
                 v100 = im * (vtrp/100.0)
 
@@ -292,27 +268,9 @@ def _sync_csv_daily_to_db(cid: int) -> int:
     return len(rsd_rows)
 
 
-def _to_float(x):
-    if x is None:
-        return None
-    if isinstance(x, (int, float)):
-        return float(x)
-    if isinstance(x, str):
-        s = x.replace("\xa0","").replace(" ", "").replace(",", ".").strip()
-        if s == "":
-            return None
-        try:
-            return float(s)
-        except ValueError:
-            return None
-    try:
-        return float(x)
-    except Exception:
-        return None
-
 def safe_ratio(numer, denom, ndigits=2):
-    n = _to_float(numer)
-    d = _to_float(denom)
+    n = to_float(numer)
+    d = to_float(denom)
     if n is None or d is None:
         return None
     if not math.isfinite(n) or not math.isfinite(d):
@@ -2014,11 +1972,7 @@ def _parse_shortage_spreadsheet(xml_bytes: bytes, metric_type: str):
         if price_raw is None:
             continue
 
-        s = str(price_raw)
-        s = s.replace("\xa0", "").replace(" ", "")
-        s = s.replace("руб.", "").replace("руб", "").replace("₽", "")
-        s = s.replace(",", ".").strip()
-        price = _to_float(s)
+        price = to_float(price_raw)        # «1 234,56 руб.» / «1234.56 ₽»
         if price is None:
             continue
 
@@ -2743,6 +2697,7 @@ def campaigns_margin_view(request: Request):
         },
     )
 
+@metrics.timed_job("margin")
 def _margin_update_all_core(snapshot_date: date | None = None) -> dict:
     """
     Внутренний апдейт маржинальности (без Request).
@@ -2946,6 +2901,7 @@ def _margin_update_all_core(snapshot_date: date | None = None) -> dict:
 
             updated += 1
 
+    metrics.ROWS_INGESTED.labels("margin").inc(updated)
     return {
         "status": "ok",
         "month": month_key,
@@ -6,36 +6,27 @@ from types import SimpleNamespace
 import sys
 import subprocess
 
-import yaml
 from fastapi import APIRouter, Request, Body, UploadFile, File, Form
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import text
 
 from ..database import engine
+from ..services import config_store, yandex_bindings
 
 router = APIRouter()
 templates = Jinja2Templates(directory=str(Path(__file__).resolve().parents[1] / "templates"))
 
-CONFIG_PATH = Path("config.yaml")
 BASE_DIR = Path(__file__).resolve().parents[2]
 MP_DATA_DIR = BASE_DIR / "data" / "mediaplanner"
 
 
 def _load_cfg() -> dict:
-    try:
-        return yaml.safe_load(CONFIG_PATH.read_text(encoding="utf-8")) or {}
-    except FileNotFoundError:
-        return {}
-    except Exception:
-        return {}
+    return config_store.load_raw()
 
 
 def _save_cfg(cfg: dict) -> None:
-    CONFIG_PATH.write_text(
-        yaml.safe_dump(cfg, allow_unicode=True, sort_keys=False),
-        encoding="utf-8",
-    )
+    config_store.save_raw(cfg)
 
 
 # --- campaigns: единый источник истины через engine ---
@@ -104,13 +95,7 @@ def view_directory(request: Request):
 
     # --- Yandex map как было ---
     try:
-        cfg = _load_cfg()
-        yc = cfg.get("yandex_campaigns") or []
-        yandex_map = {
-            int(item["id"]): item.get("yandex_name")
-            for item in yc
-            if "id" in item
-        }
+        yandex_map = yandex_bindings.yandex_map()
     except Exception:
         yandex_map = {}
 
@@ -274,8 +259,8 @@ async def save_mediaplanner_keys(
 @router.post("/directory/yandex/update")
 async def save_yandex_name(payload: dict = Body(...)):
     """
-    Сохранение yandex_name для кампании в config.yaml.
-    Ждём JSON: { "id": <int>, "yandex_name": "<строка>" }
+    Сохранение yandex_name для кампании (таблица campaign_yandex).
+    Ждём JSON: { "id": <int>, "yandex_name": "<строка>" }; пустая строка — снять привязку.
     """
     try:
         campaign_id = int(payload.get("id"))
@@ -283,27 +268,5 @@ async def save_yandex_name(payload: dict = Body(...)):
         return JSONResponse({"error": "invalid id"}, status_code=400)
 
     yandex_name = (payload.get("yandex_name") or "").strip()
-
-    cfg = _load_cfg()
-    yc = cfg.get("yandex_campaigns") or []
-
-    # выкидываем старую запись с этим id
-    new_list = []
-    for item in yc:
-        try:
-            existing_id = int(item.get("id"))
-        except (TypeError, ValueError):
-            new_list.append(item)
-            continue
-
-        if existing_id != campaign_id:
-            new_list.append(item)
-
-    # если что‑то ввели — добавляем/обновляем
-    if yandex_name:
-        new_list.append({"id": campaign_id, "yandex_name": yandex_name})
-
-    cfg["yandex_campaigns"] = new_list
-    _save_cfg(cfg)
-
+    yandex_bindings.set_binding(campaign_id, yandex_name)
     return {"ok": True}
@@ -3,6 +3,11 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 from sqlalchemy import text
 from bs4 import BeautifulSoup
+try:
+    import lxml  # type: ignore  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:  # pragma: no cover
+    HTML_PARSER = "html.parser"   # встроенный: медленнее, но таблицы креативов разбирает так же
 import re
 from datetime import date
 from urllib.parse import urljoin
@@ -10,7 +15,8 @@ from urllib.parse import urljoin
 # 1) общий конфиг и сессия Cats — используем то же, что в кампаниях
 from app.services.config_store import get_effective_system_config
 from app.services.cats_export import _ensure_session  # авторизованная requests.Session
-from app.db import engine
+from app.services import metrics
+from app.database import engine
 
 router = APIRouter()
 
@@ -55,7 +61,7 @@ def _collect_page_urls(soup, base_url):
 def _parse_creatives_table(html: bytes):
     """Парсим основную таблицу «Creatives» и вытаскиваем строки как флайты.
        Забираем: id, name, campaign_name, start, end (если есть в списке)."""
-    soup = BeautifulSoup(html, "lxml")
+    soup = BeautifulSoup(html, HTML_PARSER)
     table = soup.find("table")
     if not table:
         return []
@@ -156,6 +162,7 @@ def flights_index(request: Request):
     return HTMLResponse("".join(html))
 
 @router.post("/campaigns/flights/import_cats", response_class=HTMLResponse)
+@metrics.timed_job("flights")
 def flights_import_cats():
     _ensure_flights_table()
 
@@ -179,7 +186,7 @@ def flights_import_cats():
     # открываем первую страницу
     r = s.get(list_url, timeout=60, allow_redirects=False)
     _assert_authed_response(r)
-    soup_first = BeautifulSoup(r.content, "lxml")
+    soup_first = BeautifulSoup(r.content, HTML_PARSER)
 
     # пробуем ссылку «Все (N)»
     all_href = _find_all_link(soup_first, base)
@@ -215,5 +222,6 @@ def flights_import_cats():
             """), f)
             # посчитать реально вставленные
         inserted = conn.execute(text("SELECT changes()")).scalar()
+    metrics.ROWS_INGESTED.labels("flights").inc(inserted or 0)
 
     return HTMLResponse(f"<span class='tag is-success'>Imported: {inserted} flights</span>")
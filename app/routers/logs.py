@@ -1,33 +1,149 @@
 from __future__ import annotations
+import asyncio
+from datetime import datetime
 from pathlib import Path
-from typing import List
-from fastapi import APIRouter, Request, Query
+from typing import Optional
+from fastapi import APIRouter, Request, Query, Form, HTTPException
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, StreamingResponse
+
+from app.services import log_reader, log_stream, profiler
 
 router = APIRouter(tags=["logs"])
 templates = Jinja2Templates(directory="app/templates")
 LOG_PATH = Path("logs/app.log")
+HEARTBEAT_SEC = 15.0
 
-def _tail(path: Path, n: int) -> List[str]:
-    if not path.exists(): return []
+def _parse_dt(s: str) -> Optional[datetime]:
+    """Значение <input type=datetime-local>: 2025-10-26T23:08 (секунды опциональны)."""
+    s = (s or "").strip()
+    if not s:
+        return None
     try:
-        with path.open("r", encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
-        return lines[-n:]
-    except Exception:
-        return []
+        return datetime.fromisoformat(s)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Bad datetime: {s}")
 
 @router.get("/logs", response_class=HTMLResponse)
-def logs_page(request: Request, n: int = Query(300, ge=10, le=5000), q: str = Query("")) -> HTMLResponse:
-    """Полная страница логов (layout)."""
-    lines = _tail(LOG_PATH, n)
-    if q: lines = [ln for ln in lines if q.lower() in ln.lower()]
-    return templates.TemplateResponse("logs.html", {"request": request, "lines": lines, "n": n, "q": q})
+def logs_page(
+    request: Request,
+    n: int = Query(300, ge=10, le=5000),
+    q: str = Query(""),
+    level: str = Query(""),
+    since: str = Query(""),
+    until: str = Query(""),
+) -> HTMLResponse:
+    """
+    Полная страница логов (layout). Без диапазона — хвост app.log, дальше
+    новые строки приходят по SSE (/logs/stream); с диапазоном since/until —
+    поиск по app.log и ротациям.
+    """
+    dt_from, dt_to = _parse_dt(since), _parse_dt(until)
+    search_mode = dt_from is not None or dt_to is not None
+    if search_mode:
+        lines = log_reader.search(
+            LOG_PATH, q=q, since=dt_from, until=dt_to, limit=n, level=log_reader.level_no(level)
+        )
+        cursor = ""
+    else:
+        cursor = log_reader.end_cursor(LOG_PATH)
+        lines = log_reader.tail_lines(LOG_PATH, n, q=q, level=log_reader.level_no(level))
+    return templates.TemplateResponse(
+        "logs.html",
+        {
+            "request": request, "lines": lines, "n": n, "q": q, "level": level.upper(),
+            "levels": list(log_reader.LEVELS),
+            "since": since, "until": until, "search_mode": search_mode, "cursor": cursor,
+        },
+    )
 
 @router.get("/logs/fragment", response_class=HTMLResponse)
-def logs_fragment(request: Request, n: int = Query(300, ge=10, le=5000), q: str = Query("")) -> HTMLResponse:
-    """Только тело логов для авто-обновления HTMX."""
-    lines = _tail(LOG_PATH, n)
-    if q: lines = [ln for ln in lines if q.lower() in ln.lower()]
-    return templates.TemplateResponse("partials/log_body.html", {"request": request, "lines": lines})
+def logs_fragment(
+    request: Request,
+    n: int = Query(300, ge=10, le=5000),
+    q: str = Query(""),
+    level: str = Query(""),
+    cursor: str = Query(""),
+) -> HTMLResponse:
+    """
+    Для авто-обновления HTMX. С курсором — только новые строки (дописываются
+    в конец <pre>) + out-of-band обновлённый опросчик с новым курсором;
+    без курсора — весь хвост, как раньше.
+    """
+    if not cursor:
+        lines = log_reader.tail_lines(LOG_PATH, n, q=q, level=log_reader.level_no(level))
+        return templates.TemplateResponse("partials/log_body.html", {"request": request, "lines": lines})
+    lines, cursor = log_reader.read_since(LOG_PATH, cursor, q=q)
+    return templates.TemplateResponse(
+        "partials/log_append.html",
+        {"request": request, "lines": lines, "n": n, "q": q, "cursor": cursor},
+    )
+
+@router.get("/logs/stream")
+async def logs_stream(
+    request: Request,
+    q: str = Query(""),
+    level: str = Query(""),
+    cursor: str = Query(""),
+):
+    """
+    SSE: новые строки app.log по мере записи (с фильтром уровня/подстроки).
+    Раз в HEARTBEAT_SEC — комментарий-пинг, чтобы заметить закрытую вкладку.
+    """
+    flw = log_stream.follower(LOG_PATH)
+    sub = flw.subscribe(level=log_reader.level_no(level), q=q, cursor=cursor)
+
+    async def gen():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    lines = await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                for i in range(0, len(lines), log_stream.MAX_BATCH):
+                    yield log_stream.sse_event(lines[i:i + log_stream.MAX_BATCH])
+        finally:
+            flw.unsubscribe(sub)
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ------------------ профили (sampling profiler) ------------------
+
+@router.get("/logs/profiles", response_class=HTMLResponse)
+def profiles_page(request: Request) -> HTMLResponse:
+    """Список снятых профилей + форма «взвести профайлер»."""
+    return templates.TemplateResponse(
+        "logs_profiles.html",
+        {"request": request, "profiles": profiler.list_profiles(), "armed": profiler.status()},
+    )
+
+@router.post("/logs/profiles/arm")
+def profiles_arm(
+    pattern: str = Form(""),
+    count: int = Form(1),
+    interval_ms: float = Form(profiler.DEFAULT_INTERVAL_MS),
+):
+    profiler.arm(pattern=pattern, count=min(max(count, 0), 100), interval_ms=interval_ms)
+    return RedirectResponse(url="/logs/profiles", status_code=303)
+
+@router.post("/logs/profiles/disarm")
+def profiles_disarm():
+    profiler.disarm()
+    return RedirectResponse(url="/logs/profiles", status_code=303)
+
+@router.get("/logs/profiles/{name}.{ext}")
+def profiles_file(name: str, ext: str):
+    p = profiler.profile_file(name, "." + ext)
+    if p is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media = {"svg": "image/svg+xml", "json": "application/json"}.get(ext, "text/plain; charset=utf-8")
+    return FileResponse(p, media_type=media)
@@ -0,0 +1,28 @@
+# app/routers/metrics.py
+from __future__ import annotations
+
+import os
+import secrets
+
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.services import metrics
+
+router = APIRouter(tags=["metrics"])
+
+PROM_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint(request: Request):
+    """
+    Prometheus scrape. Без сессии (скрейпер не логинится); если задан
+    ENV METRICS_TOKEN — требуем ``Authorization: Bearer <token>``.
+    """
+    token = os.getenv("METRICS_TOKEN")
+    if token:
+        auth = request.headers.get("Authorization") or ""
+        if not secrets.compare_digest(auth, f"Bearer {token}"):
+            raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(metrics.render_all(), media_type=PROM_CONTENT_TYPE)
@@ -0,0 +1,117 @@
+# app/routers/perf.py
+from __future__ import annotations
+
+from fastapi import APIRouter, Form, Request, Query
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.templating import Jinja2Templates
+
+from app.services import memory, perf, slow_queries
+
+router = APIRouter(tags=["perf"])
+templates = Jinja2Templates(directory="app/templates")
+
+
+@router.get("/debug/perf", response_class=HTMLResponse)
+def perf_page(request: Request, limit: int = Query(100, ge=10, le=perf.RING_SIZE)) -> HTMLResponse:
+    """Тайминги запросов: p50/p95/p99 по маршрутам + последние запросы."""
+    return templates.TemplateResponse(
+        "debug_perf.html",
+        {
+            "request": request,
+            "stats": perf.route_stats(),
+            "recent": perf.recent(limit),
+            "limit": limit,
+            "ring_size": perf.RING_SIZE,
+        },
+    )
+
+
+@router.get("/debug/perf.json", response_class=JSONResponse)
+def perf_json(limit: int = Query(100, ge=10, le=perf.RING_SIZE)):
+    return {"stats": perf.route_stats(), "recent": perf.recent(limit)}
+
+
+@router.post("/debug/perf/reset")
+def perf_reset():
+    perf.reset()
+    return RedirectResponse(url="/debug/perf", status_code=303)
+
+
+@router.get("/debug/slow_queries", response_class=HTMLResponse)
+def slow_queries_page(
+    request: Request,
+    days: int = Query(7, ge=1, le=365),
+    limit: int = Query(50, ge=1, le=500),
+) -> HTMLResponse:
+    """Журнал медленных запросов: топ по суммарному времени + план запроса."""
+    return templates.TemplateResponse(
+        "debug_slow_queries.html",
+        {
+            "request": request,
+            "rows": slow_queries.top_offenders(limit=limit, days=days),
+            "days": days,
+            "limit": limit,
+            "threshold_ms": slow_queries.threshold_ms(),
+            "dropped": slow_queries.dropped(),
+        },
+    )
+
+
+@router.post("/debug/slow_queries/clear")
+def slow_queries_clear():
+    slow_queries.clear()
+    return RedirectResponse(url="/debug/slow_queries", status_code=303)
+
+
+@router.get("/debug/memory", response_class=HTMLResponse)
+def memory_page(
+    request: Request,
+    old: str = Query(""),
+    new: str = Query(""),
+    limit: int = Query(30, ge=5, le=200),
+) -> HTMLResponse:
+    """RSS/GC сейчас и в истории, снимки tracemalloc и их сравнение."""
+    snaps = memory.list_snapshots()
+    names = [s["name"] for s in snaps]
+    # по умолчанию — два последних снимка
+    if not new and names:
+        new = names[0]
+    if not old and len(names) > 1:
+        old = names[1]
+    if old and new:
+        rows, mode = memory.diff_snapshots(old, new, limit=limit), "diff"
+    elif new:
+        rows, mode = memory.top_sites(new, limit=limit), "top"
+    else:
+        rows, mode = [], ""
+    return templates.TemplateResponse(
+        "debug_memory.html",
+        {
+            "request": request,
+            "now": memory.current_stats(),
+            "settings": memory.settings(),
+            "history": memory.history(),
+            "snapshots": snaps,
+            "old": old,
+            "new": new,
+            "rows": rows,
+            "mode": mode,
+            "limit": limit,
+        },
+    )
+
+
+@router.post("/debug/memory/tracing")
+def memory_tracing(action: str = Form("start"), frames: int = Form(memory.DEFAULT_FRAMES)):
+    if action == "stop":
+        memory.stop_tracing()
+    else:
+        memory.start_tracing(frames)
+    return RedirectResponse(url="/debug/memory", status_code=303)
+
+
+@router.post("/debug/memory/snapshot")
+def memory_snapshot(label: str = Form("")):
+    name = memory.take_snapshot(label)
+    memory.record_sample(name)
+    return RedirectResponse(url="/debug/memory", status_code=303)
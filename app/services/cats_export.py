@@ -6,7 +6,9 @@ from typing import Dict, Any, List, Tuple, Optional
 import requests
 import pandas as pd
 
+from app.services import metrics
 from app.services.config_store import get_effective_system_config
+from app.services.ru_locale import to_date_series, to_float_series
 from app.services.cats_front import cats_front_ping  # используем тот же логин через форму
 
 log = logging.getLogger("app")
@@ -175,21 +177,12 @@ def normalize_columns(df: pd.DataFrame, column_map: Dict[str, List[str]]) -> pd.
         df = df.rename(columns=ren)
     return df
 
-def _coerce_number(x):
-    if pd.isna(x):
-        return None
-    if isinstance(x, (int, float)):
-        return float(x)
-    s = str(x).strip().replace(" ", "").replace(",", ".").replace("%", "")
-    try:
-        return float(s)
-    except Exception:
-        return None
-
 def _normalize_metrics(df: pd.DataFrame) -> pd.DataFrame:
     """
     Готовит поля под дашборд:
     date, impressions, clicks, uniques, ctr_percent/ratio, vtr_percent/ratio, freq (Показы/Охват)
+
+    Колонки разбираются целиком (app/services/ru_locale), без apply по строкам.
     """
     # Базовая рус->канонические
     rename: Dict[str, str] = {}
@@ -202,20 +195,20 @@ def _normalize_metrics(df: pd.DataFrame) -> pd.DataFrame:
 
     # Дата -> ISO
     if "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors="coerce").dt.date
+        df["date"] = to_date_series(df["date"]).dt.date
 
     # CTR/VTR -> percent + ratio
     for src, base in (("CTR", "ctr"), ("VTR", "vtr")):
         if src in df.columns:
-            vals = df[src].apply(_coerce_number)
+            vals = to_float_series(df[src])
             df[f"{base}_percent"] = vals
-            df[f"{base}_ratio"]   = vals.apply(lambda v: (v/100.0) if v is not None else None)
+            df[f"{base}_ratio"]   = vals / 100.0
 
     # Частота = Показы / Охват
     if "impressions" in df.columns and "uniques" in df.columns:
-        imp = df["impressions"].apply(_coerce_number)
-        uni = df["uniques"].apply(_coerce_number)
-        df["freq"] = [round(i/u, 2) if (u and u > 0 and i is not None) else None for i, u in zip(imp, uni)]
+        imp = to_float_series(df["impressions"])
+        uni = to_float_series(df["uniques"])
+        df["freq"] = (imp / uni.where(uni > 0)).round(2)
 
     return df
 
@@ -231,6 +224,7 @@ def ingest_stat(df: pd.DataFrame, stat_id: str) -> Dict[str, Any]:
     df.to_csv(clean_path, index=False)
     return {"normalized_path": str(clean_path), "rows": int(df.shape[0]), "cols": list(df.columns)}
 
+@metrics.timed_job("pull")
 def export_and_ingest(stat_id: str) -> Dict[str, Any]:
     """
     Полный цикл: скачать -> распарсить -> нормализовать -> сохранить.
@@ -241,4 +235,5 @@ def export_and_ingest(stat_id: str) -> Dict[str, Any]:
     df = normalize_columns(df, conf["column_map"])
     df = _normalize_metrics(df)
     ing = ingest_stat(df, stat_id)
-    return {"ok": True, "raw_path": str(path), "meta": meta, "ingest": ing}
+    metrics.ROWS_INGESTED.labels("cats").inc(ing["rows"])
+    return {"ok": True, "raw_path": str(path), "meta": meta, "ingest": ing}
@@ -1,25 +1,170 @@
+"""
+config.yaml: снимок вместо разбора YAML на каждый вызов.
+
+``snapshot()`` отдаёт неизменяемый ConfigSnapshot; файл перечитывается,
+только если поменялись mtime/size, а stat делается не чаще раза в
+``STAT_INTERVAL_SEC``. ``save_raw`` пишет атомарно (временный файл +
+os.replace) и сразу подменяет снимок (version + 1).
+
+Доступ — типизированными геттерами по пути через точку:
+``snapshot().get_float("perf.slow_query_ms", 200.0)``.
+``load_raw()`` оставлен для кода, который правит конфиг: отдаёт копию.
+"""
+import copy
+import stat
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 import os, yaml
 
-CONFIG_PATH = Path("config.yaml")
+CONFIG_PATH = Path(os.getenv("INLAB_CONFIG") or "config.yaml")
+STAT_INTERVAL_SEC = 1.0
 
-def load_raw() -> Dict[str, Any]:
-    if CONFIG_PATH.exists():
+_MISSING = object()
+
+
+class ConfigSnapshot:
+    """Разобранный config.yaml на момент (mtime, size); только чтение."""
+
+    __slots__ = ("_data", "version", "mtime_ns", "size")
+
+    def __init__(self, data: Dict[str, Any], version: int, mtime_ns: int = 0, size: int = -1):
+        self._data = data
+        self.version = version
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def get(self, path: str, default: Any = None) -> Any:
+        node: Any = self._data
+        for key in path.split("."):
+            if not isinstance(node, dict):
+                return default
+            node = node.get(key, _MISSING)
+            if node is _MISSING:
+                return default
+        return default if node is None else node
+
+    def section(self, name: str) -> Dict[str, Any]:
+        """Копия секции верхнего уровня (пустой dict, если её нет или это не dict)."""
+        v = self._data.get(name)
+        return copy.deepcopy(v) if isinstance(v, dict) else {}
+
+    def get_str(self, path: str, default: str = "") -> str:
+        v = self.get(path)
+        return default if v is None else str(v)
+
+    def get_int(self, path: str, default: int = 0) -> int:
+        try:
+            return int(self.get(path, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, path: str, default: float = 0.0) -> float:
+        try:
+            return float(self.get(path, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, path: str, default: bool = False) -> bool:
+        v = self.get(path, default)
+        if isinstance(v, str):
+            return v.strip().lower() in ("1", "true", "yes", "on")
+        return bool(v)
+
+    def get_list(self, path: str) -> List[Any]:
+        v = self.get(path)
+        return copy.deepcopy(v) if isinstance(v, list) else []
+
+    def raw(self) -> Dict[str, Any]:
+        """Изменяемая копия всего конфига."""
+        return copy.deepcopy(self._data)
+
+
+_lock = threading.Lock()
+_snap = ConfigSnapshot({}, version=0)
+_checked_at = 0.0
+
+
+def _read_file() -> Dict[str, Any]:
+    try:
+        with CONFIG_PATH.open("r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def snapshot() -> ConfigSnapshot:
+    global _snap, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < STAT_INTERVAL_SEC and _snap.version:
+        return _snap
+    with _lock:
+        if now - _checked_at < STAT_INTERVAL_SEC and _snap.version:
+            return _snap
+        _checked_at = now
         try:
-            with CONFIG_PATH.open("r", encoding="utf-8") as f:
-                return yaml.safe_load(f) or {}
-        except Exception:
-            return {}
-    return {}
+            st = CONFIG_PATH.stat()
+            mtime_ns, size = st.st_mtime_ns, st.st_size
+        except OSError:
+            mtime_ns, size = 0, -1
+        if _snap.version and (mtime_ns, size) == (_snap.mtime_ns, _snap.size):
+            return _snap
+        data = _read_file() if size >= 0 else {}
+        _snap = ConfigSnapshot(data, _snap.version + 1, mtime_ns, size)
+        return _snap
+
+
+def load_raw() -> Dict[str, Any]:
+    return snapshot().raw()
 
 def save_raw(data: Dict[str, Any]) -> None:
-    with CONFIG_PATH.open("w", encoding="utf-8") as f:
-        yaml.safe_dump(data or {}, f, allow_unicode=True, sort_keys=False)
+    """Атомарная запись: temp-файл в том же каталоге + os.replace; снимок обновляется сразу."""
+    global _snap, _checked_at
+    data = data or {}
+    target = CONFIG_PATH.resolve()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        fd, tmp = tempfile.mkstemp(prefix=".config.", suffix=".yaml.tmp", dir=str(target.parent))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                yaml.safe_dump(data, f, allow_unicode=True, sort_keys=False)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp создаёт файл 0600 — иначе после первого сохранения config.yaml
+            # перестанут читать скрипты под другим пользователем
+            if target.exists():
+                os.chmod(tmp, stat.S_IMODE(os.stat(target).st_mode))
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        st = target.stat()
+        _snap = ConfigSnapshot(copy.deepcopy(data), _snap.version + 1, st.st_mtime_ns, st.st_size)
+        _checked_at = time.monotonic()
+
+def upsert(section: str, values: Dict[str, Any]) -> None:
+    """Обновить ключи одной секции верхнего уровня (вложенные dict сливаются)."""
+    data = load_raw()
+    cur = data.get(section)
+    data[section] = _merge(cur if isinstance(cur, dict) else {}, values or {})
+    save_raw(data)
+
+def _merge(base: Dict[str, Any], upd: Dict[str, Any]) -> Dict[str, Any]:
+    for k, v in upd.items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            base[k] = _merge(base[k], v)
+        else:
+            base[k] = v
+    return base
 
 def get_effective_imap_config(path: str | None = None) -> Dict[str, Any]:
-    raw = load_raw()
-    imap = (raw.get("imap") or {})
+    imap = snapshot().section("imap")
     # ENV override (пустые значения не перетирают YAML)
     env_user = os.getenv("IMAP__USER")
     env_pass = os.getenv("IMAP__PASSWORD")
@@ -43,8 +188,7 @@ def get_effective_imap_config(path: str | None = None) -> Dict[str, Any]:
     return eff
 
 def get_effective_system_config(path: str | None = None) -> Dict[str, Any]:
-    raw = load_raw()
-    system = (raw.get("system") or {})
+    system = snapshot().section("system")
     auth = (system.get("auth") or {})
 
     # ENV overrides для токена (пример)
@@ -66,4 +210,4 @@ def get_effective_system_config(path: str | None = None) -> Dict[str, Any]:
             "cookies": (auth.get("cookies") or {}),
             "form": (auth.get("form") or {}),   # <-- ключевой момент
         },
-    }
+    }
@@ -11,27 +11,44 @@ credentials and access are configured.
 from __future__ import annotations
 
 import hashlib
+import logging
 import os
 import re
 from dataclasses import dataclass
 from datetime import datetime, date
-from typing import Iterable, List, Optional, Tuple
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
 
 import requests  # type: ignore
 from app.services.imap_utils import IMAPCompatClient as IMAPClient  # type: ignore
+from app.services.imap_utils import (
+    BodyPart, SectionTooLarge, chunked, parse_bodystructure, parse_envelope,
+)
 
 from ..config import get_settings
 
+log = logging.getLogger("app")
+
 
 @dataclass
 class DownloadResult:
-    """Represents the downloaded contents of a file along with metadata."""
+    """Represents the downloaded contents of a file along with metadata.
+
+    Mail attachments are streamed to disk: ``path`` is set and ``content``
+    is empty; use :meth:`read` to get the bytes either way.
+    """
 
     filename: str
     content: bytes
     sha256: str
     period_from: Optional[date] = None
     period_to: Optional[date] = None
+    path: Optional[str] = None
+
+    def read(self) -> bytes:
+        if self.path is not None:
+            return Path(self.path).read_bytes()
+        return self.content
 
 
 def compute_sha256(data: bytes) -> str:
@@ -70,23 +87,103 @@ def download_system_file(campaign_id: int) -> Optional[DownloadResult]:
         return None
 
 
-def fetch_mail_attachments(rule) -> List[DownloadResult]:
+MAIL_DIR = Path("data") / "mail"
+HEADER_BATCH = 100   # messages per UID FETCH (ENVELOPE BODYSTRUCTURE)
+
+
+def _sender_criteria(senders: List[str]) -> List[str]:
+    """FROM a OR FROM b ... in IMAP prefix form: OR FROM a OR FROM b FROM c."""
+    if not senders:
+        return []
+    criteria: List[str] = []
+    for s in senders[:-1]:
+        criteria += ["OR", "FROM", f'"{s}"']
+    return criteria + ["FROM", f'"{senders[-1]}"']
+
+
+def _decoded_size(part: BodyPart) -> int:
+    # BODYSTRUCTURE reports the encoded size; base64 carries 3 bytes per 4 chars
+    return part.size * 3 // 4 if part.encoding == "base64" else part.size
+
+
+def select_parts(parts: Iterable[BodyPart], filename_patterns: List[re.Pattern],
+                 max_bytes: Optional[int]) -> Iterator[BodyPart]:
+    """Attachment parts whose filename matches the rule and that fit the size cap."""
+    for part in parts:
+        if part.disposition != "attachment" or not part.filename:
+            continue
+        if filename_patterns and not any(p.search(part.filename) for p in filename_patterns):
+            continue
+        if max_bytes and _decoded_size(part) > max_bytes:
+            log.warning("mail attachment %r is ~%d bytes, over the %d cap; skipped",
+                        part.filename, _decoded_size(part), max_bytes)
+            continue
+        yield part
+
+
+class _HashingWriter:
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.sha = hashlib.sha256()
+
+    def write(self, data: bytes) -> None:
+        self.sha.update(data)
+        self.f.write(data)
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", name).strip(" .") or "attachment"
+
+
+def _download_part(client: IMAPClient, uid: int, part: BodyPart, dest: Path,
+                   max_bytes: Optional[int]) -> Optional[DownloadResult]:
+    """Stream one part to ``dest`` via a ``.part`` file; None if it breaks the cap."""
+    dest.mkdir(parents=True, exist_ok=True)
+    target = dest / f"{uid}_{part.section}_{_safe_name(part.filename or '')}"
+    tmp = target.with_name(target.name + ".part")
+    try:
+        with open(tmp, "wb") as f:
+            writer = _HashingWriter(f)
+            client.stream_section(uid, part.section, part.encoding, writer, limit=max_bytes)
+    except SectionTooLarge as e:
+        tmp.unlink(missing_ok=True)
+        log.warning("mail attachment %r: %s; skipped", part.filename, e)
+        return None
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, target)
+    return DownloadResult(filename=part.filename or target.name, content=b"",
+                          sha256=writer.sha.hexdigest(), path=str(target))
+
+
+def fetch_mail_attachments(rule, dest_dir: Optional[str] = None,
+                           max_bytes: Optional[int] = None) -> Iterator[DownloadResult]:
     """Fetch attachments from a Yandex mailbox according to a rule.
 
     Connects to the IMAP server specified in the configuration, selects
-    the folder defined by the rule and searches for unseen messages matching
-    allowed senders and subject/filename patterns.  Returns a list of
-    DownloadResult objects for each attachment.
-
-    NOTE: External IMAP connections are not permitted in this environment.
-    To enable real e‑mail processing, uncomment the code and fill in your
-    credentials in `config.yaml`.
+    the folder defined by the rule and searches for unseen messages from
+    the allowed senders.  Only ENVELOPE and BODYSTRUCTURE are fetched for
+    the candidates; subject and filename patterns are matched against them,
+    and only the selected attachment parts are downloaded, each streamed
+    with ``BODY.PEEK[n]`` straight to a file under ``dest_dir`` (default
+    ``data/mail/rule_<id>``).  Parts larger than ``max_bytes`` (default
+    ``imap.max_attachment_mb``) are skipped.
+
+    This is a generator: each DownloadResult refers to a file on disk
+    (``path``), so peak memory is one download chunk, not the mailbox.  A
+    message is marked \\Seen once all of its attachments have been
+    consumed.  On a network or auth error the generator stops; the caller
+    may retry later.
     """
     settings = get_settings()
     host = settings.imap.host
     port = settings.imap.port
     user = settings.imap.user
     password = settings.imap.password
+    if max_bytes is None:
+        max_bytes = settings.imap.max_attachment_mb * 1024 * 1024
+    dest = Path(dest_dir) if dest_dir else MAIL_DIR / f"rule_{getattr(rule, 'id', None) or 'default'}"
 
     # Prepare search criteria based on the rule
     allowed_senders = [s.lower() for s in (rule.allowed_senders or [])]
@@ -94,57 +191,28 @@ def fetch_mail_attachments(rule) -> List[DownloadResult]:
     subject_patterns = [re.compile(p, re.IGNORECASE) for p in (rule.subject_regex or [])]
     filename_patterns = [re.compile(p, re.IGNORECASE) for p in (rule.filename_regex or [])]
 
-    downloads: List[DownloadResult] = []
     try:
-        # Connect to the IMAP server.  Use UID mode to simplify flag handling.
-        with IMAPClient(host, port=port, use_uid=True, ssl=True) as client:
-            client.login(user, password)
-            client.select_folder(rule.folder or settings.imap.mailbox)
-            # Build search criteria: unseen messages and optional sender filters
-            criteria: List[str] = ['UNSEEN']
-            if allowed_senders:
-                sender_filters = [f'FROM "{s}"' for s in allowed_senders]
-                criteria.append('(' + ' OR '.join(sender_filters) + ')')
-            message_ids = client.search(criteria)
-            if not message_ids:
-                return downloads
-            # Fetch entire raw emails for each UID
-            messages = client.fetch(message_ids, ['RFC822'])
-            import email
-            for uid, data in messages.items():
-                raw = data[b'RFC822']
-                msg = email.message_from_bytes(raw)
-                sender_addr = email.utils.parseaddr(msg.get('From', ''))[1].lower()
-                if allowed_senders and not any(s in sender_addr for s in allowed_senders):
-                    continue
-                subject = msg.get('Subject', '')
-                if subject_patterns and not any(p.search(subject) for p in subject_patterns):
-                    continue
-                # Iterate over parts to find attachments
-                for part in msg.walk():
-                    if part.get_content_maintype() == 'multipart':
-                        continue
-                    disp = part.get('Content-Disposition')
-                    if not disp or 'attachment' not in disp.lower():
+        with IMAPClient(host, port=port, ssl=settings.imap.ssl) as client:
+            client.login(user, password, settings.imap.two_factor)
+            client.select_folder(rule.folder or settings.imap.mailbox, readonly=False)
+            uids = client.uid_search("UNSEEN", *_sender_criteria(allowed_senders))
+            for batch in chunked(uids, HEADER_BATCH):
+                headers = client.uid_fetch(batch, "(UID ENVELOPE BODYSTRUCTURE)")
+                for uid in sorted(headers):
+                    env = parse_envelope(headers[uid].get("ENVELOPE"))
+                    if allowed_senders and not any(s in env.from_addr for s in allowed_senders):
                         continue
-                    filename = part.get_filename()
-                    if not filename:
+                    if subject_patterns and not any(p.search(env.subject) for p in subject_patterns):
                         continue
-                    if filename_patterns and not any(p.search(filename) for p in filename_patterns):
-                        continue
-                    payload = part.get_payload(decode=True)
-                    if not payload:
-                        continue
-                    sha = compute_sha256(payload)
-                    downloads.append(DownloadResult(filename=filename, content=payload, sha256=sha))
-                # Mark the message as seen so that it is not processed again
-                # Use a double backslash to send the literal "\Seen" flag
-                client.add_flags(uid, [b'\\Seen'])
-    except Exception:
-        # In case of any error (network, auth, parsing), return whatever
-        # attachments were successfully processed.  The caller may decide to
-        # retry.
-        return downloads
-    return downloads
-
-
+                    parts = parse_bodystructure(headers[uid].get("BODYSTRUCTURE"))
+                    for part in select_parts(parts, filename_patterns, max_bytes):
+                        result = _download_part(client, uid, part, dest, max_bytes)
+                        if result is not None:
+                            yield result
+                    # Mark the message as seen so that it is not processed again
+                    client.add_flags([uid], ["\\Seen"])
+    except Exception as e:
+        # Network, auth or parsing error: stop here; the attachments already
+        # yielded stay valid and unseen messages will be retried next time.
+        log.warning("fetch_mail_attachments: %s", e)
+        return
@@ -0,0 +1,129 @@
+# app/services/imap_idle.py
+"""
+Push-режим IMAP: поток на папку держит IDLE и зовёт обработчик, когда
+приходят новые письма.
+
+Цикл ``FolderWatcher``:
+
+1. connect + LOGIN + SELECT (readonly); сразу ``on_change(folder, "connect")``
+   — догнать то, что пришло, пока слушателя не было;
+2. IDLE до ``idle_sec`` (RFC 2177 советует перевыставлять не реже 29 мин);
+   сервер без IDLE — NOOP раз в ``noop_sec``;
+3. событие EXISTS/RECENT -> пауза ``debounce_sec`` (пачка писем приходит
+   очередью) -> ``on_change(folder, "exists")``;
+4. между циклами IDLE — NOOP, если с прошлого прошло ``noop_sec``;
+5. любая ошибка соединения -> logout, пауза ``Backoff`` (экспонента с
+   джиттером, сбрасывается после успешного SELECT) и переподключение.
+
+Обработчик сам решает, что скачивать: импортёры с контрольными точками UID
+(app/services/imap_sync.py) заберут только новые письма.
+
+``connect`` — любая фабрика залогиненного клиента, поэтому поток можно
+направить на локальную заглушку IMAP вместо боевого ящика.
+"""
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from app.services.imap_utils import IMAPCompatClient
+
+log = logging.getLogger("app")
+
+CHANGE_EVENTS = {"EXISTS", "RECENT"}
+
+
+class Backoff:
+    def __init__(self, initial: float = 1.0, maximum: float = 300.0, factor: float = 2.0, jitter: float = 0.2):
+        self.initial, self.maximum, self.factor, self.jitter = initial, maximum, factor, jitter
+        self._next = initial
+
+    def reset(self) -> None:
+        self._next = self.initial
+
+    def next(self) -> float:
+        delay = self._next
+        self._next = min(self.maximum, self._next * self.factor)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class FolderWatcher(threading.Thread):
+    def __init__(self, folder: str,
+                 connect: Callable[[], IMAPCompatClient],
+                 on_change: Callable[[str, str], None],
+                 idle_sec: float = 300.0,
+                 noop_sec: float = 60.0,
+                 debounce_sec: float = 2.0,
+                 backoff: Optional[Backoff] = None):
+        super().__init__(name=f"imap-idle:{folder}", daemon=True)
+        self.folder = folder
+        self.connect = connect
+        self.on_change = on_change
+        self.idle_sec = idle_sec
+        self.noop_sec = noop_sec
+        self.debounce_sec = debounce_sec
+        self.backoff = backoff or Backoff()
+        self._halt = threading.Event()
+        self.reconnects = 0
+        self.changes = 0
+
+    def stop(self) -> None:
+        self._halt.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._halt.is_set()
+
+    def _fire(self, reason: str) -> None:
+        self.changes += 1
+        try:
+            self.on_change(self.folder, reason)
+        except Exception:
+            # обработчик упал — соединение тут ни при чём, слушаем дальше
+            log.exception("imap idle %s: handler failed (%s)", self.folder, reason)
+
+    def _session(self, client: IMAPCompatClient) -> None:
+        info = client.select_folder(self.folder, readonly=True)
+        self.backoff.reset()
+        log.info("imap idle %s: watching (UIDNEXT=%s, IDLE=%s)", self.folder, info.get("UIDNEXT"), client.has_idle)
+        self._fire("connect")
+        last_noop = time.monotonic()
+
+        while not self.stopped:
+            if client.has_idle:
+                events = client.idle(self.idle_sec, stop=self._halt.is_set)
+            else:
+                self._halt.wait(self.noop_sec)
+                if self.stopped:
+                    break
+                events = client.noop()
+                last_noop = time.monotonic()
+            if self.stopped:
+                break
+            if CHANGE_EVENTS.intersection(events):
+                log.info("imap idle %s: %s", self.folder, ",".join(events))
+                self._halt.wait(self.debounce_sec)
+                self._fire("exists")
+            if time.monotonic() - last_noop >= self.noop_sec:
+                # keepalive и заодно события, пришедшие между DONE и следующим IDLE
+                if CHANGE_EVENTS.intersection(client.noop()):
+                    self._fire("exists")
+                last_noop = time.monotonic()
+
+    def run(self) -> None:
+        while not self.stopped:
+            client = None
+            try:
+                client = self.connect()
+                self._session(client)
+            except Exception as e:
+                delay = self.backoff.next()
+                self.reconnects += 1
+                log.warning("imap idle %s: %s; reconnect in %.1fs", self.folder, e, delay)
+                self._halt.wait(delay)
+            finally:
+                if client is not None:
+                    client.logout()
@@ -0,0 +1,215 @@
+# app/services/imap_pool.py
+"""
+Параллельный IMAP-импорт: пул соединений, конвейер разбора и счётчики.
+
+- ``IMAPPool`` — до ``size`` залогиненных ``IMAPCompatClient``; соединение
+  берётся на папку/аккаунт (``with pool.connection() as client``) и
+  возвращается для следующей задачи, повторный LOGIN не нужен. После
+  ошибки соединение закрывается — его состояние (SELECT) неизвестно.
+- ``ParsePipeline`` — один поток-разборщик. Сетевые потоки кладут в
+  очередь «разобрать XLSX и записать», а сами качают дальше: сеть и
+  pandas/openpyxl работают внахлёст. Писатель один, поэтому SQLite не
+  ловит конкурентных записей. Очередь ограничена — медленный разбор
+  притормаживает скачивание, а не раздувает память.
+- ``ImportStats`` — потокобезопасные счётчики и итог: сообщений/с и байт/с.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from app.services import metrics
+from app.services.imap_utils import IMAPCompatClient
+
+log = logging.getLogger("app")
+
+DEFAULT_POOL_SIZE = 4
+
+
+class IMAPPool:
+    def __init__(self, host: str, port: int, user: str, password: str, ssl: bool = True,
+                 size: int = DEFAULT_POOL_SIZE, two_factor: Optional[str] = None):
+        self.host, self.port, self.ssl = host, int(port), ssl
+        self.user, self.password, self.two_factor = user, password, two_factor
+        self.size = max(1, int(size))
+        self._idle: "queue.LifoQueue[IMAPCompatClient]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._open = 0
+        self.logins = 0
+
+    def _connect(self) -> IMAPCompatClient:
+        client = IMAPCompatClient(self.host, self.port, ssl=self.ssl)
+        client.login(self.user, self.password, self.two_factor)
+        with self._lock:
+            self._open += 1
+            self.logins += 1
+        return client
+
+    def _discard(self, client: IMAPCompatClient) -> None:
+        client.logout()
+        with self._lock:
+            self._open -= 1
+
+    @contextmanager
+    def connection(self) -> Iterator[IMAPCompatClient]:
+        self._slots.acquire()
+        client = None
+        try:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                client = self._connect()
+            yield client
+        except BaseException:
+            if client is not None:
+                self._discard(client)
+                client = None
+            raise
+        finally:
+            if client is not None:
+                self._idle.put(client)
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def __enter__(self) -> "IMAPPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.close()
+        return False
+
+
+class ImportStats:
+    """Счётчики импорта; ``messages``/``bytes`` дают скорость в итоговой строке."""
+
+    def __init__(self, source: str = ""):
+        self.source = source
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.campaigns: Set[int] = set()
+
+    def touched(self, campaign_ids: Iterable[int]) -> None:
+        """Кампании, чьи данные изменились (для инвалидации представлений)."""
+        with self._lock:
+            self.campaigns.update(int(c) for c in campaign_ids)
+
+    def add(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + n
+
+    def __getitem__(self, key: str) -> int:
+        return self.counts.get(key, 0)
+
+    def fetched(self, messages: int, nbytes: int) -> None:
+        """Учесть скачанное из IMAP (и в Prometheus-счётчиках, если задан source)."""
+        self.add("messages", messages)
+        self.add("bytes", nbytes)
+        if self.source:
+            if messages:
+                metrics.IMAP_MESSAGES.labels(self.source).inc(messages)
+            if nbytes:
+                metrics.IMAP_BYTES.labels(self.source).inc(nbytes)
+
+    def elapsed(self) -> float:
+        return max(time.monotonic() - self.started, 1e-9)
+
+    def rates(self) -> str:
+        sec = self.elapsed()
+        return (
+            f"{self['messages']} msgs, {self['bytes'] / 1024:.1f} KiB in {sec:.1f}s: "
+            f"{self['messages'] / sec:.1f} msg/s, {self['bytes'] / 1024 / sec:.1f} KiB/s"
+        )
+
+
+class ParsePipeline:
+    """
+    Один поток-потребитель. Задание — ``fn(state, *args)``, где ``state`` —
+    результат ``setup()`` в потоке-разборщике (например, своё соединение
+    SQLite: объекты sqlite3 нельзя передавать между потоками). Задания
+    выполняются строго по порядку постановки, поэтому «сохранить контрольную
+    точку» после вложений папки выполнится только после их записи.
+
+    ``group`` (папка/ящик) у задания: упавшее задание помечает группу в
+    ``failed_groups``, а задание с ``only_if_ok=True`` (контрольная точка)
+    в такой группе пропускается — иначе точка уйдёт за незаписанные отчёты.
+    Ошибки копятся в ``errors``; вызывающий после ``close()`` обязан их проверить.
+    Если упал сам ``setup()`` (например, SQLite не открыл БД), поток не
+    запускает ни одного задания, а ``submit()``/``close()`` поднимают эту ошибку
+    вместо вечного ожидания на полной очереди.
+    """
+
+    _STOP = object()
+
+    def __init__(self, setup: Callable[[], Any] = lambda: None,
+                 teardown: Optional[Callable[[Any], None]] = None, maxsize: int = 32):
+        self._setup = setup
+        self._teardown = teardown
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+        self.errors: List[BaseException] = []
+        self.failed_groups: Set[str] = set()
+        self.busy_sec = 0.0
+        self._ready = threading.Event()
+        self._setup_error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="imap-parse", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, group: Optional[str] = None,
+               only_if_ok: bool = False) -> None:
+        self._ready.wait()
+        if self._setup_error is not None:
+            raise self._setup_error
+        self._q.put((fn, args, group, only_if_ok))
+
+    def _run(self) -> None:
+        try:
+            state = self._setup()
+        except BaseException as e:
+            log.exception("parse pipeline setup failed")
+            self._setup_error = e
+            return
+        finally:
+            self._ready.set()
+        try:
+            while True:
+                item = self._q.get()
+                if item is self._STOP:
+                    break
+                fn, args, group, only_if_ok = item
+                name = getattr(fn, "__name__", fn)
+                if only_if_ok and group in self.failed_groups:
+                    log.warning("parse job %s skipped: earlier jobs for %s failed", name, group)
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    fn(state, *args)
+                except Exception as e:
+                    log.exception("parse job %s failed (%s)", name, group or "-")
+                    self.errors.append(e)
+                    if group is not None:
+                        self.failed_groups.add(group)
+                finally:
+                    self.busy_sec += time.perf_counter() - t0
+        finally:
+            if self._teardown is not None:
+                self._teardown(state)
+
+    def close(self) -> None:
+        """Дождаться всех заданий и остановить поток."""
+        self._ready.wait()
+        if self._setup_error is not None:
+            self._thread.join()
+            raise self._setup_error
+        self._q.put(self._STOP)
+        self._thread.join()
@@ -0,0 +1,151 @@
+# app/services/imap_sync.py
+"""
+Инкрементальная синхронизация IMAP по UID.
+
+Для каждой пары (аккаунт, папка) и импортёра хранится контрольная точка:
+UIDVALIDITY папки и последний обработанный UID. Следующий запуск ищет
+только ``UID last+1:*`` — без окна дат и без повторного скачивания уже
+разобранных писем. Полный проход (по окну дат, как раньше) делается, если:
+
+- контрольной точки ещё нет;
+- сервер сменил UIDVALIDITY (папку пересоздали — старые UID ничего не значат);
+- изменился набор привязок (``fingerprint``): новая привязка должна увидеть
+  письма, которые прошлые запуски пропустили как «чужие».
+
+Таблица живёт в БД самого импортёра (yandex_metrics.db / campaign_hub.db).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+DDL = """
+CREATE TABLE IF NOT EXISTS imap_sync_state (
+  account      TEXT    NOT NULL,     -- user@host
+  folder       TEXT    NOT NULL,
+  scope        TEXT    NOT NULL,     -- 'yandex' | 'verifier'
+  uidvalidity  INTEGER NOT NULL,
+  last_uid     INTEGER NOT NULL,
+  fingerprint  TEXT    NOT NULL DEFAULT '',
+  updated_at   TEXT    DEFAULT (datetime('now')),
+  PRIMARY KEY (account, folder, scope)
+);
+"""
+
+
+@dataclass
+class SyncPlan:
+    """Что искать в папке: ``since_uid`` None — полный проход по окну дат."""
+    account: str
+    folder: str
+    scope: str
+    uidvalidity: int
+    uidnext: int
+    fingerprint: str
+    since_uid: Optional[int] = None
+    reason: str = ""
+
+    @property
+    def incremental(self) -> bool:
+        return self.since_uid is not None
+
+    @property
+    def up_to_date(self) -> bool:
+        """UIDNEXT не сдвинулся — новых писем нет, SEARCH можно не делать."""
+        return self.incremental and 0 < self.uidnext <= self.since_uid + 1
+
+    def criteria(self, *rest: Any, since: Optional[str] = None) -> List[Any]:
+        """Критерии UID SEARCH: ``UID n:*`` в инкрементальном режиме, иначе SINCE."""
+        if self.incremental:
+            return ["UID", f"{self.since_uid + 1}:*", *rest]
+        return [*rest, "SINCE", since] if since else list(rest)
+
+    def new_uids(self, uids: Iterable[int]) -> List[int]:
+        # "UID n:*" всегда возвращает хотя бы последнее письмо, даже если его UID < n
+        if not self.incremental:
+            return list(uids)
+        return [u for u in uids if u > self.since_uid]
+
+    def high_water(self, seen: Iterable[int]) -> int:
+        """
+        Новая контрольная точка: всё ниже UIDNEXT на момент SELECT уже было
+        в папке и попало в поиск, плюс письма, пришедшие после SELECT.
+        """
+        top = max(seen, default=0)
+        if self.uidnext:
+            top = max(top, self.uidnext - 1)
+        if self.incremental:
+            top = max(top, self.since_uid)
+        return top
+
+
+def account_key(user: str, host: str) -> str:
+    return f"{(user or '').strip().lower()}@{(host or '').strip().lower()}"
+
+
+def fingerprint(bindings: Any) -> str:
+    """Короткий хэш набора привязок (любая JSON-сериализуемая структура)."""
+    raw = json.dumps(bindings, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+
+
+def load(conn: sqlite3.Connection, account: str, folder: str, scope: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        "SELECT uidvalidity, last_uid, fingerprint FROM imap_sync_state WHERE account=? AND folder=? AND scope=?",
+        (account, folder, scope),
+    ).fetchone()
+    if row is None:
+        return None
+    return {"uidvalidity": int(row[0]), "last_uid": int(row[1]), "fingerprint": row[2] or ""}
+
+
+def plan(conn: sqlite3.Connection, account: str, folder: str, scope: str,
+         select_info: Dict[str, int], fp: str = "", full: bool = False) -> SyncPlan:
+    """Сравнить контрольную точку с ответом SELECT и решить: инкремент или полный проход."""
+    ensure_schema(conn)
+    p = SyncPlan(
+        account=account, folder=folder, scope=scope,
+        uidvalidity=int(select_info.get("UIDVALIDITY") or 0),
+        uidnext=int(select_info.get("UIDNEXT") or 0),
+        fingerprint=fp,
+    )
+    state = load(conn, account, folder, scope)
+    if full:
+        p.reason = "forced full resync"
+    elif state is None:
+        p.reason = "no checkpoint"
+    elif not p.uidvalidity or state["uidvalidity"] != p.uidvalidity:
+        p.reason = f"UIDVALIDITY changed {state['uidvalidity']} -> {p.uidvalidity}"
+    elif state["fingerprint"] != fp:
+        p.reason = "bindings changed"
+    else:
+        p.since_uid = state["last_uid"]
+        p.reason = f"incremental from UID {state['last_uid'] + 1}"
+    return p
+
+
+def save(conn: sqlite3.Connection, p: SyncPlan, last_uid: int) -> None:
+    """Записать контрольную точку; вызывать только после успешной обработки папки."""
+    if not p.uidvalidity:
+        return      # сервер не сообщил UIDVALIDITY — UID между сессиями не сравнимы
+    ensure_schema(conn)
+    conn.execute(
+        """
+        INSERT INTO imap_sync_state (account, folder, scope, uidvalidity, last_uid, fingerprint, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(account, folder, scope) DO UPDATE SET
+          uidvalidity = excluded.uidvalidity,
+          last_uid    = excluded.last_uid,
+          fingerprint = excluded.fingerprint,
+          updated_at  = excluded.updated_at
+        """,
+        (p.account, p.folder, p.scope, p.uidvalidity, int(last_uid), p.fingerprint),
+    )
+    conn.commit()
@@ -1,80 +1,502 @@
-# app/services/imap_utils.py
-from __future__ import annotations
-import imaplib, re, logging
-from typing import Iterable, Tuple, List
-
-log = logging.getLogger("app")
-
-# --- санитайзеры ---
-def _sanitize_user_login(u: str) -> str:
-    if u is None: return ""
-    u = u.strip()
-    return (u.replace("\u00A0","").replace("\u2009","")
-             .replace("\u202F","").replace("\u200B",""))
-
-def _sanitize_app_password(p: str) -> str:
-    if p is None: return ""
-    p2 = re.sub(r"\s+", "", p, flags=re.UNICODE)
-    return (p2.replace("\u00A0","").replace("\u2009","")
-              .replace("\u202F","").replace("\u200B",""))
-
-def _sanitize_password_general(p: str) -> str:
-    if p is None: return ""
-    p2 = p.replace("\r","").replace("\n","").replace("\t","")
-    return (p2.replace("\u00A0","").replace("\u2009","")
-              .replace("\u202F","").replace("\u200B",""))
-
-class IMAPCompatClient:
-    """
-    Мини-обёртка над imaplib с интерфейсом, похожим на imapclient.IMAPClient.
-    Достаточно для list_folders/select_folder/search/fetch/logout.
-    """
-    def __init__(self, host: str, port: int = 993, ssl: bool = True):
-        if not ssl:
-            self._conn = imaplib.IMAP4(host, port)
-        else:
-            self._conn = imaplib.IMAP4_SSL(host, port)
-
-    # --- API совместимый ---
-    def login(self, user: str, password: str, two_factor: str | None = None):
-        user = _sanitize_user_login(user or "")
-        pwd = _sanitize_password_general(password or "")
-        if (two_factor or "").lower() == "app_password":
-            pwd = _sanitize_app_password(password or "")
-        # ВАЖНО: imaplib.login ожидает СТРОКИ, он сам кодирует
-        self._conn.login(user, pwd)
-        log.debug("IMAP string-login ok for %r (len=%d, 2FA=%s)", user, len(pwd), two_factor)
-    def select_folder(self, name: str, readonly: bool = True):
-        # imaplib: readonly=True -> 'READ-ONLY'
-        self._conn.select(f'"{name}"', readonly=readonly)
-
-    def search(self, criteria: str | Iterable[str] = 'ALL') -> List[bytes]:
-        # imaplib принимает критерии как отдельные args
-        if isinstance(criteria, str):
-            args = (None, criteria)
-        else:
-            args = (None, *criteria)
-        typ, data = self._conn.search(*args)
-        if typ != "OK" or not data:
-            return []
-        # data = [b'1 2 3']
-        return [uid for uid in data[0].split() if uid]
-
-    def fetch(self, uids: Iterable[bytes], parts: str = '(RFC822)') -> dict:
-        # imapclient возвращает dict; сделаем похожий
-        out = {}
-        for uid in uids:
-            typ, data = self._conn.fetch(uid, parts)
-            out[uid] = data
-        return out
-
-    def logout(self):
-        try:
-            self._conn.logout()
-        except Exception:
-            pass
-
-
+# app/services/imap_utils.py
+from __future__ import annotations
+import base64, imaplib, quopri, re, logging, select, ssl as _ssl, time
+from dataclasses import dataclass
+from email.header import decode_header, make_header
+from email.utils import decode_rfc2231
+from typing import Any, Dict, Iterable, Iterator, Tuple, List, Optional
+from urllib.parse import unquote
+
+log = logging.getLogger("app")
+
+# --- санитайзеры ---
+def _sanitize_user_login(u: str) -> str:
+    if u is None: return ""
+    u = u.strip()
+    return (u.replace("\u00A0","").replace("\u2009","")
+             .replace("\u202F","").replace("\u200B",""))
+
+def _sanitize_app_password(p: str) -> str:
+    if p is None: return ""
+    p2 = re.sub(r"\s+", "", p, flags=re.UNICODE)
+    return (p2.replace("\u00A0","").replace("\u2009","")
+              .replace("\u202F","").replace("\u200B",""))
+
+def _sanitize_password_general(p: str) -> str:
+    if p is None: return ""
+    p2 = p.replace("\r","").replace("\n","").replace("\t","")
+    return (p2.replace("\u00A0","").replace("\u2009","")
+              .replace("\u202F","").replace("\u200B",""))
+
+# --- разбор ответов FETCH (ENVELOPE / BODYSTRUCTURE / BODY[...]) ---
+_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"\[]+(?:\[[^\]]*\][^\s()"]*)?))')
+_LITERAL_RE = re.compile(rb'\{(\d+)\}\s*$')
+
+
+class _Literal(bytes):
+    """Тело литерала {n} — отличаем от атомов при разборе."""
+
+
+def _tokens(data: Iterable[Any]) -> Iterator[Any]:
+    # imaplib режет ответ на куски по литералам: (текст до {n}, литерал), хвост, ...
+    for item in data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            head, lit = item
+            head = _LITERAL_RE.sub(b"", head)
+            yield from _scan(head)
+            yield _Literal(lit)
+        else:
+            yield from _scan(item)
+
+
+def _scan(chunk: bytes) -> Iterator[Any]:
+    pos, n = 0, len(chunk)
+    while pos < n:
+        m = _TOKEN_RE.match(chunk, pos)
+        if not m or m.end() == pos:
+            break
+        pos = m.end()
+        if m.group(1):
+            yield "("
+        elif m.group(2):
+            yield ")"
+        elif m.group(3) is not None:
+            yield re.sub(rb'\\(.)', rb'\1', m.group(3))
+        elif m.group(4):
+            yield None if m.group(4).upper() == b"NIL" else m.group(4)
+
+
+def _sexpr(tokens: Iterator[Any]) -> List[Any]:
+    out: List[Any] = []
+    for tok in tokens:
+        if tok == "(":
+            out.append(_sexpr(tokens))
+        elif tok == ")":
+            return out
+        else:
+            out.append(tok)
+    return out
+
+
+def parse_fetch_response(data: Iterable[Any]) -> Dict[int, Dict[str, Any]]:
+    """
+    Ответ imaplib на (UID) FETCH -> {uid: {"ENVELOPE": [...], "BODY[2]": b"...", ...}}.
+    Ключи — атомы в верхнем регистре (BODY.PEEK[x] сервер отдаёт как BODY[x]).
+    Незапрошенные FETCH без UID (например, FLAGS) пропускаются.
+    """
+    flat = _sexpr(_tokens(data))
+    out: Dict[int, Dict[str, Any]] = {}
+    # поток: <seq> (<items>) <seq> (<items>) ...
+    for item in flat:
+        if not isinstance(item, list):
+            continue
+        attrs: Dict[str, Any] = {}
+        for i in range(0, len(item) - 1, 2):
+            key = item[i]
+            if isinstance(key, bytes):
+                attrs[key.decode("ascii", "replace").upper()] = item[i + 1]
+        uid = attrs.get("UID")
+        if uid is None:
+            continue
+        try:
+            out[int(uid)] = attrs
+        except ValueError:
+            continue
+    return out
+
+
+def _text(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, bytes):
+        v = v.decode("utf-8", "replace")
+    try:
+        return str(make_header(decode_header(v)))
+    except Exception:
+        return str(v)
+
+
+@dataclass
+class Envelope:
+    subject: str
+    message_id: str
+    date: str
+    from_addr: str
+
+
+def parse_envelope(env: Any) -> Envelope:
+    """ENVELOPE: (date subject from sender reply-to to cc bcc in-reply-to message-id)."""
+    env = env if isinstance(env, list) else []
+    field = lambda i: env[i] if len(env) > i else None  # noqa: E731
+    addr = ""
+    frm = field(2)
+    if isinstance(frm, list) and frm and isinstance(frm[0], list) and len(frm[0]) >= 4:
+        mbox, host = frm[0][2], frm[0][3]
+        addr = f"{_text(mbox)}@{_text(host)}".lower() if mbox and host else ""
+    return Envelope(
+        subject=_text(field(1)),
+        message_id=_text(field(9)).strip(),
+        date=_text(field(0)),
+        from_addr=addr,
+    )
+
+
+@dataclass
+class BodyPart:
+    section: str          # "1", "2.1" — для BODY.PEEK[section]
+    ctype: str            # "application/zip"
+    encoding: str         # "base64", "quoted-printable", "7bit", ...
+    size: int             # размер в закодированном виде
+    filename: Optional[str]
+    disposition: str = ""
+
+
+def _params(v: Any) -> Dict[str, str]:
+    if not isinstance(v, list):
+        return {}
+    out = {}
+    for i in range(0, len(v) - 1, 2):
+        if isinstance(v[i], bytes):
+            out[v[i].decode("ascii", "replace").lower()] = v[i + 1].decode("utf-8", "replace") if isinstance(v[i + 1], bytes) else ""
+    return out
+
+
+def _param_filename(params: Dict[str, str], *names: str) -> Optional[str]:
+    for name in names:
+        if params.get(name):
+            return _text(params[name])
+        # RFC 2231: name*=utf-8''%D0..., name*0*=..., name*1*=...
+        star = params.get(name + "*")
+        if star is None:
+            chunks = sorted(
+                (int(k[len(name) + 1:].rstrip("*")), v) for k, v in params.items()
+                if re.fullmatch(re.escape(name) + r"\*\d+\*?", k)
+            )
+            if chunks:
+                star = "".join(v for _, v in chunks)
+        if star:
+            charset, _lang, value = decode_rfc2231(star)
+            try:
+                return unquote(value, encoding=charset or "utf-8", errors="replace")
+            except LookupError:
+                return unquote(value)
+    return None
+
+
+def parse_bodystructure(bs: Any, prefix: str = "") -> List[BodyPart]:
+    """BODYSTRUCTURE -> плоский список листовых частей с номерами секций."""
+    if not isinstance(bs, list) or not bs:
+        return []
+    if isinstance(bs[0], list):
+        # multipart: (part1)(part2)... subtype [ext]
+        parts: List[BodyPart] = []
+        n = 0
+        for child in bs:
+            if not isinstance(child, list):
+                break
+            n += 1
+            parts.extend(parse_bodystructure(child, f"{prefix}.{n}" if prefix else str(n)))
+        return parts
+
+    mtype = _text(bs[0]).lower()
+    subtype = _text(bs[1]).lower() if len(bs) > 1 else ""
+    ct_params = _params(bs[2]) if len(bs) > 2 else {}
+    encoding = _text(bs[5]).lower() if len(bs) > 5 else ""
+    try:
+        size = int(bs[6]) if len(bs) > 6 and bs[6] is not None else 0
+    except ValueError:
+        size = 0
+    # расширенные поля: у text/* есть lines, у message/rfc822 — envelope, body, lines
+    if mtype == "text":
+        disp_idx = 9
+    elif mtype == "message" and subtype == "rfc822":
+        disp_idx = 11
+    else:
+        disp_idx = 8
+    disposition, disp_params = "", {}
+    disp = bs[disp_idx] if len(bs) > disp_idx else None
+    if isinstance(disp, list) and disp:
+        disposition = _text(disp[0]).lower()
+        disp_params = _params(disp[1]) if len(disp) > 1 else {}
+    filename = _param_filename(disp_params, "filename") or _param_filename(ct_params, "name")
+    # у одночастного письма единственная часть — секция 1
+    return [BodyPart(prefix or "1", f"{mtype}/{subtype}", encoding, size, filename, disposition)]
+
+
+def decode_part(data: bytes, encoding: str) -> bytes:
+    """Снять Content-Transfer-Encoding с тела, полученного через BODY[section]."""
+    enc = (encoding or "").lower()
+    if enc == "base64":
+        return base64.b64decode(data, validate=False)
+    if enc == "quoted-printable":
+        return quopri.decodestring(data)
+    return data
+
+
+class SectionTooLarge(Exception):
+    """Часть письма больше разрешённого размера — скачивание прервано."""
+
+
+class StreamDecoder:
+    """
+    Снятие Content-Transfer-Encoding по кускам: base64 декодируется
+    кратными 4 символам, quoted-printable — целыми строками, остаток
+    ждёт следующего куска.
+    """
+
+    def __init__(self, encoding: str):
+        self.enc = (encoding or "").lower()
+        self._tail = b""
+
+    def feed(self, data: bytes) -> bytes:
+        if self.enc == "base64":
+            buf = self._tail + b"".join(data.split())
+            cut = len(buf) - len(buf) % 4
+            self._tail = buf[cut:]
+            return base64.b64decode(buf[:cut], validate=False)
+        if self.enc == "quoted-printable":
+            buf = self._tail + data
+            cut = buf.rfind(b"\n") + 1
+            self._tail = buf[cut:]
+            return quopri.decodestring(buf[:cut])
+        return data
+
+    def flush(self) -> bytes:
+        tail, self._tail = self._tail, b""
+        return decode_part(tail, self.enc) if tail else b""
+
+
+def chunked(seq: List[Any], size: int) -> Iterator[List[Any]]:
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def uid_set(uids: Iterable[int]) -> str:
+    """[1,2,3,7,9,10] -> '1:3,7,9:10' — короче команда на больших выборках."""
+    ranges: List[str] = []
+    start = prev = None
+    for u in sorted(set(int(x) for x in uids)):
+        if start is None:
+            start = prev = u
+        elif u == prev + 1:
+            prev = u
+        else:
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = prev = u
+    if start is not None:
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+class IMAPCompatClient:
+    """
+    Мини-обёртка над imaplib с интерфейсом, похожим на imapclient.IMAPClient.
+    Достаточно для list_folders/select_folder/search/fetch/logout.
+
+    Для импортёров есть UID-команды: ``uid_search``, ``uid_fetch`` (один
+    запрос на набор UID, ответ уже разобран) и ``fetch_sections`` — скачать
+    только нужные части писем через BODY.PEEK[section]; ``stream_section``
+    пишет большую часть в файл кусками.
+
+    Для слушателя — ``idle()`` (RFC 2177; в imaplib до 3.14 его нет) и
+    ``noop()``; оба возвращают имена пришедших untagged-событий.
+    """
+    def __init__(self, host: str, port: int = 993, ssl: bool = True):
+        if not ssl:
+            self._conn = imaplib.IMAP4(host, port)
+        else:
+            self._conn = imaplib.IMAP4_SSL(host, port)
+
+    # --- API совместимый ---
+    def login(self, user: str, password: str, two_factor: str | None = None):
+        user = _sanitize_user_login(user or "")
+        pwd = _sanitize_password_general(password or "")
+        if (two_factor or "").lower() == "app_password":
+            pwd = _sanitize_app_password(password or "")
+        # ВАЖНО: imaplib.login ожидает СТРОКИ, он сам кодирует
+        self._conn.login(user, pwd)
+        log.debug("IMAP string-login ok for %r (len=%d, 2FA=%s)", user, len(pwd), two_factor)
+    def select_folder(self, name: str, readonly: bool = True) -> Dict[str, int]:
+        # imaplib: readonly=True -> 'READ-ONLY'
+        typ, data = self._conn.select(f'"{name}"', readonly=readonly)
+        if typ != "OK":
+            raise imaplib.IMAP4.error(f"SELECT {name!r} failed: {data!r}")
+        info: Dict[str, int] = {}
+        for key in ("EXISTS", "UIDVALIDITY", "UIDNEXT"):
+            _, val = self._conn.response(key)
+            try:
+                info[key] = int(val[-1]) if val and val[-1] is not None else 0
+            except (TypeError, ValueError):
+                info[key] = 0
+        return info
+
+    def search(self, criteria: str | Iterable[str] = 'ALL') -> List[bytes]:
+        # imaplib принимает критерии как отдельные args
+        if isinstance(criteria, str):
+            args = (None, criteria)
+        else:
+            args = (None, *criteria)
+        typ, data = self._conn.search(*args)
+        if typ != "OK" or not data:
+            return []
+        # data = [b'1 2 3']
+        return [uid for uid in data[0].split() if uid]
+
+    def fetch(self, uids: Iterable[bytes], parts: str = '(RFC822)') -> dict:
+        # imapclient возвращает dict; сделаем похожий
+        out = {}
+        for uid in uids:
+            typ, data = self._conn.fetch(uid, parts)
+            out[uid] = data
+        return out
+
+    def uid_search(self, *criteria: Any, charset: Optional[str] = None) -> List[int]:
+        typ, data = self._conn.uid("SEARCH", *((("CHARSET", charset) if charset else ()) + criteria))
+        if typ != "OK" or not data or not data[0]:
+            return []
+        return [int(u) for u in data[0].split() if u.isdigit()]
+
+    def uid_fetch(self, uids: Iterable[int], items: str) -> Dict[int, Dict[str, Any]]:
+        """Одна команда UID FETCH на весь набор; ответ -> parse_fetch_response."""
+        uids = list(uids)
+        if not uids:
+            return {}
+        typ, data = self._conn.uid("FETCH", uid_set(uids), items)
+        if typ != "OK":
+            raise imaplib.IMAP4.error(f"UID FETCH failed: {data!r}")
+        return parse_fetch_response(data)
+
+    def fetch_sections(self, uids: Iterable[int], section: str) -> Dict[int, bytes]:
+        """Тело одной MIME-части для набора писем (без флага \\Seen и без остального письма)."""
+        got = self.uid_fetch(uids, f"(UID BODY.PEEK[{section}])")
+        key = f"BODY[{section}]"
+        return {uid: attrs.get(key) or b"" for uid, attrs in got.items()}
+
+    SECTION_CHUNK = 1 << 20
+
+    def stream_section(self, uid: int, section: str, encoding: str, out: Any,
+                       limit: Optional[int] = None, chunk: Optional[int] = None) -> int:
+        """
+        Часть письма кусками ``BODY.PEEK[section]<offset.chunk>`` сразу в
+        ``out`` (всё, у чего есть ``write``), уже декодированной. В памяти —
+        один кусок, а не всё вложение. Больше ``limit`` байт — SectionTooLarge.
+        Возвращает число записанных байт.
+        """
+        chunk = chunk or self.SECTION_CHUNK
+        dec = StreamDecoder(encoding)
+        offset = written = 0
+        while True:
+            got = self.uid_fetch([uid], f"(UID BODY.PEEK[{section}]<{offset}.{chunk}>)")
+            data = (got.get(uid) or {}).get(f"BODY[{section}]<{offset}>") or b""
+            piece = dec.feed(data)
+            if len(data) < chunk:
+                piece += dec.flush()
+            written += len(piece)
+            if limit is not None and written > limit:
+                raise SectionTooLarge(f"UID {uid} part {section}: over {limit} bytes")
+            if piece:
+                out.write(piece)
+            if len(data) < chunk:
+                return written
+            offset += len(data)
+
+    def add_flags(self, uids: Iterable[int], flags: Iterable[str]) -> None:
+        uids = list(uids)
+        if uids:
+            self._conn.uid("STORE", uid_set(uids), "+FLAGS", "(" + " ".join(flags) + ")")
+
+    # --- push: IDLE / NOOP ---
+    EVENTS = ("EXISTS", "RECENT", "EXPUNGE", "FETCH")
+
+    @property
+    def has_idle(self) -> bool:
+        return "IDLE" in self._conn.capabilities
+
+    def _take_events(self) -> List[str]:
+        ur = self._conn.untagged_responses
+        return [k for k in self.EVENTS if ur.pop(k, None) is not None]
+
+    def noop(self) -> List[str]:
+        """NOOP: держит соединение живым и забирает накопившиеся EXISTS/EXPUNGE."""
+        self._take_events()
+        typ, data = self._conn.noop()
+        if typ != "OK":
+            raise imaplib.IMAP4.error(f"NOOP failed: {data!r}")
+        return self._take_events()
+
+    def _buffered(self) -> bool:
+        """
+        Есть ли непрочитанное в буфере imaplib (``conn.file``): несколько
+        untagged-строк одним пакетом оседают там, и select() на сокете их не видит.
+        peek на время делается неблокирующим — пустой буфер не ждёт сеть.
+        """
+        conn = self._conn
+        sock = conn.sock
+        prev = sock.gettimeout()
+        sock.settimeout(0.0)
+        try:
+            return bool(conn.file.peek(1))
+        except (BlockingIOError, _ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(prev)
+
+    def _readable(self, timeout: float) -> bool:
+        sock = self._conn.sock
+        if isinstance(sock, _ssl.SSLSocket) and sock.pending():
+            return True
+        if self._buffered():
+            return True
+        r, _, _ = select.select([sock], [], [], max(0.0, timeout))
+        return bool(r)
+
+    def idle(self, timeout: float, stop: Optional[Any] = None, tick: float = 1.0) -> List[str]:
+        """
+        Держать IDLE до первого события, ``timeout`` секунд или ``stop()``.
+        Затем DONE и ожидание тегированного OK. Возвращает список событий
+        (пустой — вышли по таймауту). Сервер без IDLE -> imaplib.IMAP4.error.
+
+        Ответы читаются через imaplib (_get_response), поэтому литералы и
+        untagged-данные разбираются так же, как в обычных командах.
+        """
+        conn = self._conn
+        if not self.has_idle:
+            raise imaplib.IMAP4.error("server does not support IDLE")
+        self._take_events()
+        tag = conn._new_tag()
+        conn.send(tag + b" IDLE\r\n")
+        # ждём "+ idling"; если сервер сразу ответил тегом — это отказ
+        while conn._get_response() is not None:
+            if conn.tagged_commands.get(tag) is not None:
+                typ, data = conn._get_tagged_response(tag)
+                raise imaplib.IMAP4.error(f"IDLE rejected: {typ} {data!r}")
+
+        events: List[str] = []
+        deadline = time.monotonic() + timeout
+        try:
+            while not events:
+                if stop is not None and stop():
+                    break
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                if self._readable(min(left, tick)):
+                    conn._get_response()
+                    events = self._take_events()
+        finally:
+            conn.send(b"DONE\r\n")
+            conn._command_complete("IDLE", tag)
+        return events + [e for e in self._take_events() if e not in events]
+
+    def logout(self):
+        try:
+            self._conn.logout()
+        except Exception:
+            pass
+
+
 
 
     # --- context manager support ---
@@ -86,4 +508,4 @@ class IMAPCompatClient:
             self.logout()
         finally:
             return False
-
+
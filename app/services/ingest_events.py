@@ -0,0 +1,114 @@
+# app/services/ingest_events.py
+"""
+Версии данных кампаний: «в кампанию приехали новые метрики».
+
+IDLE-слушатель scripts/imap_listener.py после каждого импорта вызывает
+``bump(campaign_ids, source)``: счётчик кампании в таблице ``ingest_versions``
+растёт на 1. Все источники пишут версии в одну БД — $CAMPAIGN_DB или
+campaign_hub.db в cwd, — независимо от того, в какую БД импорт записал данные.
+Читать версии можно через ``version(cid)`` / ``versions()``.
+
+Потребителей у версий пока нет: страницы кампаний их не проверяют
+(ручные правки daily5 версию не двигают, так что для ETag её мало).
+Внутри процесса можно подписаться на события: ``subscribe(fn)``,
+``fn(campaign_ids, source)`` вызывается после каждого ``bump``.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+log = logging.getLogger("app")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS ingest_versions (
+  campaign_id  INTEGER PRIMARY KEY,
+  version      INTEGER NOT NULL DEFAULT 0,
+  source       TEXT,
+  updated_at   TEXT DEFAULT (datetime('now'))
+);
+"""
+
+Listener = Callable[[List[int], str], None]
+_listeners: List[Listener] = []
+_lock = threading.Lock()
+
+
+def db_path() -> str:
+    return os.getenv("CAMPAIGN_DB") or os.path.join(os.getcwd(), "campaign_hub.db")
+
+
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or db_path())
+    conn.executescript(DDL)
+    return conn
+
+
+def subscribe(fn: Listener) -> None:
+    with _lock:
+        _listeners.append(fn)
+
+
+def unsubscribe(fn: Listener) -> None:
+    with _lock:
+        if fn in _listeners:
+            _listeners.remove(fn)
+
+
+def bump(campaign_ids: Iterable[int], source: str, path: Optional[str] = None) -> List[int]:
+    """Увеличить версии кампаний одной транзакцией и оповестить подписчиков."""
+    ids = sorted({int(c) for c in campaign_ids})
+    if not ids:
+        return ids
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO ingest_versions (campaign_id, version, source, updated_at)
+                VALUES (?, 1, ?, datetime('now'))
+                ON CONFLICT(campaign_id) DO UPDATE SET
+                  version = ingest_versions.version + 1,
+                  source = excluded.source,
+                  updated_at = excluded.updated_at
+                """,
+                [(cid, source) for cid in ids],
+            )
+    finally:
+        conn.close()
+    with _lock:
+        listeners = list(_listeners)
+    for fn in listeners:
+        try:
+            fn(ids, source)
+        except Exception:
+            log.exception("ingest listener failed")
+    return ids
+
+
+def version(campaign_id: int, path: Optional[str] = None) -> int:
+    conn = _connect(path)
+    try:
+        row = conn.execute("SELECT version FROM ingest_versions WHERE campaign_id=?", (int(campaign_id),)).fetchone()
+    finally:
+        conn.close()
+    return int(row[0]) if row else 0
+
+
+def versions(campaign_ids: Optional[Iterable[int]] = None, path: Optional[str] = None) -> Dict[int, int]:
+    conn = _connect(path)
+    try:
+        if campaign_ids is None:
+            rows = conn.execute("SELECT campaign_id, version FROM ingest_versions").fetchall()
+        else:
+            ids = [int(c) for c in campaign_ids]
+            rows = conn.execute(
+                f"SELECT campaign_id, version FROM ingest_versions WHERE campaign_id IN ({','.join('?' * len(ids))})",
+                ids,
+            ).fetchall() if ids else []
+    finally:
+        conn.close()
+    return {int(c): int(v) for c, v in rows}
@@ -0,0 +1,321 @@
+# app/services/log_reader.py
+"""
+Чтение логов без ``readlines()`` всего файла.
+
+* ``tail_lines`` — последние N строк (опционально только подходящие под
+  подстроку) блоками с конца файла: читается O(N строк), а не весь файл;
+* ``read_since`` — инкрементальное чтение «с байта X» для опроса; курсор
+  ``"<inode>:<offset>"`` переживает ротацию (если app.log уехал в
+  app.log.1, дочитываем хвост .1 и продолжаем новый файл с нуля);
+* ``search`` — поиск по app.log + app.log.1..5 в диапазоне времени.
+  Для ротированных файлов (они уже не меняются) строится разреженный
+  индекс «смещение -> время первой строки» точечными чтениями каждые
+  ``INDEX_STEP`` байт; по нему бинарным поиском находится начало
+  диапазона, файлы вне диапазона не открываются вовсе.
+
+Формат строки — из logging_setup: ``2025-10-26 23:08:06,123 LEVEL [name] msg``.
+"""
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BLOCK = 64 * 1024
+INDEX_STEP = 64 * 1024
+MAX_SINCE_BYTES = 1024 * 1024     # больше за один опрос не отдаём
+MAX_SCAN_BYTES = 32 * 1024 * 1024  # потолок чтения для tail с фильтром и search
+TS_LEN = 19                        # "YYYY-MM-DD HH:MM:SS"
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_index_lock = threading.Lock()
+# (path, inode, size, mtime_ns) -> (offsets, timestamps)
+_index_cache: Dict[Tuple[str, int, int, int], Tuple[List[int], List[datetime]]] = {}
+
+
+def parse_ts(line: str) -> Optional[datetime]:
+    """Время из начала строки лога; None для продолжений (traceback и т.п.)."""
+    if len(line) < TS_LEN or not line[:4].isdigit() or line[4] != "-":
+        return None
+    try:
+        return datetime.strptime(line[:TS_LEN], TS_FORMAT)
+    except ValueError:
+        return None
+
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+
+def line_level(line: str) -> Optional[int]:
+    """Числовой уровень строки (``... 23:08:06,123 WARNING [app] ...``); None для продолжений."""
+    if parse_ts(line) is None:
+        return None
+    parts = line[TS_LEN:TS_LEN + 16].split(None, 2)
+    return LEVELS.get(parts[1]) if len(parts) > 1 else None
+
+
+def level_no(name: str) -> int:
+    """'warning' -> 30; пусто/неизвестно -> 0 (всё)."""
+    return LEVELS.get((name or "").upper(), 0)
+
+
+def rotated_files(path: Path) -> List[Path]:
+    """app.log.N..1, app.log — от старых к новым, только существующие."""
+    out = []
+    for i in range(9, 0, -1):
+        p = path.with_name(f"{path.name}.{i}")
+        if p.exists():
+            out.append(p)
+    if path.exists():
+        out.append(path)
+    return out
+
+
+# ------------------ tail ------------------
+
+def _reverse_lines(f, end: int, budget: int) -> Iterator[bytes]:
+    """Строки файла от ``end`` к началу (без \\n), не больше ``budget`` байт."""
+    pos = end
+    rest = b""
+    read = 0
+    while pos > 0 and read < budget:
+        size = min(BLOCK, pos)
+        pos -= size
+        f.seek(pos)
+        chunk = f.read(size) + rest
+        read += size
+        parts = chunk.split(b"\n")
+        rest = parts[0]
+        for ln in reversed(parts[1:]):
+            yield ln
+    if rest and pos == 0:
+        yield rest
+
+
+def tail_lines(path: Path, n: int, q: str = "", level: int = 0) -> List[str]:
+    """
+    Последние ``n`` строк (с ``q``/``level`` — последние n подходящих), с
+    переводами строк. Продолжения (traceback) фильтруются вместе со своей
+    строкой по уровню и считаются отдельными строками.
+    """
+    if not path.exists():
+        return []
+    ql = q.lower()
+    filtered = bool(q or level)
+    out: List[str] = []
+    pending: List[str] = []  # продолжения, ждущие свою строку с уровнем (читаем с конца)
+    try:
+        with path.open("rb") as f:
+            end = f.seek(0, os.SEEK_END)
+            first = True
+            for raw in _reverse_lines(f, end, MAX_SCAN_BYTES if filtered else end):
+                if first:
+                    first = False
+                    if raw == b"":  # файл заканчивается на \n
+                        continue
+                ln = raw.decode("utf-8", errors="ignore") + "\n"
+                if level:
+                    lv = line_level(ln)
+                    if lv is None:
+                        pending.append(ln)
+                        continue
+                    group = [ln] + pending[::-1] if lv >= level else []
+                    pending = []
+                    # group — в прямом порядке; out копится в обратном
+                    for g in reversed(group):
+                        if not ql or ql in g.lower():
+                            out.append(g)
+                else:
+                    if ql and ql not in ln.lower():
+                        continue
+                    out.append(ln)
+                if len(out) >= n:
+                    break
+    except OSError:
+        return []
+    out = out[:n]
+    out.reverse()
+    return out
+
+
+# ------------------ since ------------------
+
+def make_cursor(ino: int, offset: int) -> str:
+    return f"{ino}:{offset}"
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        ino, off = cursor.split(":", 1)
+        return int(ino), max(0, int(off))
+    except (ValueError, AttributeError):
+        return 0, 0
+
+
+def end_cursor(path: Path) -> str:
+    """Курсор «конец текущего файла» — отсюда начинает опрос после первого tail."""
+    try:
+        st = path.stat()
+    except OSError:
+        return make_cursor(0, 0)
+    return make_cursor(st.st_ino, st.st_size)
+
+
+def _read_range(path: Path, offset: int, limit: int) -> Tuple[bytes, int]:
+    with path.open("rb") as f:
+        f.seek(offset)
+        data = f.read(limit)
+    # отдаём только целые строки; недописанная останется до следующего опроса
+    cut = data.rfind(b"\n") + 1
+    return data[:cut], offset + cut
+
+
+def read_since(path: Path, cursor: str, q: str = "") -> Tuple[List[str], str]:
+    """Новые строки после курсора и новый курсор."""
+    ino, offset = parse_cursor(cursor)
+    try:
+        st = path.stat()
+    except OSError:
+        return [], make_cursor(0, 0)
+
+    chunks: List[bytes] = []
+    budget = MAX_SINCE_BYTES
+    if ino and ino != st.st_ino:
+        # файл ротировали: дочитать старый (теперь app.log.1), если он ещё там
+        prev = path.with_name(path.name + ".1")
+        try:
+            if prev.stat().st_ino == ino:
+                data, _ = _read_range(prev, offset, budget)
+                chunks.append(data)
+                budget -= len(data)
+        except OSError:
+            pass
+        offset = 0
+    elif offset > st.st_size:
+        offset = 0  # усечён (copytruncate)
+
+    data, new_off = _read_range(path, offset, max(0, budget))
+    chunks.append(data)
+    text = b"".join(chunks).decode("utf-8", errors="ignore")
+    lines = [ln + "\n" for ln in text.split("\n") if ln]
+    if q:
+        ql = q.lower()
+        lines = [ln for ln in lines if ql in ln.lower()]
+    return lines, make_cursor(st.st_ino, new_off)
+
+
+# ------------------ индекс ротированных файлов ------------------
+
+def _ts_at(f, offset: int, size: int) -> Tuple[Optional[int], Optional[datetime]]:
+    """Первая строка с временем не раньше offset: (начало строки, время)."""
+    f.seek(offset)
+    pos = offset
+    if offset:
+        skipped = f.readline()  # дочитать обрезанную строку
+        pos += len(skipped)
+    scanned = 0
+    while pos < size and scanned < INDEX_STEP:
+        raw = f.readline()
+        if not raw:
+            break
+        ts = parse_ts(raw[:TS_LEN].decode("ascii", errors="ignore"))
+        if ts is not None:
+            return pos, ts
+        pos += len(raw)
+        scanned += len(raw)
+    return None, None
+
+
+def build_index(path: Path) -> Tuple[List[int], List[datetime]]:
+    """Разреженный индекс (смещения, время) — кэшируется по (inode, size, mtime)."""
+    st = path.stat()
+    key = (str(path), st.st_ino, st.st_size, st.st_mtime_ns)
+    with _index_lock:
+        hit = _index_cache.get(key)
+    if hit is not None:
+        return hit
+    offsets: List[int] = []
+    stamps: List[datetime] = []
+    with path.open("rb") as f:
+        for off in range(0, st.st_size, INDEX_STEP):
+            pos, ts = _ts_at(f, off, st.st_size)
+            if ts is None or (offsets and pos <= offsets[-1]):
+                continue
+            if stamps and ts < stamps[-1]:
+                ts = stamps[-1]  # держим монотонность для bisect
+            offsets.append(pos)
+            stamps.append(ts)
+    with _index_lock:
+        for k in [k for k in _index_cache if k[0] == key[0]]:
+            del _index_cache[k]
+        _index_cache[key] = (offsets, stamps)
+    return offsets, stamps
+
+
+def _last_ts(path: Path) -> Optional[datetime]:
+    with path.open("rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        for raw in _reverse_lines(f, end, BLOCK * 4):
+            ts = parse_ts(raw[:TS_LEN].decode("ascii", errors="ignore"))
+            if ts is not None:
+                return ts
+    return None
+
+
+def search(
+    path: Path,
+    q: str = "",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 1000,
+    level: int = 0,
+) -> List[str]:
+    """
+    Строки из app.log и его ротаций в диапазоне [since, until] с подстрокой q
+    и уровнем не ниже ``level``.
+    Продолжения (traceback) идут вместе со своей строкой. Возвращает первые
+    ``limit`` совпадений по времени.
+    """
+    ql = q.lower()
+    out: List[str] = []
+    read_total = 0
+    for p in rotated_files(path):
+        try:
+            offsets, stamps = build_index(p)
+        except OSError:
+            continue
+        if not offsets:
+            continue
+        if until is not None and stamps[0] > until:
+            break  # этот и все следующие файлы позже диапазона
+        if since is not None:
+            last = _last_ts(p)
+            if last is not None and last < since:
+                continue
+            # последняя индексная точка не позже since
+            i = bisect.bisect_right(stamps, since) - 1
+            start = offsets[i] if i >= 0 else 0
+        else:
+            start = 0
+
+        keep = False  # входит ли текущая «запись» (строка + продолжения) в диапазон
+        with p.open("rb") as f:
+            f.seek(start)
+            for raw in f:
+                read_total += len(raw)
+                ln = raw.decode("utf-8", errors="ignore")
+                ts = parse_ts(ln)
+                if ts is not None:
+                    if until is not None and ts > until:
+                        return out
+                    keep = (since is None or ts >= since) and (not level or (line_level(ln) or 0) >= level)
+                if keep and (not ql or ql in ln.lower()):
+                    out.append(ln if ln.endswith("\n") else ln + "\n")
+                    if len(out) >= limit:
+                        return out
+                if read_total > MAX_SCAN_BYTES:
+                    return out
+    return out
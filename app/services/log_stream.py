@@ -0,0 +1,126 @@
+# app/services/log_stream.py
+"""
+Живой хвост app.log для SSE (/logs/stream).
+
+Один общий «follower» на процесс читает новые строки через
+``log_reader.read_since`` (курсор переживает ротацию) и раскладывает их
+по очередям подписчиков; фильтр по уровню и подстроке — у подписчика.
+Follower запускается с первым подписчиком и останавливается с последним,
+так что без открытых вкладок /logs затрат нет.
+
+Изменения файла ловит ``watchfiles`` (inotify / ReadDirectoryChangesW),
+если пакет установлен; иначе — stat раз в ``POLL_SEC``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+from app.services import log_reader
+
+try:
+    import watchfiles  # type: ignore
+except ImportError:  # pragma: no cover
+    watchfiles = None
+
+log = logging.getLogger("app")
+
+POLL_SEC = 0.5
+QUEUE_SIZE = 2000
+MAX_BATCH = 500           # строк в одном SSE-событии
+
+Line = Tuple[int, str]    # (уровень, строка); продолжения наследуют уровень
+
+
+class Subscription:
+    def __init__(self, level: int = 0, q: str = ""):
+        self.level = level
+        self.q = q.lower()
+        self.queue: "asyncio.Queue[List[str]]" = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+
+    def offer(self, lines: List[Line]) -> None:
+        picked = [
+            ln for lv, ln in lines
+            if lv >= self.level and (not self.q or self.q in ln.lower())
+        ]
+        if not picked:
+            return
+        try:
+            self.queue.put_nowait(picked)
+        except asyncio.QueueFull:
+            # медленный клиент — теряет строки, follower не ждёт
+            self.dropped += len(picked)
+
+
+class LogFollower:
+    def __init__(self, path: Path):
+        self.path = path
+        self.subs: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._cursor = ""
+        self._last_level = 0
+
+    def subscribe(self, level: int = 0, q: str = "", cursor: str = "") -> Subscription:
+        """``cursor`` (из первого рендера страницы) учитывается, только если follower стартует сейчас."""
+        sub = Subscription(level, q)
+        self.subs.add(sub)
+        # _stop уже взведён — прежний цикл доживает последние миллисекунды, нужен новый
+        if self._task is None or self._task.done() or self._stop.is_set():
+            self._cursor = cursor or log_reader.end_cursor(self.path)
+            self._stop = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(self._stop))
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self.subs.discard(sub)
+        if not self.subs and self._stop is not None:
+            self._stop.set()
+
+    def _drain(self) -> None:
+        lines, self._cursor = log_reader.read_since(self.path, self._cursor)
+        if not lines:
+            return
+        tagged: List[Line] = []
+        for ln in lines:
+            lv = log_reader.line_level(ln)
+            if lv is not None:
+                self._last_level = lv
+            tagged.append((self._last_level, ln))
+        for sub in list(self.subs):
+            sub.offer(tagged)
+
+    async def _run(self, stop: asyncio.Event) -> None:
+        try:
+            if watchfiles is not None:
+                # следим за каталогом: при ротации app.log пересоздаётся
+                async for _ in watchfiles.awatch(self.path.parent, stop_event=stop, debounce=200):
+                    self._drain()
+            else:
+                while not stop.is_set():
+                    self._drain()
+                    try:
+                        await asyncio.wait_for(stop.wait(), timeout=POLL_SEC)
+                    except asyncio.TimeoutError:
+                        pass
+        except Exception:
+            log.exception("log follower failed")
+
+
+_followers: dict = {}
+
+
+def follower(path: Path) -> LogFollower:
+    f = _followers.get(str(path))
+    if f is None:
+        f = _followers[str(path)] = LogFollower(path)
+    return f
+
+
+def sse_event(lines: List[str], event: str = "") -> str:
+    """Строки -> одно SSE-событие (каждая строка — своё поле data:)."""
+    head = f"event: {event}\n" if event else ""
+    return head + "".join(f"data: {ln.rstrip(chr(10)).replace(chr(13), '')}\n" for ln in lines) + "\n"
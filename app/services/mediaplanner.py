@@ -10,7 +10,6 @@ import os
 import json
 from pathlib import Path
 
-import yaml
 from pydantic import BaseModel, ValidationError
 from typing import Dict
 
@@ -91,18 +90,9 @@ def _load_mp_cfg() -> dict:
     """
     Читает config.yaml и возвращает блок mediaplanner, если он есть.
     """
-    cfg_path = Path("config.yaml")
-    if not cfg_path.exists():
-        return {}
-    try:
-        cfg = yaml.safe_load(cfg_path.read_text(encoding="utf-8")) or {}
-        mp_cfg = cfg.get("mediaplanner") or {}
-        if not isinstance(mp_cfg, dict):
-            return {}
-        return mp_cfg
-    except Exception as exc:  # pragma: no cover
-        log.warning("Не удалось прочитать config.yaml: %s", exc)
-        return {}
+    from app.services import config_store
+
+    return config_store.snapshot().section("mediaplanner")
 
 
 CAPACITY_CACHE: dict | None = None
@@ -0,0 +1,375 @@
+# app/services/memory.py
+"""
+Память долгоживущего процесса: где растёт и кто съел.
+
+* tracemalloc включается по требованию (``start_tracing``) — постоянно его
+  держать дорого (×1.3–2 к аллокациям); снимки пишутся в
+  ``logs/memory/*.tmsnap`` и сравниваются по местам аллокации
+  (``diff_snapshots``: top N по приросту размера);
+* фоновый поток раз в ``perf.memory_interval_sec`` (по умолчанию 300 с)
+  пишет RSS / tracemalloc current+peak / счётчики GC в таблицу
+  ``memory_stats`` в ``logs/perf.db``; при ``perf.memory_snapshot_every: N``
+  и включённом tracemalloc — ещё и снимок каждые N замеров;
+* ``MemoryGuardMiddleware`` — предупреждение в лог, если запрос выделил
+  больше ``perf.request_alloc_warn_mb`` (по умолчанию 64 МБ). При
+  включённом tracemalloc в начале запроса сбрасывается пик
+  (``reset_peak``) и сравнивается пик traced-памяти за запрос с уровнем до
+  него — видно и то, что запрос выделил и успел отпустить (DataFrame на
+  гигабайт, собранный и выброшенный до ответа). Без tracemalloc — только
+  прирост RSS, то есть удержанное. Цифра всегда общая на процесс: в неё
+  попадают параллельные запросы и фоновые потоки, а чужой ``reset_peak``
+  может срезать пик — это оценка, но «тяжёлый» запрос видно. По той же
+  причине ``traced_peak_mb`` в истории — пик с начала последнего запроса.
+
+Скрипты-воркеры (импорт почты) могут звать ``start_tracing()`` /
+``take_snapshot("label")`` напрямую — БД и каталог те же.
+
+Страница: ``/debug/memory``.
+"""
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.services import perf
+
+log = logging.getLogger("app")
+
+SNAP_DIR = Path("logs") / "memory"
+SNAP_EXT = ".tmsnap"
+MAX_KEEP = 20                    # сколько снимков держать на диске
+DEFAULT_FRAMES = 10              # глубина стека tracemalloc
+DEFAULT_INTERVAL_SEC = 300.0
+DEFAULT_WARN_MB = 64.0
+HISTORY_KEEP_DAYS = 30
+
+DDL = """
+CREATE TABLE IF NOT EXISTS memory_stats (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts            TEXT    NOT NULL DEFAULT (datetime('now')),
+    pid           INTEGER NOT NULL,
+    rss_mb        REAL,
+    traced_mb     REAL,
+    traced_peak_mb REAL,
+    gc_objects    INTEGER,
+    gc_gen0       INTEGER,
+    gc_gen1       INTEGER,
+    gc_gen2       INTEGER,
+    gc_collections INTEGER,
+    gc_collected  INTEGER,
+    snapshot      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_memory_stats_ts ON memory_stats(ts);
+"""
+
+# Кадры самого профилирования и импорта — шум в сравнении снимков
+_NOISE = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_MB = 1024.0 * 1024.0
+
+_settings: Dict[str, float] = {
+    "interval_sec": DEFAULT_INTERVAL_SEC,
+    "snapshot_every": 0,
+    "warn_mb": DEFAULT_WARN_MB,
+}
+_sampler: Optional[threading.Thread] = None
+_sampler_lock = threading.Lock()
+
+
+# ------------------ RSS / GC ------------------
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса; без psutil — /proc (Linux) или WinAPI."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class _PMC(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            pmc = _PMC()
+            pmc.cb = ctypes.sizeof(_PMC)
+            proc = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(proc, ctypes.byref(pmc), pmc.cb):
+                return int(pmc.WorkingSetSize)
+        except Exception:
+            pass
+    try:
+        import resource
+        # ru_maxrss — пик, не текущее значение; лучше, чем ничего
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return int(peak if sys.platform == "darwin" else peak * 1024)
+    except Exception:
+        return 0
+
+
+def gc_stats(count_objects: bool = False) -> Dict[str, int]:
+    gen = gc.get_count()
+    stats = gc.get_stats()
+    out = {
+        "gc_gen0": gen[0],
+        "gc_gen1": gen[1],
+        "gc_gen2": gen[2],
+        "gc_collections": sum(s.get("collections", 0) for s in stats),
+        "gc_collected": sum(s.get("collected", 0) for s in stats),
+    }
+    if count_objects:
+        # len(gc.get_objects()) — десятки мс на большом heap, только в фоне
+        out["gc_objects"] = len(gc.get_objects())
+    return out
+
+
+def current_stats(count_objects: bool = False) -> Dict[str, Any]:
+    traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "pid": os.getpid(),
+        "rss_mb": round(rss_bytes() / _MB, 2),
+        "tracing": tracemalloc.is_tracing(),
+        "traced_mb": round(traced / _MB, 2),
+        "traced_peak_mb": round(peak / _MB, 2),
+        "tracemalloc_overhead_mb": round(tracemalloc.get_tracemalloc_memory() / _MB, 2),
+        **gc_stats(count_objects),
+    }
+
+
+# ------------------ tracemalloc ------------------
+
+def start_tracing(frames: int = DEFAULT_FRAMES) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, int(frames)))
+        log.info("tracemalloc started (%s frames)", frames)
+
+
+def stop_tracing() -> None:
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        log.info("tracemalloc stopped")
+
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", s).strip("_")[:40]
+
+
+def take_snapshot(label: str = "") -> Optional[str]:
+    """Снимок tracemalloc на диск; вернуть имя (без расширения) или None, если трассировка выключена."""
+    if not tracemalloc.is_tracing():
+        return None
+    snap = tracemalloc.take_snapshot().filter_traces(_NOISE)
+    SNAP_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+    if label:
+        name += f"_{_slug(label)}"
+    snap.dump(str(SNAP_DIR / f"{name}{SNAP_EXT}"))
+    _prune()
+    log.info("memory snapshot %s", name)
+    return name
+
+
+def _prune() -> None:
+    files = sorted(SNAP_DIR.glob(f"*{SNAP_EXT}"))
+    for f in files[:-MAX_KEEP]:
+        try:
+            f.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    if not SNAP_DIR.exists():
+        return []
+    out = []
+    for f in sorted(SNAP_DIR.glob(f"*{SNAP_EXT}"), reverse=True):
+        st = f.stat()
+        out.append({"name": f.stem, "size_kb": round(st.st_size / 1024, 1), "mtime": st.st_mtime})
+    return out
+
+
+def _snap_path(name: str) -> Optional[Path]:
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", name or ""):
+        return None
+    p = SNAP_DIR / f"{name}{SNAP_EXT}"
+    return p if p.is_file() else None
+
+
+def _stat_row(s) -> Dict[str, Any]:
+    frame = s.traceback[0]
+    return {
+        "site": f"{frame.filename.replace(chr(92), '/')}:{frame.lineno}",
+        "size_kb": round(s.size / 1024, 1),
+        "count": s.count,
+        "size_diff_kb": round(getattr(s, "size_diff", 0) / 1024, 1),
+        "count_diff": getattr(s, "count_diff", 0),
+    }
+
+
+def top_sites(name: str, limit: int = 30, key_type: str = "lineno") -> List[Dict[str, Any]]:
+    """Крупнейшие места аллокации в одном снимке."""
+    p = _snap_path(name)
+    if p is None:
+        return []
+    snap = tracemalloc.Snapshot.load(str(p))
+    return [_stat_row(s) for s in snap.statistics(key_type)[:limit]]
+
+
+def diff_snapshots(old: str, new: str, limit: int = 30, key_type: str = "lineno") -> List[Dict[str, Any]]:
+    """Места аллокации с наибольшим приростом размера между снимками old -> new."""
+    p_old, p_new = _snap_path(old), _snap_path(new)
+    if p_old is None or p_new is None:
+        return []
+    s_old = tracemalloc.Snapshot.load(str(p_old))
+    s_new = tracemalloc.Snapshot.load(str(p_new))
+    # compare_to уже сортирует по abs(size_diff)
+    return [_stat_row(s) for s in s_new.compare_to(s_old, key_type)[:limit]]
+
+
+# ------------------ история ------------------
+
+def record_sample(snapshot: Optional[str] = None) -> Dict[str, Any]:
+    st = current_stats(count_objects=True)
+    perf.PERF_DB.parent.mkdir(parents=True, exist_ok=True)
+    con = perf.raw_connect(str(perf.PERF_DB), timeout=5.0)
+    try:
+        con.executescript(DDL)
+        con.execute(
+            """
+            INSERT INTO memory_stats (pid, rss_mb, traced_mb, traced_peak_mb, gc_objects,
+                                      gc_gen0, gc_gen1, gc_gen2, gc_collections, gc_collected, snapshot)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (st["pid"], st["rss_mb"], st["traced_mb"], st["traced_peak_mb"], st["gc_objects"],
+             st["gc_gen0"], st["gc_gen1"], st["gc_gen2"], st["gc_collections"], st["gc_collected"],
+             snapshot),
+        )
+        con.execute("DELETE FROM memory_stats WHERE ts < datetime('now', ?)", (f"-{HISTORY_KEEP_DAYS} days",))
+        con.commit()
+    finally:
+        con.close()
+    return st
+
+
+def history(limit: int = 288) -> List[Dict[str, Any]]:
+    """Последние замеры (по умолчанию — сутки при интервале 5 минут), от старых к новым."""
+    if not perf.PERF_DB.exists():
+        return []
+    con = perf.raw_connect(str(perf.PERF_DB), timeout=5.0)
+    try:
+        con.executescript(DDL)
+        cur = con.execute("SELECT * FROM memory_stats ORDER BY id DESC LIMIT ?", (int(limit),))
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in reversed(cur.fetchall())]
+    finally:
+        con.close()
+
+
+def _sampler_loop() -> None:
+    n = 0
+    while True:
+        time.sleep(_settings["interval_sec"])
+        n += 1
+        try:
+            snap = None
+            every = int(_settings["snapshot_every"])
+            if every and n % every == 0:
+                snap = take_snapshot("auto")
+            record_sample(snap)
+        except Exception:
+            log.exception("memory sampler failed")
+
+
+def settings() -> Dict[str, float]:
+    return dict(_settings)
+
+
+# ------------------ guard на запрос ------------------
+
+class MemoryGuardMiddleware:
+    """
+    Лог-предупреждение, если запрос выделил память больше порога: пик
+    traced-памяти за запрос (tracemalloc) или прирост RSS (без него).
+    Счётчики общие на процесс — см. docstring модуля.
+    Ставить внутрь PerfMiddleware (add_middleware раньше него) — тогда в
+    сообщении есть шаблон маршрута.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        else:
+            before = rss_bytes()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not tracing:
+                after = rss_bytes()
+            elif tracemalloc.is_tracing():
+                after = tracemalloc.get_traced_memory()[1]     # пик, а не остаток
+            else:
+                after = before  # трассировку выключили посреди запроса
+            grown_mb = (after - before) / _MB
+            if grown_mb > _settings["warn_mb"]:
+                t = perf.current()
+                route = t.route_name() if t is not None else scope.get("path", "")
+                log.warning(
+                    "request memory +%.1f MB (%s) %s %s",
+                    grown_mb, "traced peak" if tracing else "rss", scope.get("method", ""), route,
+                )
+
+
+# ------------------ установка ------------------
+
+def install() -> None:
+    """Прочитать config.yaml ``perf.*``, при необходимости включить tracemalloc, запустить фоновый замер."""
+    global _sampler
+    from app.services import config_store
+
+    cfg = config_store.snapshot()
+    _settings["interval_sec"] = max(10.0, cfg.get_float("perf.memory_interval_sec", DEFAULT_INTERVAL_SEC))
+    _settings["snapshot_every"] = max(0, cfg.get_int("perf.memory_snapshot_every", 0))
+    _settings["warn_mb"] = cfg.get_float("perf.request_alloc_warn_mb", DEFAULT_WARN_MB)
+
+    frames = os.getenv("TRACEMALLOC_FRAMES") or cfg.get("perf.tracemalloc_frames")
+    if frames:
+        start_tracing(int(frames))
+
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sampler_loop, name="memory-sampler", daemon=True)
+            _sampler.start()
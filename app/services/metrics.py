@@ -0,0 +1,450 @@
+# app/services/metrics.py
+"""
+Метрики в текстовом формате Prometheus — без внешних зависимостей.
+
+Counter / Gauge / Histogram с метками, общий реестр и ``render()`` для
+``/metrics``. Скрипты импорта (yandex_import.py, verifier_import.py)
+работают отдельными процессами: они поднимают свои прошлые значения через
+``restore_textfile(name)`` и в конце сбрасывают реестр в
+``logs/metrics/<name>.prom`` (``write_textfile``). ``/metrics`` склеивает
+реестр веб-процесса с этими файлами; семплы из файла получают метку
+``script="<name>"`` — одни и те же ``job="yandex"`` у yandex_import и
+imap_listener иначе дали бы в выдаче две одинаковые серии.
+
+Готовые метрики: латентность запросов по маршрутам, длительность/исход
+задач (pull, margin, yandex, verifier, flights), строки по источникам,
+IMAP-письма, widget-события (скорость — ``rate()`` на стороне Prometheus)
+и число соединений с БД.
+"""
+from __future__ import annotations
+
+import functools
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+TEXTFILE_DIR = Path("logs") / "metrics"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+JOB_BUCKETS = (0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 3600.0)
+
+_registry: Dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _labels_str(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry[name] = self
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        out.extend(self._samples())
+        return out
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_labels_str(self.labelnames, values)} {_fmt(child.value)}"
+
+
+class Gauge(_Metric):
+    """Gauge; ``set_function`` — значение снимается в момент scrape."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, fn: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        self._collect = fn
+
+    def _samples(self):
+        items = list(self._children.items())
+        if self._collect is not None:
+            try:
+                items = [(tuple(str(x) for x in k), _ConstValue(v)) for k, v in self._collect().items()]
+            except Exception:
+                items = []
+        for values, child in items:
+            yield f"{self.name}{_labels_str(self.labelnames, values)} {_fmt(child.value)}"
+
+
+class _ConstValue:
+    __slots__ = ("value",)
+
+    def __init__(self, value: float):
+        self.value = float(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0.0] * len(bounds)  # кумулятивные (<= bound)
+        self.sum = 0.0
+        self.count = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, b in enumerate(self.bounds):
+                if value <= b:
+                    self.counts[i] += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            for b, c in zip(child.bounds, child.counts):
+                yield f"{self.name}_bucket{_labels_str(self.labelnames, values, ('le', _fmt(b)))} {_fmt(c)}"
+            yield f"{self.name}_bucket{_labels_str(self.labelnames, values, ('le', '+Inf'))} {_fmt(child.count)}"
+            yield f"{self.name}_sum{_labels_str(self.labelnames, values)} {_fmt(child.sum)}"
+            yield f"{self.name}_count{_labels_str(self.labelnames, values)} {_fmt(child.count)}"
+
+
+# ------------------ стандартные метрики приложения ------------------
+
+HTTP_REQUEST_DURATION = Histogram(
+    "campaignhub_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route"),
+)
+HTTP_REQUESTS = Counter(
+    "campaignhub_http_requests_total",
+    "HTTP requests by route template and status class",
+    ("method", "route", "status"),
+)
+JOB_DURATION = Histogram(
+    "campaignhub_job_duration_seconds",
+    "Duration of background/ingest jobs",
+    ("job",),
+    buckets=JOB_BUCKETS,
+)
+JOB_RUNS = Counter(
+    "campaignhub_job_runs_total",
+    "Job runs by outcome (ok|error)",
+    ("job", "outcome"),
+)
+JOB_LAST_SUCCESS = Gauge(
+    "campaignhub_job_last_success_timestamp_seconds",
+    "Unix time of the last successful job run",
+    ("job",),
+)
+ROWS_INGESTED = Counter(
+    "campaignhub_rows_ingested_total",
+    "Rows written by ingest source",
+    ("source",),
+)
+IMAP_MESSAGES = Counter(
+    "campaignhub_imap_messages_fetched_total",
+    "IMAP messages fetched by importer",
+    ("source",),
+)
+IMAP_BYTES = Counter(
+    "campaignhub_imap_bytes_fetched_total",
+    "Bytes downloaded from IMAP by importer (use rate() for bytes/sec)",
+    ("source",),
+)
+WIDGET_EVENTS = Counter(
+    "campaignhub_widget_events_total",
+    "Widget player events (use rate() for events/sec)",
+    ("event_type",),
+)
+DB_CONNECTIONS = Gauge(
+    "campaignhub_db_connections",
+    "Database connections by pool and state",
+    ("pool", "state"),
+)
+
+# event_type приходит от клиента — держим кардинальность под контролем
+WIDGET_EVENT_TYPES = frozenset({
+    "impression", "view_start", "pause", "complete", "mute", "unmute",
+    "quartile_25", "quartile_50", "quartile_75", "quartile_100",
+})
+
+
+def widget_event(event_type: str) -> None:
+    WIDGET_EVENTS.labels(event_type if event_type in WIDGET_EVENT_TYPES else "other").inc()
+
+
+def observe_request(method: str, route: Optional[str], status: int, seconds: float) -> None:
+    # без шаблона маршрута (404, static) не плодим серии по каждому URL
+    route = route or "other"
+    HTTP_REQUEST_DURATION.labels(method, route).observe(seconds)
+    HTTP_REQUESTS.labels(method, route, f"{int(status) // 100}xx").inc()
+
+
+class JobRun:
+    """Результат для ``job()``: ``run.outcome = "error"`` без исключения."""
+
+    __slots__ = ("name", "outcome")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.outcome = "ok"
+
+
+@contextmanager
+def job(name: str):
+    """
+    Замер задачи:
+
+        with metrics.job("pull") as run:
+            ...
+    Исключение внутри -> outcome="error".
+    """
+    run = JobRun(name)
+    t0 = time.perf_counter()
+    try:
+        yield run
+    except BaseException:
+        run.outcome = "error"
+        raise
+    finally:
+        JOB_DURATION.labels(name).observe(time.perf_counter() - t0)
+        JOB_RUNS.labels(name, run.outcome).inc()
+        if run.outcome == "ok":
+            JOB_LAST_SUCCESS.labels(name).set(time.time())
+
+
+def timed_job(name: str):
+    """Декоратор-версия ``job()`` для функций-задач."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with job(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ------------------ вывод ------------------
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines: List[str] = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)\s*$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def _parse_labels(s: Optional[str]) -> Dict[str, str]:
+    if not s:
+        return {}
+    return {k: v.replace('\\"', '"').replace("\\n", "\n").replace("\\\\", "\\") for k, v in _LABEL_RE.findall(s)}
+
+
+def _textfile_path(name: str) -> Path:
+    return TEXTFILE_DIR / f"{name}.prom"
+
+
+def write_textfile(name: str) -> None:
+    """Сбросить реестр процесса в logs/metrics/<name>.prom (атомарно)."""
+    TEXTFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _textfile_path(name)
+    tmp = path.with_suffix(f".prom.{os.getpid()}.tmp")
+    body = "\n".join(
+        line for m in list(_registry.values()) if m._children
+        for line in m.render()
+    )
+    tmp.write_text(body + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def restore_textfile(name: str) -> None:
+    """Поднять значения из прошлого запуска, чтобы счётчики скрипта не обнулялись."""
+    path = _textfile_path(name)
+    if not path.exists():
+        return
+    try:
+        text = path.read_text(encoding="utf-8")
+    except Exception:
+        return
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        m = _SAMPLE_RE.match(line)
+        if not m:
+            continue
+        sname, labels, raw = m.group(1), _parse_labels(m.group(2)), m.group(3)
+        try:
+            value = float(raw)
+        except ValueError:
+            continue
+        metric, suffix = _registry.get(sname), ""
+        if metric is None:
+            for suf in ("_bucket", "_sum", "_count"):
+                if sname.endswith(suf) and sname[: -len(suf)] in _registry:
+                    metric, suffix = _registry[sname[: -len(suf)]], suf
+                    break
+        if metric is None or isinstance(metric, Gauge) and metric._collect is not None:
+            continue
+        try:
+            key = tuple(labels[n] for n in metric.labelnames)
+        except KeyError:
+            continue
+        child = metric.labels(*key)
+        if isinstance(child, _HistogramValue):
+            if suffix == "_sum":
+                child.sum = value
+            elif suffix == "_count":
+                child.count = value
+            elif suffix == "_bucket" and labels.get("le") != "+Inf":
+                le = float(labels.get("le", "nan"))
+                if le in child.bounds:
+                    child.counts[child.bounds.index(le)] = value
+        elif not suffix:
+            child.set(value)
+
+
+def _with_script(line: str, script: str) -> str:
+    """Добавить семплу метку script="<файл>" (серии разных скриптов не сливаются)."""
+    m = _SAMPLE_RE.match(line)
+    if not m:
+        return line
+    label = f'script="{_escape(script)}"'
+    labels = m.group(2)
+    labels = "{" + label + ("," + labels[1:] if labels and labels != "{}" else "}")
+    return f"{m.group(1)}{labels} {m.group(3)}"
+
+
+def _textfile_families() -> Dict[str, List[str]]:
+    """Семплы из logs/metrics/*.prom с меткой script, сгруппированные по имени семейства."""
+    fams: Dict[str, List[str]] = {}
+    if not TEXTFILE_DIR.exists():
+        return fams
+    for p in sorted(TEXTFILE_DIR.glob("*.prom")):
+        try:
+            text = p.read_text(encoding="utf-8")
+        except Exception:
+            continue
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# TYPE "):
+                family = line.split()[2]
+                continue
+            if not line or line.startswith("#") or family is None:
+                continue
+            fams.setdefault(family, []).append(_with_script(line, p.stem))
+    return fams
+
+
+def render_all() -> str:
+    """Реестр веб-процесса + textfile'ы скриптов, без дублей HELP/TYPE."""
+    extra = _textfile_families()
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines: List[str] = []
+    for m in metrics:
+        lines.extend(m.render())
+        lines.extend(extra.pop(m.name, []))
+    for fam, samples in extra.items():
+        lines.append(f"# TYPE {fam} untyped")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,447 @@
+# app/services/perf.py
+"""
+Пер-запросные тайминги: куда уходит время медленного запроса.
+
+* ``span(name)`` — лёгкий контекст-менеджер, суммирует время по имени
+  внутри текущего запроса (вне запроса — no-op);
+* ``PerfMiddleware`` — ASGI-мидлварь: открывает сбор, в конце отдаёт
+  заголовок ``Server-Timing`` и кладёт запись в кольцевой буфер;
+* ``install_instrumentation(engine)`` — хуки на SQL (события SQLAlchemy +
+  trace callback у «сырых» sqlite3-соединений), pandas-чтение файлов,
+  исходящий HTTP (requests) и рендер Jinja.
+
+Буфер и p50/p95/p99 по маршрутам показываются на ``/debug/perf``.
+"""
+from __future__ import annotations
+
+import functools
+import math
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from app.services import metrics
+
+log = logging.getLogger("app")
+
+RING_SIZE = 2000
+
+# Локальная служебная БД (журнал медленных запросов, история памяти)
+PERF_DB = Path("logs") / "perf.db"
+
+# Имена span'ов, которые выставляются хуками install_instrumentation()
+SPAN_SQL = "sql"
+SPAN_FILE = "file"
+SPAN_HTTP = "http"
+SPAN_TPL = "tpl"
+
+
+class RequestTimings:
+    """Накопитель таймингов одного запроса: name -> [total_sec, count]."""
+
+    __slots__ = ("method", "path", "route", "started", "spans", "scope", "request_id")
+
+    def __init__(self, method: str, path: str, scope: Optional[dict] = None, request_id: str = ""):
+        self.method = method
+        self.path = path
+        self.scope = scope
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.route: Optional[str] = None
+        self.started = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}
+
+    def add(self, name: str, seconds: float = 0.0, count: int = 1) -> None:
+        slot = self.spans.get(name)
+        if slot is None:
+            self.spans[name] = [seconds, count]
+        else:
+            slot[0] += seconds
+            slot[1] += count
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def route_name(self) -> str:
+        """Шаблон маршрута; до роутинга — просто путь."""
+        if self.route is None and self.scope is not None:
+            self.route = _route_template(self.scope)
+        return self.route or self.path
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("perf_timings", default=None)
+
+_ring: Deque[Dict[str, Any]] = deque(maxlen=RING_SIZE)
+_ring_lock = threading.Lock()
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def record(name: str, seconds: float = 0.0, count: int = 1) -> None:
+    """Добавить время/счётчик в текущий запрос (если он есть)."""
+    t = _current.get()
+    if t is not None:
+        t.add(name, seconds, count)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Замер куска кода внутри запроса:
+
+        with perf.span("daily5.build"):
+            ...
+    """
+    t = _current.get()
+    if t is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.add(name, time.perf_counter() - t0)
+
+
+# ------------------ Server-Timing / буфер / статистика ------------------
+
+def _server_timing_header(t: RequestTimings, total: float) -> str:
+    parts = []
+    for name, (sec, cnt) in t.spans.items():
+        parts.append(f'{name};dur={sec * 1000:.1f};desc="{int(cnt)}x"')
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _remember(t: RequestTimings, status: int, total: float) -> None:
+    item = {
+        "ts": time.time(),
+        "method": t.method,
+        "path": t.path,
+        "route": t.route or t.path,
+        "status": status,
+        "total_ms": round(total * 1000, 2),
+        "spans": {k: {"ms": round(v[0] * 1000, 2), "count": int(v[1])} for k, v in t.spans.items()},
+    }
+    with _ring_lock:
+        _ring.append(item)
+
+
+def recent(limit: int = 100) -> List[Dict[str, Any]]:
+    with _ring_lock:
+        items = list(_ring)
+    return items[-limit:][::-1]
+
+
+def _percentile(sorted_vals: List[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    # nearest-rank
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(p / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+def route_stats() -> List[Dict[str, Any]]:
+    """p50/p95/p99 и средние span'ы по каждому маршруту из кольцевого буфера."""
+    with _ring_lock:
+        items = list(_ring)
+
+    by_route: Dict[str, List[Dict[str, Any]]] = {}
+    for it in items:
+        by_route.setdefault(f'{it["method"]} {it["route"]}', []).append(it)
+
+    out: List[Dict[str, Any]] = []
+    for key, rows in by_route.items():
+        totals = sorted(r["total_ms"] for r in rows)
+        span_sum: Dict[str, float] = {}
+        for r in rows:
+            for name, s in r["spans"].items():
+                span_sum[name] = span_sum.get(name, 0.0) + s["ms"]
+        out.append({
+            "route": key,
+            "count": len(rows),
+            "p50": _percentile(totals, 50),
+            "p95": _percentile(totals, 95),
+            "p99": _percentile(totals, 99),
+            "max": totals[-1],
+            "spans_avg": {k: round(v / len(rows), 2) for k, v in sorted(span_sum.items())},
+        })
+    out.sort(key=lambda r: r["p95"], reverse=True)
+    return out
+
+
+def reset() -> None:
+    with _ring_lock:
+        _ring.clear()
+
+
+# ------------------ ASGI middleware ------------------
+
+_route_cache: Dict[int, Dict[Any, str]] = {}
+
+
+def _route_template(scope) -> Optional[str]:
+    """Шаблон пути (/campaigns/{cid}/daily5) вместо конкретного URL."""
+    app = scope.get("app")
+    endpoint = scope.get("endpoint")
+    if app is None or endpoint is None:
+        return None
+    routes = _route_cache.get(id(app))
+    if routes is None:
+        routes = {}
+        for r in getattr(app, "routes", []):
+            ep = getattr(r, "endpoint", None)
+            if ep is not None and ep not in routes:
+                routes[ep] = getattr(r, "path", None)
+        _route_cache[id(app)] = routes
+    return routes.get(endpoint)
+
+
+class PerfMiddleware:
+    """
+    Собирает тайминги запроса и отдаёт их заголовком Server-Timing.
+    Заодно — X-Request-ID (входящий или сгенерированный), его же пишет лог.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = ""
+        for k, v in scope.get("headers") or ():
+            if k == b"x-request-id":
+                rid = v.decode("latin-1")[:64]
+                break
+        t = RequestTimings(scope.get("method", ""), scope.get("path", ""), scope, rid)
+        token = _current.set(t)
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message.get("status", 0)
+                t.route = _route_template(scope)
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", _server_timing_header(t, t.elapsed()).encode("latin-1")))
+                headers.append((b"x-request-id", t.request_id.encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if t.route is None:
+                t.route = _route_template(scope)
+            total = t.elapsed()
+            _remember(t, status_holder["status"], total)
+            metrics.observe_request(t.method, t.route, status_holder["status"], total)
+
+
+# ------------------ хуки ------------------
+
+_installed = False
+
+
+def _timed(name: str, fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t = _current.get()
+        if t is None:
+            return fn(*args, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            t.add(name, time.perf_counter() - t0)
+    return wrapper
+
+
+# Наблюдатели за каждым SQL-оператором (например, журнал медленных запросов).
+# Сигнатура: fn(statement, parameters, seconds, source, db_path, executemany)
+_sql_observers: List[Callable[..., None]] = []
+
+# Оригинальный sqlite3.connect — для служебных соединений, которые не должны
+# попадать в замеры (иначе журнал медленных запросов ловил бы сам себя).
+raw_connect: Callable[..., Any] = sqlite3.connect
+
+# Живые «сырые» sqlite3-соединения — для метрики campaignhub_db_connections
+_raw_connections: "weakref.WeakSet[sqlite3.Connection]" = weakref.WeakSet()
+
+
+def add_sql_observer(fn: Callable[..., None]) -> None:
+    if fn not in _sql_observers:
+        _sql_observers.append(fn)
+
+
+def _sql_done(statement, parameters, seconds: float, source: str, db_path, many: bool, count: int) -> None:
+    record(SPAN_SQL, seconds, count)
+    for fn in _sql_observers:
+        try:
+            fn(statement, parameters, seconds, source, db_path, many)
+        except Exception:
+            log.debug("sql observer failed", exc_info=True)
+
+
+def _install_sqlalchemy(engine) -> None:
+    from sqlalchemy import event
+
+    db_path = engine.url.database if engine.url.get_backend_name() == "sqlite" else None
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("perf_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("perf_t0")
+        if not stack:
+            return
+        _sql_done(statement, parameters, time.perf_counter() - stack.pop(),
+                  "sqlalchemy", db_path, executemany, 1)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("perf_t0") if ctx.connection is not None else None
+        if stack:
+            record(SPAN_SQL, time.perf_counter() - stack.pop())
+
+
+def _install_sqlite3() -> None:
+    """
+    Роутеры открывают sqlite3.connect(...) напрямую, мимо engine.
+    Подменяем sqlite3.connect: trace callback считает каждый выполненный
+    оператор (включая executescript), а курсор-обёртка меряет время.
+    SQLAlchemy ходит через sqlite3.dbapi2.connect — его не трогаем,
+    чтобы не считать запросы дважды.
+    """
+
+    class _TracedCursor(sqlite3.Cursor):
+        def _timed_call(self, fn, sql, params, many: bool):
+            t0 = time.perf_counter()
+            try:
+                return fn(sql, params)
+            finally:
+                # count=0: сами операторы считает trace callback
+                _sql_done(sql, params, time.perf_counter() - t0, "sqlite3",
+                          getattr(self.connection, "perf_db_path", None), many, 0)
+
+        def execute(self, sql, parameters=(), /):
+            return self._timed_call(super().execute, sql, parameters, False)
+
+        def executemany(self, sql, seq_of_parameters, /):
+            if _sql_observers and not isinstance(seq_of_parameters, (list, tuple)):
+                seq_of_parameters = list(seq_of_parameters)
+            return self._timed_call(super().executemany, sql, seq_of_parameters, True)
+
+        def executescript(self, sql_script, /):
+            t0 = time.perf_counter()
+            try:
+                return super().executescript(sql_script)
+            finally:
+                record(SPAN_SQL, time.perf_counter() - t0, 0)
+
+    class _TracedConnection(sqlite3.Connection):
+        perf_db_path: Optional[str] = None
+
+        def cursor(self, factory=_TracedCursor):
+            return super().cursor(factory)
+
+        def execute(self, *args):
+            return self.cursor().execute(*args)
+
+        def executemany(self, *args):
+            return self.cursor().executemany(*args)
+
+        def executescript(self, *args):
+            return self.cursor().executescript(*args)
+
+    def _trace(_stmt: str) -> None:
+        record(SPAN_SQL, 0.0, 1)
+
+    def connect(database, *args, **kwargs):
+        kwargs.setdefault("factory", _TracedConnection)
+        conn = raw_connect(database, *args, **kwargs)
+        if isinstance(conn, _TracedConnection):
+            conn.perf_db_path = str(database)
+            _raw_connections.add(conn)
+        conn.set_trace_callback(_trace)
+        return conn
+
+    connect.__wrapped__ = raw_connect  # type: ignore[attr-defined]
+    sqlite3.connect = connect  # type: ignore[assignment]
+
+
+def _db_connections(engine) -> Dict[tuple, float]:
+    """Снимок для gauge campaignhub_db_connections (вызывается при scrape)."""
+    out: Dict[tuple, float] = {}
+    pool = getattr(engine, "pool", None) if engine is not None else None
+    if pool is not None:
+        for state, attr in (("checked_out", "checkedout"), ("idle", "checkedin")):
+            fn = getattr(pool, attr, None)
+            if fn is not None:
+                out[("sqlalchemy", state)] = float(fn())
+    opened = 0
+    for conn in list(_raw_connections):
+        try:
+            conn.total_changes  # у закрытого соединения -> ProgrammingError
+            opened += 1
+        except Exception:
+            pass
+    out[("sqlite3", "open")] = float(opened)
+    return out
+
+
+def _install_files() -> None:
+    try:
+        import pandas as pd
+    except Exception:
+        return
+    for name in ("read_csv", "read_excel"):
+        fn = getattr(pd, name, None)
+        if fn is not None:
+            setattr(pd, name, _timed(SPAN_FILE, fn))
+
+
+def _install_http() -> None:
+    try:
+        import requests
+    except Exception:
+        return
+    requests.Session.request = _timed(SPAN_HTTP, requests.Session.request)  # type: ignore[method-assign]
+
+
+def _install_jinja() -> None:
+    try:
+        import jinja2
+    except Exception:
+        return
+    jinja2.Template.render = _timed(SPAN_TPL, jinja2.Template.render)  # type: ignore[method-assign]
+
+
+def install_instrumentation(engine=None) -> None:
+    """Повесить хуки один раз на процесс (повторный вызов — no-op)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    if engine is not None:
+        _install_sqlalchemy(engine)
+    _install_sqlite3()
+    metrics.DB_CONNECTIONS.set_function(lambda: _db_connections(engine))
+    _install_files()
+    _install_http()
+    _install_jinja()
+    log.debug("perf instrumentation installed")
@@ -0,0 +1,291 @@
+# app/services/profiler.py
+"""
+Выборочный (sampling) профайлер для отдельных маршрутов.
+
+Админ «взводит» профайлер на шаблон маршрута (fnmatch по
+``/campaigns/{cid}/daily5`` или по пути) и/или на N следующих запросов.
+На время такого запроса поток-таймер каждые ``interval_ms`` снимает стек
+потока, где выполняется эндпоинт (``sys._current_frames()``), и копит
+collapsed-стеки. Результат — ``logs/profiles/<ts>_<route>.collapsed`` и
+``.svg`` (flamegraph), смотреть через /logs/profiles.
+
+Почему поток, а не SIGPROF/setitimer: сигнал прерывает только главный
+поток, а sync-эндпоинты FastAPI крутятся в threadpool; к тому же на
+Windows setitimer нет.
+
+Накладные расходы: каждая выборка меряется, в метаданные профиля пишется
+``overhead_pct`` (время выборок / длительность запроса). Если одна выборка
+дороже ``OVERHEAD_BUDGET`` от интервала, интервал удваивается.
+"""
+from __future__ import annotations
+
+import fnmatch
+import html
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.services import perf
+
+log = logging.getLogger("app")
+
+PROFILES_DIR = Path("logs") / "profiles"
+DEFAULT_INTERVAL_MS = 5.0
+MAX_STACK_DEPTH = 96
+OVERHEAD_BUDGET = 0.05   # доля интервала, которую может съесть одна выборка
+MAX_KEEP = 200           # сколько профилей держать в каталоге
+
+_lock = threading.Lock()
+_armed: Dict[str, Any] = {"pattern": "", "remaining": 0, "interval_ms": DEFAULT_INTERVAL_MS}
+_installed = False
+
+
+# ------------------ взвод ------------------
+
+def arm(pattern: str = "", count: int = 1, interval_ms: float = DEFAULT_INTERVAL_MS) -> Dict[str, Any]:
+    """Профилировать следующие ``count`` запросов, подходящих под ``pattern`` (пусто — любые)."""
+    with _lock:
+        _armed.update(
+            pattern=(pattern or "").strip(),
+            remaining=max(0, int(count)),
+            interval_ms=max(1.0, float(interval_ms)),
+        )
+        return dict(_armed)
+
+
+def disarm() -> None:
+    with _lock:
+        _armed["remaining"] = 0
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return dict(_armed)
+
+
+def _take(route: str, path: str) -> Optional[float]:
+    """Если запрос надо профилировать — списать одну попытку и вернуть интервал."""
+    if not _armed["remaining"]:
+        return None
+    with _lock:
+        if not _armed["remaining"]:
+            return None
+        pat = _armed["pattern"]
+        if pat and not (fnmatch.fnmatch(route, pat) or fnmatch.fnmatch(path, pat)):
+            return None
+        _armed["remaining"] -= 1
+        return float(_armed["interval_ms"])
+
+
+# ------------------ сэмплер ------------------
+
+def _frame_label(code) -> str:
+    fn = code.co_filename.replace("\\", "/")
+    for marker in ("/site-packages/", "/app/", "/scripts/"):
+        i = fn.rfind(marker)
+        if i >= 0:
+            fn = fn[i + 1:]
+            break
+    else:
+        fn = fn.rsplit("/", 1)[-1]
+    return f"{code.co_name} ({fn}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, interval_ms: float):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000.0
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sample_cost = 0.0
+        self._stop_evt = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_evt.wait(self.interval):
+            t0 = time.perf_counter()
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            parts: List[str] = []
+            while frame is not None and len(parts) < MAX_STACK_DEPTH:
+                parts.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            del frame
+            self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+            cost = time.perf_counter() - t0
+            self.sample_cost += cost
+            if cost > self.interval * OVERHEAD_BUDGET:
+                self.interval *= 2
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join(timeout=1.0)
+
+
+# ------------------ вывод ------------------
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", s).strip("_")[:80] or "root"
+
+
+def render_flamegraph_svg(stacks: Dict[str, int], title: str = "", width: int = 1200) -> str:
+    """Минимальный flamegraph (без внешних flamegraph.pl) из collapsed-стеков."""
+    root: Dict[str, Any] = {"n": 0, "kids": {}}
+    for stack, n in stacks.items():
+        node = root
+        node["n"] += n
+        for fr in stack.split(";"):
+            node = node["kids"].setdefault(fr, {"n": 0, "kids": {}})
+            node["n"] += n
+
+    total = root["n"] or 1
+    row_h = 16
+    rects: List[str] = []
+    max_depth = 0
+
+    def walk(node, x: float, depth: int) -> None:
+        nonlocal max_depth
+        for name, kid in sorted(node["kids"].items()):
+            w = kid["n"] / total * width
+            if w >= 0.5:
+                max_depth = max(max_depth, depth)
+                hue = 10 + (zlib.crc32(name.encode("utf-8")) % 40)
+                label = html.escape(name)
+                pct = kid["n"] * 100.0 / total
+                text = label if w > 7 * 8 else ""
+                if text and len(name) * 7 > w:
+                    text = html.escape(name[: max(1, int(w / 7) - 2)]) + ".."
+                rects.append(
+                    f'<g><title>{label} ({kid["n"]} samples, {pct:.1f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{{Y{depth}}}" width="{w:.1f}" height="{row_h - 1}" '
+                    f'fill="hsl({hue},90%,60%)"/>'
+                    f'<text x="{x + 3:.1f}" y="{{T{depth}}}" font-size="11">{text}</text></g>'
+                )
+                walk(kid, x, depth + 1)
+            x += w
+
+    walk(root, 0.0, 0)
+    height = (max_depth + 2) * row_h + 24
+    body = "\n".join(rects)
+    # корень снизу, как в классическом flamegraph
+    for d in range(max_depth + 1):
+        y = height - (d + 1) * row_h - 4
+        body = body.replace(f"{{Y{d}}}", str(y)).replace(f"{{T{d}}}", str(y + row_h - 4))
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace">'
+        f'<text x="4" y="14" font-size="12">{html.escape(title)} — {total} samples</text>\n{body}\n</svg>'
+    )
+
+
+def _save(route: str, path: str, sampler: _Sampler, wall: float) -> Optional[Path]:
+    if not sampler.stacks:
+        return None
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    base = PROFILES_DIR / f"{ts}_{int(time.time() * 1000) % 1000:03d}_{_slug(route)}"
+    collapsed = "\n".join(f"{s} {n}" for s, n in sampler.stacks.most_common())
+    base.with_suffix(".collapsed").write_text(collapsed + "\n", encoding="utf-8")
+    base.with_suffix(".svg").write_text(
+        render_flamegraph_svg(sampler.stacks, title=f"{route} ({path})"), encoding="utf-8"
+    )
+    meta = {
+        "route": route,
+        "path": path,
+        "wall_ms": round(wall * 1000, 2),
+        "samples": sampler.samples,
+        "interval_ms": round(sampler.interval * 1000, 2),
+        "sample_cost_ms": round(sampler.sample_cost * 1000, 3),
+        "overhead_pct": round(sampler.sample_cost / wall * 100, 3) if wall > 0 else 0.0,
+    }
+    base.with_suffix(".json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    _prune()
+    log.info("profile saved %s: %s", base.name, meta)
+    return base
+
+
+def _prune() -> None:
+    files = sorted(PROFILES_DIR.glob("*.collapsed"))
+    for f in files[:-MAX_KEEP]:
+        for ext in (".collapsed", ".svg", ".json"):
+            try:
+                f.with_suffix(ext).unlink()
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    if not PROFILES_DIR.exists():
+        return []
+    out = []
+    for f in sorted(PROFILES_DIR.glob("*.collapsed"), reverse=True):
+        meta: Dict[str, Any] = {}
+        try:
+            meta = json.loads(f.with_suffix(".json").read_text(encoding="utf-8"))
+        except Exception:
+            pass
+        out.append({"name": f.stem, **meta})
+    return out
+
+
+def profile_file(name: str, ext: str) -> Optional[Path]:
+    if ext not in (".svg", ".collapsed", ".json") or not re.fullmatch(r"[A-Za-z0-9_.-]+", name):
+        return None
+    p = PROFILES_DIR / f"{name}{ext}"
+    return p if p.is_file() else None
+
+
+# ------------------ хук в FastAPI ------------------
+
+def install() -> None:
+    """
+    Оборачиваем fastapi.routing.run_endpoint_function (FastAPI выделил её
+    ровно для профилирования): так известен поток, в котором реально
+    работает эндпоинт — event loop для async, worker threadpool для sync.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    import fastapi.routing as fr
+    from starlette.concurrency import run_in_threadpool
+
+    orig = fr.run_endpoint_function
+
+    def _run_sampled(interval_ms: float, call, values):
+        sampler = _Sampler(threading.get_ident(), interval_ms)
+        t0 = time.perf_counter()
+        sampler.start()
+        try:
+            return call(**values)
+        finally:
+            sampler.stop()
+            t = perf.current()
+            _save(t.route_name() if t else "?", t.path if t else "?", sampler, time.perf_counter() - t0)
+
+    async def run_endpoint_function(*, dependant, values, is_coroutine):
+        t = perf.current()
+        interval = _take(t.route_name(), t.path) if t is not None else None
+        if interval is None:
+            return await orig(dependant=dependant, values=values, is_coroutine=is_coroutine)
+        if not is_coroutine:
+            return await run_in_threadpool(_run_sampled, interval, dependant.call, values)
+        sampler = _Sampler(threading.get_ident(), interval)
+        t0 = time.perf_counter()
+        sampler.start()
+        try:
+            return await dependant.call(**values)
+        finally:
+            sampler.stop()
+            _save(t.route_name(), t.path, sampler, time.perf_counter() - t0)
+
+    fr.run_endpoint_function = run_endpoint_function
@@ -0,0 +1,249 @@
+# app/services/slow_queries.py
+"""
+Журнал медленных SQL-запросов.
+
+Подписывается на perf.add_sql_observer(): каждый оператор дольше порога
+(SQLAlchemy engine и «сырые» sqlite3-соединения) уходит в очередь, фоновый
+поток нормализует SQL, снимает ``EXPLAIN QUERY PLAN`` (своим соединением к
+той же БД, один раз на отпечаток) и пишет строку в ``logs/perf.db``.
+На запрос это добавляет только сравнение с порогом и put_nowait.
+
+Порог: ``perf.slow_query_ms`` в config.yaml или ENV ``SLOW_QUERY_MS``
+(по умолчанию 200 мс).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.services import perf
+
+log = logging.getLogger("app")
+
+PERF_DB = perf.PERF_DB
+DEFAULT_THRESHOLD_MS = 200.0
+QUEUE_SIZE = 1000
+
+_threshold_ms = DEFAULT_THRESHOLD_MS
+_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=QUEUE_SIZE)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+_dropped = 0
+
+DDL = """
+CREATE TABLE IF NOT EXISTS slow_queries (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts           TEXT    NOT NULL DEFAULT (datetime('now')),
+    fingerprint  TEXT    NOT NULL,
+    sql_norm     TEXT    NOT NULL,
+    params_shape TEXT,
+    duration_ms  REAL    NOT NULL,
+    route        TEXT,
+    source       TEXT,
+    db_path      TEXT,
+    plan         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_slow_queries_fp ON slow_queries(fingerprint);
+CREATE INDEX IF NOT EXISTS idx_slow_queries_ts ON slow_queries(ts);
+"""
+
+# ------------------ нормализация ------------------
+
+_RE_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_RE_STR = re.compile(r"'(?:[^']|'')*'")
+_RE_NUM = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_RE_WS = re.compile(r"\s+")
+_RE_INLIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_VALUES = re.compile(r"(VALUES\s*\(\?\.\.\.\))(?:\s*,\s*\(\?\.\.\.\))+", re.I)
+
+_EXPLAINABLE = ("select", "insert", "update", "delete", "replace", "with")
+
+
+def normalize_sql(sql: str) -> str:
+    """Литералы -> ?, списки (?, ?, ?) -> (?...), пробелы схлопнуты."""
+    s = _RE_COMMENT.sub(" ", sql or "")
+    s = _RE_STR.sub("?", s)
+    s = _RE_NUM.sub("?", s)
+    s = _RE_WS.sub(" ", s).strip().rstrip(";")
+    s = _RE_INLIST.sub("(?...)", s)
+    s = _RE_VALUES.sub(r"\1", s)
+    return s
+
+
+def fingerprint(sql_norm: str) -> str:
+    return hashlib.sha1(sql_norm.lower().encode("utf-8")).hexdigest()[:16]
+
+
+def params_shape(params: Any, many: bool = False) -> str:
+    """Форма параметров без значений: [3], {cid,d}, many×120[3]."""
+    if many:
+        seq = params if isinstance(params, (list, tuple)) else []
+        first = params_shape(seq[0]) if seq else ""
+        return f"many×{len(seq)}{first}"
+    if params is None:
+        return ""
+    if isinstance(params, dict):
+        return "{" + ",".join(sorted(str(k) for k in params)) + "}"
+    if isinstance(params, (list, tuple)):
+        return f"[{len(params)}]"
+    return type(params).__name__
+
+
+# ------------------ сбор ------------------
+
+def _on_sql(statement, parameters, seconds: float, source: str, db_path, many: bool) -> None:
+    global _dropped
+    ms = seconds * 1000.0
+    if ms < _threshold_ms:
+        return
+    t = perf.current()
+    item = {
+        "sql": statement,
+        "params": parameters,
+        "many": many,
+        "ms": ms,
+        "source": source,
+        "db_path": db_path,
+        "route": f"{t.method} {t.route_name()}" if t is not None else None,
+    }
+    try:
+        _queue.put_nowait(item)
+    except queue.Full:
+        _dropped += 1
+        return
+    _ensure_writer()
+
+
+def _explain(db_path: Optional[str], sql: str, params: Any, many: bool) -> str:
+    if not db_path or db_path == ":memory:":
+        return ""
+    if not sql.lstrip().lower().startswith(_EXPLAINABLE):
+        return ""
+    if many:
+        params = params[0] if isinstance(params, (list, tuple)) and params else ()
+    try:
+        con = perf.raw_connect(db_path, timeout=1.0)
+        try:
+            rows = con.execute("EXPLAIN QUERY PLAN " + sql, params if params is not None else ()).fetchall()
+        finally:
+            con.close()
+    except Exception as e:
+        return f"ERR: {e}"
+    # (id, parent, notused, detail)
+    return "\n".join(str(r[-1]) for r in rows)
+
+
+def _writer_loop() -> None:
+    PERF_DB.parent.mkdir(parents=True, exist_ok=True)
+    con = perf.raw_connect(str(PERF_DB), timeout=5.0)
+    con.executescript(DDL)
+    plans: Dict[str, str] = {}
+    while True:
+        item = _queue.get()
+        try:
+            norm = normalize_sql(item["sql"])
+            fp = fingerprint(norm)
+            plan = plans.get(fp)
+            if plan is None:
+                plan = _explain(item["db_path"], item["sql"], item["params"], item["many"])
+                if len(plans) > 5000:
+                    plans.clear()
+                plans[fp] = plan
+            con.execute(
+                """
+                INSERT INTO slow_queries (fingerprint, sql_norm, params_shape, duration_ms, route, source, db_path, plan)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (fp, norm, params_shape(item["params"], item["many"]), round(item["ms"], 2),
+                 item["route"], item["source"], item["db_path"], plan),
+            )
+            con.commit()
+            log.warning("slow query %.0f ms [%s] %s", item["ms"], item["route"] or "-", norm[:300])
+        except Exception:
+            log.exception("slow query writer failed")
+
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="slow-query-writer", daemon=True)
+            _writer.start()
+
+
+def install(threshold_ms: Optional[float] = None) -> None:
+    """Включить журнал; порог — аргумент / ENV SLOW_QUERY_MS / config.yaml perf.slow_query_ms."""
+    global _threshold_ms
+    if threshold_ms is None:
+        env = os.getenv("SLOW_QUERY_MS")
+        if env:
+            threshold_ms = float(env)
+        else:
+            from app.services import config_store
+            threshold_ms = config_store.snapshot().get_float("perf.slow_query_ms", DEFAULT_THRESHOLD_MS)
+    _threshold_ms = float(threshold_ms)
+    perf.add_sql_observer(_on_sql)
+
+
+def threshold_ms() -> float:
+    return _threshold_ms
+
+
+def dropped() -> int:
+    return _dropped
+
+
+# ------------------ отчёт ------------------
+
+def top_offenders(limit: int = 50, days: int = 7) -> List[Dict[str, Any]]:
+    """Отпечатки запросов, отсортированные по суммарному времени."""
+    if not PERF_DB.exists():
+        return []
+    con = perf.raw_connect(str(PERF_DB), timeout=5.0)
+    try:
+        con.executescript(DDL)
+        cur = con.execute(
+            """
+            SELECT fingerprint,
+                   MAX(sql_norm)       AS sql_norm,
+                   COUNT(*)            AS n,
+                   SUM(duration_ms)    AS total_ms,
+                   AVG(duration_ms)    AS avg_ms,
+                   MAX(duration_ms)    AS max_ms,
+                   MAX(ts)             AS last_ts,
+                   GROUP_CONCAT(DISTINCT route)        AS routes,
+                   GROUP_CONCAT(DISTINCT params_shape) AS shapes,
+                   (SELECT plan FROM slow_queries s2
+                     WHERE s2.fingerprint = s.fingerprint
+                     ORDER BY s2.id DESC LIMIT 1)    AS plan
+            FROM slow_queries s
+            WHERE ts >= datetime('now', ?)
+            GROUP BY fingerprint
+            ORDER BY total_ms DESC
+            LIMIT ?
+            """,
+            (f"-{int(days)} days", int(limit)),
+        )
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+    finally:
+        con.close()
+
+
+def clear() -> None:
+    if not PERF_DB.exists():
+        return
+    con = perf.raw_connect(str(PERF_DB), timeout=5.0)
+    try:
+        con.execute("DELETE FROM slow_queries")
+        con.commit()
+    finally:
+        con.close()
@@ -5,6 +5,7 @@ from typing import Any, Dict, Optional
 from sqlalchemy.orm import Session
 
 from app import models_widget as wm
+from app.services import metrics
 
 DEFAULT_PLAYER_CONFIG: Dict[str, Any] = {
     "autoplay": True,
@@ -150,4 +151,5 @@ def register_widget_event(
     db.add(event)
     db.commit()
     db.refresh(event)
+    metrics.widget_event(event_type)
     return event.id
@@ -0,0 +1,216 @@
+# app/services/yandex_bindings.py
+"""
+Привязки «кампания -> отчёт Яндекс.Метрики» (тема письма + ящик).
+
+Раньше жили в config.yaml (``yandex_campaigns``): правка одной привязки
+переписывала весь YAML, каждый импорт разбирал его заново. Теперь источник
+истины — таблица ``campaign_yandex`` в yandex_metrics.db (её же ведёт
+scripts/dir_yandex.py); импортёр читает список одним запросом.
+
+Перенос из YAML делается сам при первом обращении к таблице
+(``migrate_from_config``, отметка в ``campaign_yandex_meta``): иначе до
+ручного запуска миграции привязки из YAML пропадали бы со страницы
+справочника, а первое сохранение там отключало бы их все. Строки таблицы
+главнее — YAML-записи с уже существующим campaign_id пропускаются и
+попадают в лог. Вручную (и ``--strip`` ключа из YAML):
+``python scripts/yandex_bindings_from_config.py``.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_DB = ROOT_DIR / "yandex_metrics.db"
+YAML_MIGRATION = "yaml_yandex_campaigns"
+
+log = logging.getLogger("app")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS campaign_yandex (
+  id             INTEGER PRIMARY KEY AUTOINCREMENT,
+  campaign_id    INTEGER NOT NULL UNIQUE,
+  enabled        INTEGER NOT NULL DEFAULT 0,   -- 0/1
+  yandex_name    TEXT    NOT NULL,
+  yandex_mailbox TEXT    NOT NULL DEFAULT 'INBOX',
+  created_at     TEXT    DEFAULT (datetime('now')),
+  updated_at     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_campaign_yandex_enabled ON campaign_yandex(enabled, campaign_id);
+CREATE TABLE IF NOT EXISTS campaign_yandex_meta (
+  key   TEXT PRIMARY KEY,
+  value TEXT
+);
+"""
+
+
+def db_path() -> str:
+    return os.getenv("INLAB_DB") or str(DEFAULT_DB)
+
+
+def _prepare(conn: sqlite3.Connection) -> None:
+    """Схема + однократный перенос из YAML."""
+    migrate_from_config(conn=conn)
+
+
+def connect(path: Optional[str] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or db_path())
+    _prepare(conn)
+    return conn
+
+
+def list_enabled(conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    """Активные привязки в формате прежнего yandex_campaigns: {id, yandex_name, mailbox}."""
+    own = conn is None
+    if own:
+        conn = connect()
+    else:
+        _prepare(conn)
+    try:
+        rows = conn.execute(
+            """
+            SELECT campaign_id, yandex_name, yandex_mailbox
+            FROM campaign_yandex
+            WHERE enabled = 1
+            ORDER BY campaign_id
+            """
+        ).fetchall()
+    finally:
+        if own:
+            conn.close()
+    return [
+        {"id": int(cid), "yandex_name": name, "mailbox": (mb or "").strip() or "INBOX"}
+        for cid, name, mb in rows
+    ]
+
+
+def yandex_map(conn: Optional[sqlite3.Connection] = None) -> Dict[int, str]:
+    return {b["id"]: b["yandex_name"] for b in list_enabled(conn)}
+
+
+def set_binding(campaign_id: int, yandex_name: str, mailbox: Optional[str] = None,
+                conn: Optional[sqlite3.Connection] = None) -> None:
+    """
+    Задать/снять привязку одной кампании. Пустое имя — выключить (строка
+    остаётся, чтобы не терять ящик). ``mailbox=None`` — не трогать ящик.
+    """
+    own = conn is None
+    conn = conn or connect()
+    try:
+        name = (yandex_name or "").strip()
+        if not name:
+            conn.execute(
+                "UPDATE campaign_yandex SET enabled = 0, updated_at = datetime('now') WHERE campaign_id = ?",
+                (int(campaign_id),),
+            )
+        else:
+            conn.execute(
+                """
+                INSERT INTO campaign_yandex (campaign_id, enabled, yandex_name, yandex_mailbox, updated_at)
+                VALUES (?, 1, ?, COALESCE(?, 'INBOX'), datetime('now'))
+                ON CONFLICT(campaign_id) DO UPDATE SET
+                  enabled = 1,
+                  yandex_name = excluded.yandex_name,
+                  yandex_mailbox = COALESCE(?, campaign_yandex.yandex_mailbox),
+                  updated_at = datetime('now')
+                """,
+                (int(campaign_id), name, mailbox, mailbox),
+            )
+        conn.commit()
+    finally:
+        if own:
+            conn.close()
+
+
+def import_from_config(items: Iterable[Dict[str, Any]], conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Перенести список ``yandex_campaigns`` из YAML в таблицу. Повторный запуск
+    ничего не ломает: существующие строки обновляются (upsert по campaign_id).
+    """
+    rows = []
+    for item in items or []:
+        try:
+            cid = int(item.get("id"))
+        except (TypeError, ValueError, AttributeError):
+            continue
+        name = str(item.get("yandex_name") or "").strip()
+        if not name:
+            continue
+        rows.append((cid, name, str(item.get("mailbox") or "INBOX").strip() or "INBOX"))
+
+    own = conn is None
+    conn = conn or connect()
+    try:
+        conn.executemany(
+            """
+            INSERT INTO campaign_yandex (campaign_id, enabled, yandex_name, yandex_mailbox, updated_at)
+            VALUES (?, 1, ?, ?, datetime('now'))
+            ON CONFLICT(campaign_id) DO UPDATE SET
+              enabled = 1,
+              yandex_name = excluded.yandex_name,
+              yandex_mailbox = excluded.yandex_mailbox,
+              updated_at = datetime('now')
+            """,
+            rows,
+        )
+        conn.commit()
+    finally:
+        if own:
+            conn.close()
+    return len(rows)
+
+
+def migrate_from_config(items: Optional[Iterable[Dict[str, Any]]] = None,
+                        conn: Optional[sqlite3.Connection] = None) -> bool:
+    """
+    Однократный перенос ``yandex_campaigns`` (по умолчанию — из config_store) в
+    таблицу. Записи, чей campaign_id уже есть в таблице, не трогаются и
+    логируются. Возвращает True, если перенос выполнен этим вызовом.
+    """
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(db_path())
+    try:
+        conn.executescript(DDL)
+        if conn.execute("SELECT 1 FROM campaign_yandex_meta WHERE key = ?", (YAML_MIGRATION,)).fetchone():
+            return False
+        if items is None:
+            try:
+                from app.services import config_store
+                items = config_store.snapshot().get_list("yandex_campaigns")
+            except Exception:
+                log.exception("yandex bindings: cannot read yandex_campaigns from config; migration postponed")
+                return False
+        # отметка и перенос — одной транзакцией: параллельный процесс увидит отметку
+        claimed = conn.execute(
+            "INSERT OR IGNORE INTO campaign_yandex_meta (key, value) VALUES (?, datetime('now'))",
+            (YAML_MIGRATION,),
+        ).rowcount
+        if not claimed:
+            conn.rollback()
+            return False
+        existing = {int(r[0]) for r in conn.execute("SELECT campaign_id FROM campaign_yandex")}
+        fresh, skipped = [], []
+        for item in items or []:
+            try:
+                cid = int(item.get("id"))
+            except (TypeError, ValueError, AttributeError):
+                skipped.append(f"{item!r} (no campaign id)")
+                continue
+            if cid in existing:
+                skipped.append(f"id={cid} {item.get('yandex_name')!r} (already in campaign_yandex)")
+            else:
+                fresh.append(item)
+        n = import_from_config(fresh, conn)          # коммитит и отметку
+        if n or skipped:
+            log.info("yandex bindings: moved %d of %d config.yaml yandex_campaigns into campaign_yandex",
+                     n, len(fresh) + len(skipped))
+        if skipped:
+            log.warning("yandex bindings: config.yaml entries skipped: %s", "; ".join(skipped))
+        return True
+    finally:
+        if own:
+            conn.close()
@@ -1,7 +1,9 @@
 import hashlib
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Generator, Literal
+from typing import Any, Dict, Generator, Literal, Optional, Tuple
 
 from fastapi import APIRouter, Depends, Form, HTTPException, Request, status, FastAPI
 from fastapi.responses import HTMLResponse, RedirectResponse
@@ -27,6 +29,84 @@ def get_db() -> Generator[sqlite3.Connection, None, None]:
         conn.close()
 
 
+# ------------------ кэш пользователей и прав ------------------
+#
+# Без кэша каждый защищённый запрос открывал соединение на get_current_user
+# (users JOIN roles) и ещё одно на каждый require_module
+# (role_module_permissions). Теперь матрица прав грузится целиком одним
+# запросом, пользователь — по id с коротким TTL; admin_users зовёт
+# bump_auth_version() после любого изменения, и оба кэша сбрасываются.
+# TTL — страховка для правок мимо админки (скрипты, другой воркер).
+
+USER_TTL_SEC = 30.0
+PERM_TTL_SEC = 60.0
+
+_cache_lock = threading.Lock()
+_auth_version = 0
+_user_cache: Dict[int, Tuple[float, int, Optional[Dict[str, Any]]]] = {}
+_perm_cache: Dict[str, Any] = {"version": -1, "expires": 0.0, "matrix": {}}
+
+
+def bump_auth_version() -> None:
+    """Сбросить кэш пользователей и прав (после изменений в users/roles/permissions)."""
+    global _auth_version
+    with _cache_lock:
+        _auth_version += 1
+        _user_cache.clear()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _load_user(user_id: int) -> Optional[Dict[str, Any]]:
+    now = time.monotonic()
+    hit = _user_cache.get(user_id)
+    if hit is not None and hit[0] > now and hit[1] == _auth_version:
+        return hit[2]
+    version = _auth_version
+    conn = _connect()
+    try:
+        row = conn.execute(
+            """
+            SELECT u.*, r.code AS role_code, r.name AS role_name
+            FROM users u
+            JOIN roles r ON u.role_id = r.id
+            WHERE u.id = ? AND u.is_active = 1
+            """,
+            (user_id,),
+        ).fetchone()
+    finally:
+        conn.close()
+    user = dict(row) if row else None
+    with _cache_lock:
+        if version == _auth_version:
+            _user_cache[user_id] = (now + USER_TTL_SEC, version, user)
+    return user
+
+
+def _permission_matrix() -> Dict[Tuple[int, str], Tuple[int, int]]:
+    """(role_id, module_code) -> (can_view, can_edit) для всех ролей сразу."""
+    pc = _perm_cache
+    if pc["version"] == _auth_version and pc["expires"] > time.monotonic():
+        return pc["matrix"]
+    version = _auth_version
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT role_id, module_code, can_view, can_edit FROM role_module_permissions"
+        ).fetchall()
+    finally:
+        conn.close()
+    matrix = {(r["role_id"], r["module_code"]): (r["can_view"], r["can_edit"]) for r in rows}
+    with _cache_lock:
+        if version == _auth_version:
+            _perm_cache.update(version=version, expires=time.monotonic() + PERM_TTL_SEC, matrix=matrix)
+    return matrix
+
+
 def verify_password(plain: str, stored_hash: str) -> bool:
     """Проверка пароля через SHA-256 (совпадает с тем, что мы положили в БД)."""
     if stored_hash is None:
@@ -34,10 +114,7 @@ def verify_password(plain: str, stored_hash: str) -> bool:
     return hashlib.sha256(plain.encode("utf-8")).hexdigest() == stored_hash
 
 
-def get_current_user(
-    request: Request,
-    db: sqlite3.Connection = Depends(get_db),
-):
+def get_current_user(request: Request):
     """
     Возвращает текущего пользователя как dict:
     {
@@ -48,6 +125,7 @@ def get_current_user(
         ...
     }
     Если не залогинен или юзер неактивен — кидает 302 на /auth/login.
+    Берётся из кэша (USER_TTL_SEC), в БД идём только на промахе.
     """
     user_id = request.session.get("user_id")
     if not user_id:
@@ -57,17 +135,8 @@ def get_current_user(
             headers={"Location": "/auth/login"},
         )
 
-    cur = db.execute(
-        """
-        SELECT u.*, r.code AS role_code, r.name AS role_name
-        FROM users u
-        JOIN roles r ON u.role_id = r.id
-        WHERE u.id = ? AND u.is_active = 1
-        """,
-        (user_id,),
-    )
-    row = cur.fetchone()
-    if not row:
+    user = _load_user(user_id)
+    if user is None:
         # юзер удалён/заблокирован — чистим и на логин
         request.session.clear()
         raise HTTPException(
@@ -75,10 +144,9 @@ def get_current_user(
             headers={"Location": "/auth/login"},
         )
 
-    # приводим sqlite3.Row к обычному dict, чтобы
-    # и Jinja, и новый код (publisher_widget) могли спокойно работать
-    user = dict(row)
-    return user
+    # обычный dict (не sqlite3.Row), чтобы и Jinja, и новый код
+    # (publisher_widget) могли спокойно работать; копия — кэш не трогаем
+    return dict(user)
 
 
 ModuleAction = Literal["view", "edit"]
@@ -101,35 +169,25 @@ def require_module(module_code: str, action: ModuleAction = "view"):
         'campaigns', 'directories', 'bookings', 'logs', 'settings', 'dataflow', 'users'
     """
 
-    def dependency(
-        user=Depends(get_current_user),
-        db: sqlite3.Connection = Depends(get_db),
-    ):
+    def dependency(user=Depends(get_current_user)):
         # Админ — полный доступ
         if user["role_code"] == "admin":
             return user
 
-        cur = db.execute(
-            """
-            SELECT can_view, can_edit
-            FROM role_module_permissions
-            WHERE role_id = ? AND module_code = ?
-            """,
-            (user["role_id"], module_code),
-        )
-        perm = cur.fetchone()
+        perm = _permission_matrix().get((user["role_id"], module_code))
         if perm is None:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Нет доступа к модулю",
             )
 
-        if action == "view" and not perm["can_view"]:
+        can_view, can_edit = perm
+        if action == "view" and not can_view:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Нет прав на просмотр",
             )
-        if action == "edit" and not perm["can_edit"]:
+        if action == "edit" and not can_edit:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Нет прав на редактирование",
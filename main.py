@@ -6,6 +6,8 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.logging_setup import setup_logging
 from app.database import engine
+from app.services.perf import PerfMiddleware, install_instrumentation
+from app.services import slow_queries, profiler, memory
 from app import models
 from app.routers import widget_public, publisher_widget
 from app.routers import publishers_admin
@@ -31,6 +33,8 @@ from app.routers.imap_ping import router as imap_ping_router
 from app.routers.logs import router as logs_router
 from app.routers.bookings import router as bookings_router
 from app.routers.admin_users import router as admin_users_router
+from app.routers.perf import router as perf_router
+from app.routers.metrics import router as metrics_router
 
 
 
@@ -40,6 +44,12 @@ from auth import setup_auth, require_module
 # === ЛОГИРОВАНИЕ ===
 setup_logging()
 
+# === ТАЙМИНГИ (Server-Timing + /debug/perf) ===
+install_instrumentation(engine)
+slow_queries.install()
+profiler.install()
+memory.install()
+
 # === ПРИЛОЖЕНИЕ ===
 app = FastAPI(title="Campaign Hub", version="0.2.0")
 
@@ -47,6 +57,12 @@ app = FastAPI(title="Campaign Hub", version="0.2.0")
 # Подключаем SessionMiddleware и /auth/login, /auth/logout из auth.py
 setup_auth(app)
 
+# Предупреждение о «прожорливых» запросах (внутри PerfMiddleware — знает маршрут)
+app.add_middleware(memory.MemoryGuardMiddleware)
+
+# Тайминги запроса: SQL / файлы / HTTP / шаблоны -> заголовок Server-Timing
+app.add_middleware(PerfMiddleware)
+
 # === STATIC ===
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -155,6 +171,12 @@ app.include_router(
     dependencies=[Depends(require_module("settings", "view"))],
 )
 
+# Тайминги запросов (/debug/perf) — только админ
+app.include_router(
+    perf_router,
+    dependencies=[Depends(require_module("settings", "view"))],
+)
+
 # IMAP‑ping — тех. история, тоже под settings
 app.include_router(
     imap_ping_router,
@@ -191,6 +213,8 @@ app.add_api_route(
     dependencies=[Depends(require_module("settings", "view"))],
 )
 app.include_router(widget_public.router)
+# Prometheus scrape — без логина (опционально ENV METRICS_TOKEN)
+app.include_router(metrics_router)
 app.include_router(publisher_widget.router)
 app.include_router(publishers_admin.router)
 
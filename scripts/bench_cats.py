@@ -0,0 +1,200 @@
+# scripts/bench_cats.py
+"""
+Бенчмарк всего, что ходит в админку Cats, на локальной заглушке
+(scripts/fake_cats.py) — без сети и с повторяемыми данными.
+
+Сценарии (по порядку, всё в одной временной БД и каталоге data/):
+
+- preview   — cats_front_preview (GET формы логина, сборка payload);
+- import    — campaigns_import_cats (SpreadsheetML со списком кампаний);
+- pull_all  — campaigns_pull_all: export_and_ingest по каждой кампании подряд;
+- pull_xN   — те же выгрузки в N потоков (--workers 4,8): сколько даёт
+  параллельность и во что упирается сервер;
+- margin    — _margin_update_all_core (две shortage-выгрузки + upsert броней);
+- flights   — flights_import_cats (страницы креативов, пагинация или «Все»);
+- parse     — parse_stat_bytes + normalize_columns + _normalize_metrics на
+  уже скачанных выгрузках, без HTTP.
+
+Для каждого сценария печатается время, число HTTP-запросов, логинов и
+TCP-соединений (переиспользование сессии видно сразу), КиБ от сервера,
+пик одновременных запросов и результат (строки/кампании/флайты).
+
+    python scripts/bench_cats.py --campaigns 200 --latency 0.01 --workers 4,8
+    python scripts/bench_cats.py --campaigns 1000 --days 31 --all-link --scenarios import,flights
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import yaml
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+for p in (str(SCRIPTS_DIR), str(ROOT_DIR)):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+from fake_cats import CatsDataset, FakeCatsServer  # noqa: E402
+
+SCENARIOS = ("preview", "import", "pull_all", "pull", "margin", "flights", "parse")
+
+
+def _html(resp) -> str:
+    return resp.body.decode("utf-8", errors="ignore")
+
+
+def seed_bookings(db: str, ds: CatsDataset) -> None:
+    """По брони на кампанию (+ каждая 10-я с неизвестной моделью) — вход для маржи."""
+    conn = sqlite3.connect(db)
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS bookings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, campaign_id INTEGER,
+                buying_model TEXT, payout_model TEXT, client_price REAL
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO bookings (name, campaign_id, buying_model, payout_model, client_price) VALUES (?, ?, ?, ?, ?)",
+            [(c.name, c.id, c.payout_model.upper(), "flat" if n % 10 == 9 else c.payout_model,
+              round(c.avg_price * 1.4, 2)) for n, c in enumerate(ds.campaigns)],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Cats-facing code paths against an offline fake Cats")
+    ap.add_argument("--campaigns", type=int, default=200)
+    ap.add_argument("--days", type=int, default=31)
+    ap.add_argument("--creatives", type=int, default=3, help="Креативов на кампанию")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--latency", type=float, default=0.0, help="Задержка на запрос, секунд")
+    ap.add_argument("--export-latency", type=float, default=0.0, help="Доп. задержка на выгрузку, секунд")
+    ap.add_argument("--per-page", type=int, default=50)
+    ap.add_argument("--all-link", action="store_true", help="Сервер отдаёт ссылку «Все (N)»")
+    ap.add_argument("--workers", default="4", help="Потоки для pull_xN через запятую")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    args = ap.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip() in SCENARIOS]
+    t0 = time.perf_counter()
+    ds = CatsDataset(args.campaigns, args.days, args.creatives, args.seed)
+    print(f"{len(ds.campaigns)} campaigns x {ds.days} days, {len(ds.creatives)} creatives "
+          f"(built in {time.perf_counter() - t0:.1f}s); latency {args.latency * 1000:.0f} ms, "
+          f"export latency {args.export_latency * 1000:.0f} ms")
+
+    # intercept: URL выгрузки в cats_export зашит на боевой Cats — уводим его в заглушку
+    with FakeCatsServer(ds, latency=args.latency, export_latency=args.export_latency,
+                        per_page=args.per_page, all_link=args.all_link) as srv, \
+            srv.intercept(), tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        cfg = work / "config.yaml"
+        cfg.write_text(yaml.safe_dump({"system": srv.system_config()}, allow_unicode=True), encoding="utf-8")
+        db = work / "campaign_hub.db"
+        # до импорта app: config_store и database читают пути при импорте
+        os.environ["INLAB_CONFIG"] = str(cfg)
+        os.environ["DATABASE_URL"] = f"sqlite:///{db}"
+        os.chdir(work)                                  # data/cats/<id>/ — во временном каталоге
+
+        from app.routers import campaigns, flights
+        from app.services import cats_export, cats_front
+
+        ids = [c.id for c in ds.campaigns]
+        blobs: List[bytes] = []
+
+        def run_preview() -> str:
+            res = cats_front.cats_front_preview()
+            return "ok" if res.get("ok") and res.get("csrf") else f"FAIL {res}"
+
+        def run_import() -> str:
+            return f"{_html(campaigns.campaigns_import_cats()).count('<tr id=')} campaigns"
+
+        def run_pull_all() -> str:
+            m = re.search(r"Updated (\d+) / (\d+)", _html(campaigns.campaigns_pull_all()))
+            return f"{m.group(1)}/{m.group(2)} pulled" if m else "FAIL"
+
+        def run_pull(workers: int) -> Callable[[], str]:
+            def go() -> str:
+                with ThreadPoolExecutor(workers) as pool:
+                    res = list(pool.map(cats_export.export_and_ingest, map(str, ids)))
+                return f"{sum(r['ingest']['rows'] for r in res)} rows"
+            return go
+
+        def run_margin() -> str:
+            res = campaigns._margin_update_all_core()
+            return f"{res['updated']} updated, {res['skipped_unknown_model']} unknown model"
+
+        def run_flights() -> str:
+            if "Imported:" not in _html(flights.flights_import_cats()):
+                return "FAIL"
+            # «Imported: N» в ответе — changes() последнего INSERT, считаем по таблице
+            conn = sqlite3.connect(db)
+            try:
+                return f"{conn.execute('SELECT COUNT(*) FROM flights').fetchone()[0]} flights"
+            finally:
+                conn.close()
+
+        def run_parse() -> str:
+            if not blobs:
+                for cid in ids:
+                    p = sorted((work / "data" / "cats" / str(cid)).glob("*.xlsx"))
+                    if p:
+                        blobs.append(p[-1].read_bytes())
+            conf = cats_export._build_download_conf()
+            rows = 0
+            for b in blobs:
+                df = cats_export.parse_stat_bytes(b, conf["format"], conf["encoding"], conf["delimiter"])
+                df = cats_export._normalize_metrics(cats_export.normalize_columns(df, conf["column_map"]))
+                rows += len(df)
+            return f"{rows} rows from {len(blobs)} files"
+
+        plan: List[Tuple[str, Callable[[], str]]] = []
+        for s in scenarios:
+            if s == "preview":
+                plan.append(("preview", run_preview))
+            elif s == "import":
+                plan.append(("import", run_import))
+            elif s == "pull_all":
+                plan.append(("pull_all", run_pull_all))
+            elif s == "pull":
+                plan.extend((f"pull_x{w}", run_pull(w)) for w in (int(x) for x in args.workers.split(",") if x.strip()))
+            elif s == "margin":
+                seed_bookings(str(db), ds)
+                plan.append(("margin", run_margin))
+            elif s == "flights":
+                plan.append(("flights", run_flights))
+            elif s == "parse":
+                plan.append(("parse", run_parse))
+
+        print(f"{'scenario':<10} {'wall s':>8} {'requests':>9} {'logins':>7} {'conns':>6} "
+              f"{'KiB out':>9} {'peak':>5}  result")
+        for name, fn in plan:
+            srv.stats.reset_peak()
+            before = srv.stats.snapshot()
+            t = time.perf_counter()
+            try:
+                # роутеры и cats_export пишут в stdout/лог — в отчёт бенчмарка это не нужно
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = fn()
+            except Exception as e:
+                result = f"ERROR {type(e).__name__}: {e}"
+            wall = time.perf_counter() - t
+            after = srv.stats.snapshot()
+            d: Dict[str, int] = {k: after[k] - before.get(k, 0) for k in ("requests", "logins", "connections", "bytes_out")}
+            print(f"{name:<10} {wall:8.2f} {d['requests']:9d} {d['logins']:7d} {d['connections']:6d} "
+                  f"{d['bytes_out'] / 1024:9.0f} {after['max_inflight']:5d}  {result}")
+        os.chdir(ROOT_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# scripts/bench_endpoints.py
+"""
+Бенчмарк горячих эндпоинтов через ASGI в том же процессе (TestClient, без
+сети) на синтетическом наборе данных scripts/gen_dataset.py.
+
+Набор генерируется во временный каталог (или берётся готовый ``--data DIR``),
+приложение (main.app) импортируется уже с cwd = этот каталог — оно читает
+campaign_hub.db, yandex_metrics.db, data/cats и config.yaml относительно
+текущего каталога; app/templates и app/static подкладываются ссылками на
+репозиторий (или копией, если ссылки недоступны).
+
+Эндпоинты: список кампаний, daily5, daily5/save, daily группы, маржа,
+список броней, widget init/event. Для каждого — прогрев, затем ``--requests``
+запросов: mean/p50/p95/max, req/s, коды ответов, размер ответа и средние
+спаны из Server-Timing (sql, file, template …).
+
+Отчёт — JSON (``--out``) с коммитом, параметрами и окружением, чтобы
+сравнивать прогоны между коммитами: ``--compare old.json`` печатает
+отношение p50/p95 к старому отчёту.
+
+    python scripts/bench_endpoints.py --campaigns 500 --days 90 --requests 30 --out bench/endpoints.json
+    python scripts/bench_endpoints.py --data /tmp/hub --compare bench/endpoints.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+for p in (str(SCRIPTS_DIR), str(ROOT_DIR)):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+import gen_dataset  # noqa: E402
+
+Request = Tuple[str, str, Dict[str, Any]]          # method, url, kwargs для client.request
+
+
+def _pct(values: List[float], q: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def _server_timing(header: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, rest = part.strip().partition(";")
+        for attr in rest.split(";"):
+            k, _, v = attr.strip().partition("=")
+            if k == "dur" and name and name != "total":
+                out[name] = out.get(name, 0.0) + float(v)
+    return out
+
+
+def mirror_app_assets(work: Path) -> None:
+    """app/templates и app/static рядом с данными: main.py и роутеры берут их относительно cwd."""
+    for sub in ("templates", "static"):
+        dst = work / "app" / sub
+        if dst.exists():
+            continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            dst.symlink_to(ROOT_DIR / "app" / sub, target_is_directory=True)
+        except OSError:                       # Windows без прав на symlink
+            shutil.copytree(ROOT_DIR / "app" / sub, dst)
+
+
+def scenarios(cids: List[int], gids: List[int], days: int) -> Dict[str, Callable[[int], Request]]:
+    """Имя -> i -> запрос; i перебирает кампании/группы, чтобы не мерить один и тот же кеш."""
+    last = date.today() - timedelta(days=1)
+    sessions = itertools.count()
+
+    def daily5_save(i: int) -> Request:
+        d = last - timedelta(days=i % max(days, 1))
+        return ("POST", f"/campaigns/{cids[i % len(cids)]}/daily5/save",
+                {"data": {"date": d.isoformat(), "metric": "impressions", "value": str(10_000 + i)}})
+
+    return {
+        "campaigns_list": lambda i: ("GET", "/campaigns", {}),
+        "daily5": lambda i: ("GET", f"/campaigns/{cids[i % len(cids)]}/daily5", {}),
+        "daily5_save": daily5_save,
+        "groups_daily": lambda i: ("GET", f"/campaigns/groups/{gids[i % len(gids)]}/daily", {}),
+        "margin": lambda i: ("GET", "/campaigns/margin", {}),
+        "bookings_list": lambda i: ("GET", "/bookings", {}),
+        "widget_init": lambda i: ("POST", "/widget/init",
+                                  {"json": {"site_token": gen_dataset.SITE_TOKEN, "article_id": f"a{i % 30}"}}),
+        "widget_event": lambda i: ("POST", "/widget/event",
+                                   {"json": {"session_token": f"bench-sess-{next(sessions) % len(cids)}",
+                                             "event_type": "progress_25", "video_time": 5.0}}),
+    }
+
+
+def bench_endpoint(client, make: Callable[[int], Request], requests: int, warmup: int) -> Dict[str, Any]:
+    for i in range(warmup):
+        method, url, kw = make(i)
+        client.request(method, url, **kw)
+    lat: List[float] = []
+    codes: Counter = Counter()
+    spans: Dict[str, float] = defaultdict(float)
+    nbytes = 0
+    for i in range(warmup, warmup + requests):
+        method, url, kw = make(i)
+        t = time.perf_counter()
+        r = client.request(method, url, **kw)
+        lat.append((time.perf_counter() - t) * 1000)
+        codes[str(r.status_code)] += 1
+        nbytes += len(r.content)
+        for k, v in _server_timing(r.headers.get("server-timing", "")).items():
+            spans[k] += v
+    total = sum(lat) / 1000
+    return {
+        "requests": requests,
+        "mean_ms": round(sum(lat) / len(lat), 2),
+        "p50_ms": round(_pct(lat, 0.50), 2),
+        "p95_ms": round(_pct(lat, 0.95), 2),
+        "max_ms": round(max(lat), 2),
+        "rps": round(requests / total, 1) if total else None,
+        "status": dict(codes),
+        "bytes_mean": nbytes // requests,
+        "spans_mean_ms": {k: round(v / requests, 2) for k, v in sorted(spans.items())},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(report: Dict[str, Any], old_path: str) -> None:
+    old = json.loads(Path(old_path).read_text(encoding="utf-8"))
+    print(f"\nvs {old_path} (commit {old.get('meta', {}).get('commit')}):")
+    print(f"{'endpoint':<16} {'p50 old':>9} {'p50 new':>9} {'x':>6} {'p95 old':>9} {'p95 new':>9} {'x':>6}")
+    for name, cur in report["endpoints"].items():
+        prev = old.get("endpoints", {}).get(name)
+        if not prev:
+            continue
+        r50 = cur["p50_ms"] / prev["p50_ms"] if prev["p50_ms"] else float("nan")
+        r95 = cur["p95_ms"] / prev["p95_ms"] if prev["p95_ms"] else float("nan")
+        print(f"{name:<16} {prev['p50_ms']:9.1f} {cur['p50_ms']:9.1f} {r50:6.2f} "
+              f"{prev['p95_ms']:9.1f} {cur['p95_ms']:9.1f} {r95:6.2f}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Hot endpoint latency via in-process ASGI client")
+    ap.add_argument("--data", default="", help="Готовый каталог gen_dataset.py (иначе генерируется во временный)")
+    ap.add_argument("--campaigns", type=int, default=200)
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--requests", type=int, default=20, help="Запросов на эндпоинт (после прогрева)")
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--endpoints", default="", help="Через запятую (по умолчанию — все)")
+    ap.add_argument("--out", default="", help="Куда записать JSON-отчёт")
+    ap.add_argument("--compare", default="", help="Старый JSON-отчёт для сравнения")
+    args = ap.parse_args()
+
+    tmp = None
+    counts: Dict[str, int] = {}
+    if args.data:
+        work = Path(args.data).resolve()
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        work = Path(tmp.name)
+    # до первого импорта app: engine фиксирует абсолютный путь к БД при создании,
+    # а gen_dataset уже тянет app (cats_export) — иначе писали бы в БД репозитория
+    os.environ["DATABASE_URL"] = f"sqlite:///{work / 'campaign_hub.db'}"
+    os.environ["INLAB_CONFIG"] = str(work / "config.yaml")
+    os.environ["MARGIN_DAILY_AUTO"] = "0"             # фоновый апдейт маржи ходит в Cats
+    if tmp is not None:
+        t0 = time.perf_counter()
+        counts = gen_dataset.generate(work, args.campaigns, args.days, args.seed,
+                                      ROOT_DIR / "campaign_hub.db", ROOT_DIR / "yandex_metrics.db")
+        print(f"dataset: {json.dumps(counts, ensure_ascii=False)} ({time.perf_counter() - t0:.1f}s)")
+    mirror_app_assets(work)
+    out_path = Path(args.out).resolve() if args.out else None
+    compare_path = str(Path(args.compare).resolve()) if args.compare else ""
+
+    os.chdir(work)
+    from fastapi.testclient import TestClient
+    import main as app_main
+    import sqlite3
+    from app.database import engine
+
+    if Path(engine.url.database).resolve() != (work / "campaign_hub.db").resolve():
+        raise SystemExit(f"engine points at {engine.url.database}, not the benchmark dataset")
+    logging.getLogger("httpx").setLevel(logging.WARNING)    # строка лога на каждый запрос TestClient
+
+    con = sqlite3.connect("campaign_hub.db")
+    cids = [r[0] for r in con.execute("SELECT id FROM campaigns ORDER BY id")]
+    gids = [r[0] for r in con.execute("SELECT id FROM campaign_groups ORDER BY id")]
+    days = con.execute("SELECT COUNT(DISTINCT date) FROM raw_system_daily").fetchone()[0]
+    con.close()
+
+    all_scn = scenarios(cids, gids, days)
+    names = [n.strip() for n in args.endpoints.split(",") if n.strip() in all_scn] or list(all_scn)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "campaigns": len(cids), "days": days, "seed": args.seed,
+            "requests": args.requests, "warmup": args.warmup,
+        },
+        "dataset": counts,
+        "endpoints": {},
+    }
+    print(f"{'endpoint':<16} {'mean ms':>8} {'p50':>8} {'p95':>8} {'max':>8} {'req/s':>7} {'KiB':>6}  status  spans")
+    with TestClient(app_main.app) as client:
+        r = client.post("/auth/login", data={"login": gen_dataset.ADMIN_LOGIN, "password": gen_dataset.ADMIN_PASSWORD},
+                        follow_redirects=False)
+        if r.status_code != 303:
+            raise SystemExit(f"login failed: HTTP {r.status_code}")
+        for name in names:
+            res = bench_endpoint(client, all_scn[name], args.requests, args.warmup)
+            report["endpoints"][name] = res
+            spans = " ".join(f"{k}={v:.1f}" for k, v in res["spans_mean_ms"].items())
+            print(f"{name:<16} {res['mean_ms']:8.1f} {res['p50_ms']:8.1f} {res['p95_ms']:8.1f} {res['max_ms']:8.1f} "
+                  f"{res['rps'] or 0:7.1f} {res['bytes_mean'] / 1024:6.0f}  "
+                  f"{','.join(f'{k}x{v}' for k, v in res['status'].items())}  {spans}")
+
+    os.chdir(ROOT_DIR)
+    if out_path:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"report -> {out_path}")
+    if compare_path:
+        compare(report, compare_path)
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
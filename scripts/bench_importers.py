@@ -0,0 +1,225 @@
+# scripts/bench_importers.py
+"""
+Бенчмарк IMAP-импортёров на локальной заглушке (scripts/fake_imap.py).
+
+Для каждого размера (по умолчанию 1k и 10k писем) собирается синтетический
+общий ящик: отчёты Яндекс.Метрики («Отчёт «…» за DD.MM.YYYY», часть — в
+.zip), отчёты Weborama для verifier, письма под MailRule для
+fetch_mail_attachments и посторонняя рассылка. По ящику по очереди
+проходят:
+
+- yandex_import.run_import (полный проход, затем повторный — инкремент);
+- verifier_import.run_import (то же);
+- fetcher.fetch_mail_attachments (UNSEEN, второй проход ничего не находит).
+
+Каждый импортёр пишет в свою временную БД; печатается время, round trips
+(команды IMAP), байты от сервера и к серверу, строки в БД.
+
+    python scripts/bench_importers.py --sizes 1000,10000 --latency 0.005
+    python scripts/bench_importers.py --sizes 1000 --bandwidth 2048 --save-fixtures /tmp/mail
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import yaml
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+for p in (str(SCRIPTS_DIR), str(ROOT_DIR)):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+import bench_providers  # noqa: E402
+import bench_yandex_xlsx  # noqa: E402
+from fake_imap import FakeIMAPServer, MailStore  # noqa: E402
+from providers import PROVIDERS_FROM_EMAIL  # noqa: E402
+
+YANDEX_CAMPAIGNS = 50
+VERIFIER_CAMPAIGNS = 20
+ATTACHMENT_POOL = 40       # разных файлов на вид отчёта: разбор не сводится к одному кешу
+RULE_SENDER = "reports@partner.example"
+XLSX = ("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+def _message(frm: str, subject: str, when: datetime, n: int) -> EmailMessage:
+    m = EmailMessage()
+    m["From"] = frm
+    m["To"] = "bench@inlab.example"
+    m["Subject"] = subject
+    m["Date"] = format_datetime(when)
+    m["Message-ID"] = f"<bench-{n}@inlab.example>"
+    return m
+
+
+def build_mailbox(size: int) -> MailStore:
+    """40% Яндекс, 30% verifier, 10% под MailRule, 20% рассылка — в одной INBOX."""
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    ya_pool = [bench_yandex_xlsx.make_report(20, seed) for seed in range(ATTACHMENT_POOL)]
+    wb_pool = [bench_providers.make_weborama(60, seed) for seed in range(ATTACHMENT_POOL)]
+    store = MailStore()
+    for n in range(size):
+        kind = n % 10
+        when = now - timedelta(seconds=size - n)
+        if kind < 4:
+            day = (now - timedelta(days=1 + n // YANDEX_CAMPAIGNS % 300)).strftime("%d.%m.%Y")
+            m = _message("devnull@yandex.ru", f"Отчёт «Кампания {n % YANDEX_CAMPAIGNS}» за {day}", when, n)
+            m.set_content("Отчёт во вложении.")
+            blob = ya_pool[n % ATTACHMENT_POOL]
+            if n % 40 == 3:
+                buf = io.BytesIO()
+                with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+                    zf.writestr("Таблица.xlsx", blob)
+                m.add_attachment(buf.getvalue(), maintype="application", subtype="zip", filename="report.zip")
+            else:
+                m.add_attachment(blob, maintype=XLSX[0], subtype=XLSX[1], filename="Таблица.xlsx")
+        elif kind < 7:
+            c = n % VERIFIER_CAMPAIGNS
+            m = _message(PROVIDERS_FROM_EMAIL["weborama"], f"Weborama report [C{c:03d}] #{n}", when, n)
+            m.set_content("Report attached.")
+            m.add_attachment(wb_pool[n % ATTACHMENT_POOL], maintype=XLSX[0], subtype=XLSX[1],
+                             filename=f"weborama_{n}.xlsx")
+        elif kind < 8:
+            m = _message(RULE_SENDER, f"Daily stats #{n}", when, n)
+            m.set_content("Stats attached.")
+            m.add_attachment(b"\x89PNG" + bytes(2000), maintype="image", subtype="png", filename="logo.png",
+                             disposition="inline")
+            m.add_attachment(ya_pool[n % ATTACHMENT_POOL], maintype=XLSX[0], subtype=XLSX[1],
+                             filename=f"stats_{n}.xlsx")
+        else:
+            m = _message("news@shop.example", f"Скидки недели #{n}", when, n)
+            m.set_content("<html><body>" + "<p>Акция</p>" * 200 + "</body></html>", subtype="html")
+        store.add("INBOX", m.as_bytes())
+    return store
+
+
+def save_fixtures(store: MailStore, root: Path) -> None:
+    for folder in store.folders.values():
+        d = root / ("" if folder.name == "INBOX" else folder.name)
+        d.mkdir(parents=True, exist_ok=True)
+        for m in folder.messages:
+            (d / f"{m.uid:06d}.eml").write_bytes(m.raw)
+
+
+def _rows(db: str, *tables: str) -> int:
+    conn = sqlite3.connect(db)
+    try:
+        return sum(conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables)
+    finally:
+        conn.close()
+
+
+def run_yandex(work: Path) -> int:
+    import yandex_import
+    from app.services import yandex_bindings
+    db = str(work / "yandex_metrics.db")
+    os.environ["INLAB_DB"] = db
+    conn = yandex_bindings.connect(db)
+    for c in range(YANDEX_CAMPAIGNS):
+        yandex_bindings.set_binding(1000 + c, f"Кампания {c}", "INBOX", conn=conn)
+    conn.close()
+    yandex_import.run_import(days=400)
+    return _rows(db, "yandex_daily_metrics", "yandex_import_files")
+
+
+def run_verifier(work: Path) -> int:
+    import verifier_import
+    db = str(work / "campaign_hub.db")
+    conn = sqlite3.connect(db)
+    verifier_import.ensure_schema(conn)
+    conn.executemany(
+        "INSERT OR REPLACE INTO verifier_campaigns (campaign_id, provider, verifier_name) VALUES (?, 'weborama', ?)",
+        [(2000 + c, f"[C{c:03d}]") for c in range(VERIFIER_CAMPAIGNS)],
+    )
+    conn.commit()
+    conn.close()
+    if verifier_import.run_import(["--db", db]):
+        raise RuntimeError("verifier import failed")
+    return _rows(db, "verifier_daily_metric", "verifier_import_files")
+
+
+def run_fetcher(work: Path) -> int:
+    from app.config import get_settings
+    from app.services import fetcher
+
+    class Rule:
+        id = "bench"
+        allowed_senders = [RULE_SENDER]
+        subject_regex = [r"^Daily stats"]
+        filename_regex = [r"\.xlsx$"]
+        folder = "INBOX"
+
+    get_settings.cache_clear()
+    return sum(1 for _ in fetcher.fetch_mail_attachments(Rule(), dest_dir=str(work / "mail")))
+
+
+IMPORTERS: Dict[str, Callable[[Path], int]] = {
+    "yandex": run_yandex,
+    "verifier": run_verifier,
+    "fetcher": run_fetcher,
+}
+
+
+def bench_size(size: int, importers: List[str], latency: float, bandwidth: float, workers: int,
+               save_to: str) -> None:
+    t0 = time.perf_counter()
+    store = build_mailbox(size)
+    print(f"\n== {size} messages (built in {time.perf_counter() - t0:.1f}s), "
+          f"latency {latency * 1000:.0f} ms, bandwidth {bandwidth or 'unlimited'} KiB/s ==")
+    if save_to:
+        save_fixtures(store, Path(save_to) / str(size))
+    print(f"{'importer':<10} {'pass':<12} {'wall s':>8} {'round trips':>12} {'KiB out':>10} {'KiB in':>8} {'rows':>8}")
+
+    with FakeIMAPServer(store, latency=latency, bandwidth=bandwidth * 1024 or None) as srv, \
+            tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        cfg = work / "config.yaml"
+        cfg.write_text(yaml.safe_dump({"imap": {
+            "host": "127.0.0.1", "port": srv.port, "ssl": False,
+            "user": "bench@inlab.example", "password": "bench", "pool_size": workers,
+        }}), encoding="utf-8")
+        os.environ["INLAB_CONFIG"] = str(cfg)
+        for name in importers:
+            for label in ("cold", "incremental"):
+                before = srv.stats.snapshot()
+                t = time.perf_counter()
+                # импортёры печатают построчный лог — в отчёт бенчмарка он не нужен
+                with contextlib.redirect_stdout(io.StringIO()):
+                    rows = IMPORTERS[name](work)
+                wall = time.perf_counter() - t
+                after = srv.stats.snapshot()
+                print(
+                    f"{name:<10} {label:<12} {wall:8.2f} {after['round_trips'] - before['round_trips']:12d} "
+                    f"{(after['bytes_out'] - before['bytes_out']) / 1024:10.0f} "
+                    f"{(after['bytes_in'] - before['bytes_in']) / 1024:8.0f} {rows:8d}"
+                )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="IMAP importers against an offline fake mailbox")
+    ap.add_argument("--sizes", default="1000,10000", help="Размеры ящика через запятую")
+    ap.add_argument("--importers", default=",".join(IMPORTERS), help="yandex,verifier,fetcher")
+    ap.add_argument("--latency", type=float, default=0.0, help="Задержка на ответ сервера, секунд")
+    ap.add_argument("--bandwidth", type=float, default=0.0, help="Отдача сервера, КиБ/с (0 — без ограничения)")
+    ap.add_argument("--workers", type=int, default=4, help="imap.pool_size для импортёров")
+    ap.add_argument("--save-fixtures", default="", help="Сохранить ящики как .eml в этот каталог")
+    args = ap.parse_args()
+
+    importers = [i.strip() for i in args.importers.split(",") if i.strip() in IMPORTERS]
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        bench_size(size, importers, args.latency, args.bandwidth, args.workers, args.save_fixtures)
+
+
+if __name__ == "__main__":
+    main()
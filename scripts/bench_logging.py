@@ -0,0 +1,109 @@
+# scripts/bench_logging.py
+"""
+Микробенчмарк: сколько логирование стоит потоку запроса.
+
+Сравнивает прежнюю схему (RotatingFileHandler прямо на root — запись и
+ротация в потоке запроса) с QueueHandler/QueueListener из
+app.logging_setup. «Запрос» = LINES_PER_REQUEST записей лога; меряется
+время в вызывающих потоках (то, что видит пользователь), а не время
+записи на диск.
+
+    python scripts/bench_logging.py --requests 2000 --threads 8
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app import logging_setup  # noqa: E402
+
+LINES_PER_REQUEST = 10
+
+
+def _setup_sync(log_dir: Path, max_bytes: int) -> None:
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    fh = RotatingFileHandler(log_dir / "app.log", maxBytes=max_bytes, backupCount=5, encoding="utf-8")
+    fh.setFormatter(logging.Formatter(logging_setup.TEXT_FORMAT))
+    root.addHandler(fh)
+    root.setLevel(logging.DEBUG)
+
+
+def _setup_queue(log_dir: Path, max_bytes: int, json_lines: bool) -> None:
+    logging_setup.APP_LOG = log_dir / "app.log"
+    logging_setup.JSON_LOG = log_dir / "app.jsonl"
+    os.environ["LOG_JSON"] = "1" if json_lines else "0"
+    logging_setup.setup_logging(logging.DEBUG)
+    # консоль в бенчмарке не нужна — она одинаково тормозит обе схемы
+    for h in logging_setup._listener.handlers:
+        if isinstance(h, RotatingFileHandler):
+            h.maxBytes = max_bytes
+        elif isinstance(h, logging.StreamHandler):
+            h.setLevel(logging.CRITICAL + 1)
+
+
+def _run(requests: int, threads: int) -> list:
+    log = logging.getLogger("app.bench")
+    per_request: list = []
+    lock = threading.Lock()
+
+    def worker(n: int) -> None:
+        local = []
+        for i in range(n):
+            t0 = time.perf_counter()
+            for j in range(LINES_PER_REQUEST):
+                log.info("request %d line %d: campaign=%s rows=%d", i, j, "C-1042", 1234)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            per_request.extend(local)
+
+    ths = [threading.Thread(target=worker, args=(requests // threads,)) for _ in range(threads)]
+    for t in ths:
+        t.start()
+    for t in ths:
+        t.join()
+    return per_request
+
+
+def _report(name: str, samples: list) -> None:
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6  # noqa: E731
+    print(
+        f"{name:<14} n={len(samples):<6} mean={statistics.mean(samples) * 1e6:8.1f}us "
+        f"p50={p(0.50):8.1f}us p99={p(0.99):8.1f}us max={samples[-1] * 1e6:9.1f}us"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Per-request logging overhead: sync file handler vs queue")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--max-bytes", type=int, default=256 * 1024, help="маленький, чтобы ротация попала в замер")
+    args = ap.parse_args()
+
+    print(f"{LINES_PER_REQUEST} log lines per request, {args.threads} threads")
+    with tempfile.TemporaryDirectory() as d:
+        _setup_sync(Path(d), args.max_bytes)
+        _report("sync file", _run(args.requests, args.threads))
+    for json_lines in (False, True):
+        with tempfile.TemporaryDirectory() as d:
+            _setup_queue(Path(d), args.max_bytes, json_lines)
+            samples = _run(args.requests, args.threads)
+            logging_setup._listener.stop()
+            logging_setup._listener = None
+            _report("queue+json" if json_lines else "queue", samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+# scripts/bench_parsers.py
+"""
+Пропускная способность разборщиков выгрузок на синтетическом корпусе.
+
+Корпус — файлы в форме настоящих (генераторы из bench_providers,
+bench_yandex_xlsx и fake_cats плюс свои для системной выгрузки и Метрики
+из почты) размером ``--sizes`` строк, по умолчанию 1 000 / 20 000 / 200 000.
+Файлы пишутся один раз в ``--corpus DIR`` (по умолчанию во временный каталог
+ОС) и переиспользуются: генерация 200k-строчных xlsx дороже самого разбора.
+
+Разборщики:
+
+- system_xlsx      — parser.parse_system_xlsx;
+- metrica_xlsx     — parser.parse_metrica_xlsx;
+- cats_stat_xlsx   — cats_export.parse_stat_bytes + normalize_columns + _normalize_metrics;
+- cats_stat_csv    — то же для csv (cp1251, «;»);
+- cats_campaigns   — campaigns._parse_spreadsheetml_campaigns;
+- cats_shortage    — campaigns._parse_cats_shortage_xls;
+- shortage_margin  — campaigns._parse_shortage_spreadsheet;
+- adserving, weborama — провайдеры верификаторов (scripts/providers);
+- yandex_xlsx      — yandex_import.parse_xlsx.
+
+Для каждой пары (разборщик, размер): лучшее время из ``--repeat`` прогонов
+(мелкие файлы повторяются, пока не наберётся ``--min-time``), строк/с и МБ/с; отдельным прогоном под tracemalloc — пик памяти Python,
+память, удерживаемая результатом, и число сборок поколения 0 (счётчика
+выделений в CPython нет, а gen0 срабатывает примерно на каждые 700
+созданных контейнеров — это и есть «аллокации»).
+
+Базовая линия — JSON (``--baseline``, по умолчанию
+scripts/bench_parsers_baseline.json рядом со скриптом). ``--save-baseline``
+перезаписывает её; без него прогон сравнивается с ней и завершается с
+кодом 1, если строк/с упало больше чем на ``--tolerance`` или пик памяти
+вырос больше чем на ``--mem-tolerance`` (подозрительные пары перед этим
+перемеряются ``--retries`` раз). На общей одноядерной ВМ время одного и того же
+кода скачет на 30–45% между прогонами, поэтому порог по скорости по умолчанию —
+50%: ловятся кратные замедления, а не шум; на тихой машине его можно ужать.
+Пик памяти (tracemalloc) от шума не зависит — его порог 25%. Базовая линия
+имеет смысл только на той же машине — платформа записывается в неё и сверяется.
+
+Полный прогон с 200k строк — порядка получаса на одном ядре (большая часть —
+прогон под tracemalloc); для быстрой проверки — ``--sizes 1000,20000``.
+
+    python scripts/bench_parsers.py --save-baseline
+    python scripts/bench_parsers.py --parsers cats_stat_xlsx,system_xlsx --sizes 1000,20000
+"""
+import argparse
+import atexit
+import contextlib
+import csv
+import gc
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from openpyxl import Workbook
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+for p in (str(SCRIPTS_DIR), str(ROOT_DIR)):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+# до импорта app: database создаёт engine при импорте, а cats_export — data/cats в cwd
+_CWD = Path.cwd()
+_WORK = tempfile.mkdtemp(prefix="bench_parsers_")
+atexit.register(shutil.rmtree, _WORK, True)
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_WORK) / 'campaign_hub.db'}"
+os.environ["MARGIN_DAILY_AUTO"] = "0"
+os.chdir(_WORK)
+
+import bench_providers  # noqa: E402
+import bench_yandex_xlsx  # noqa: E402
+import yandex_import  # noqa: E402
+from fake_cats import CatsDataset, _ru, campaigns_xml, shortage_xml  # noqa: E402
+from providers import REGISTRY  # noqa: E402
+
+from app.routers import campaigns  # noqa: E402
+from app.services import cats_export, parser  # noqa: E402
+
+CORPUS_VERSION = 1                                   # поднять при изменении генераторов
+BASELINE_PATH = SCRIPTS_DIR / "bench_parsers_baseline.json"
+MAX_RUNS = 100
+START = date(2025, 10, 1)
+CATS_HEADER = ["День", "Показы", "Переходы", "Охват", "CTR", "VTR"]
+
+
+def _save(wb: Workbook) -> bytes:
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+# --- генераторы фикстур ---
+
+def make_system_xlsx(rows: int, seed: int = 0) -> bytes:
+    """Выгрузка системы: дата то datetime, то «DD.MM.YYYY»; часть чисел строками «1 234,5»."""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Статистика")
+    ws.append(["День", "Показы", "Переходы", "Расход", "Охват", "Частота", "CTR",
+               "Просмотр 1/4", "Просмотр 1/2", "Просмотр 3/4", "Досмотр", "VTR", "Комментарий"])
+    for n in range(rows):
+        d = START + timedelta(days=n % 365)
+        impr = rnd.randint(1_000, 500_000)
+        reach = int(impr * rnd.uniform(0.3, 0.8))
+        v25 = int(impr * 0.7)
+        ws.append([
+            datetime(d.year, d.month, d.day) if n % 2 else d.strftime("%d.%m.%Y"),
+            impr if n % 3 else _ru(impr, 0),
+            int(impr * 0.004),
+            round(impr * 0.12, 2) if n % 3 else _ru(impr * 0.12),
+            reach, round(impr / reach, 2), 0.4,
+            v25, int(v25 * 0.8), int(v25 * 0.6), int(v25 * 0.5), 35.0,
+            None if n % 5 else "ok",
+        ])
+    return _save(wb)
+
+
+def make_metrica_xlsx(rows: int, seed: int = 0) -> bytes:
+    """Метрика из почты: шапка, заголовок с «Дата» в 5-й строке, «Итого и средние», строки по дням/меткам."""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Отчёт")
+    ws.append([f"Отчёт «Кампания {seed}» с {START} по {START + timedelta(days=364)}"])
+    ws.append(["Сегмент: Источник трафика"])
+    ws.append(["Атрибуция: последний значимый переход"])
+    ws.append([None])
+    ws.append(["Дата", "UTM Campaign", "UTM Source", "Визиты", "Посетители", "Отказы",
+               "Глубина просмотра", "Время на сайте", "Конверсии"])
+    ws.append(["Итого и средние", None, None, rows * 50, rows * 40, 0.3, 1.8, "0:01:10", rows])
+    for n in range(rows):
+        d = START + timedelta(days=n % 365)
+        sec = rnd.randint(0, 600)
+        ws.append([
+            datetime(d.year, d.month, d.day) if n % 2 else d.strftime("%d.%m.%Y"),
+            f"camp_{n % 40}", f"src_{n % 7}",
+            rnd.randint(1, 500), rnd.randint(1, 400), rnd.randint(0, 100), round(rnd.uniform(1, 5), 2),
+            f"{sec // 3600}:{sec // 60 % 60:02d}:{sec % 60:02d}", rnd.randint(0, 5),
+        ])
+    return _save(wb)
+
+
+def _cats_rows(rows: int, seed: int) -> List[list]:
+    rnd = random.Random(seed)
+    out = []
+    ti = tc = tu = 0
+    for n in range(rows):
+        impr = rnd.randint(5_000, 200_000)
+        clk = int(impr * rnd.uniform(0.001, 0.02))
+        uni = int(impr * rnd.uniform(0.3, 0.8))
+        ti, tc, tu = ti + impr, tc + clk, tu + uni
+        out.append([(START + timedelta(days=n % 365)).strftime("%d.%m.%Y"), impr, clk, uni,
+                    _ru(clk / impr * 100), round(rnd.uniform(20, 90), 2)])
+    out.append(["Итого", ti, tc, tu, _ru(tc / ti * 100) if ti else None, None])
+    return out
+
+
+def make_cats_stat_xlsx(rows: int, seed: int = 0) -> bytes:
+    """Как fake_cats.uniques_xlsx, но ``rows`` строк: CTR строкой с запятой, VTR числом, «Итого» в конце."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Уникальные")
+    ws.append(CATS_HEADER)
+    for row in _cats_rows(rows, seed):
+        ws.append(row)
+    return _save(wb)
+
+
+def make_cats_stat_csv(rows: int, seed: int = 0) -> bytes:
+    buf = io.StringIO()
+    w = csv.writer(buf, delimiter=";")
+    w.writerow(CATS_HEADER)
+    w.writerows(_cats_rows(rows, seed))
+    return buf.getvalue().encode("cp1251")
+
+
+def make_cats_campaigns(rows: int, seed: int = 0) -> bytes:
+    return campaigns_xml(CatsDataset(rows, days=1, creatives_per_campaign=0, seed=seed))
+
+
+def make_cats_shortage(rows: int, seed: int = 0) -> bytes:
+    return shortage_xml(CatsDataset(rows, days=1, creatives_per_campaign=0, seed=seed),
+                        "cpm", ["cpm", "cpc", "cpc_ic"])
+
+
+# имя -> (расширение, генератор)
+FIXTURES: Dict[str, Tuple[str, Callable[[int, int], bytes]]] = {
+    "system": ("xlsx", make_system_xlsx),
+    "metrica": ("xlsx", make_metrica_xlsx),
+    "cats_stat": ("xlsx", make_cats_stat_xlsx),
+    "cats_stat_csv": ("csv", make_cats_stat_csv),
+    "cats_campaigns": ("xls", make_cats_campaigns),
+    "cats_shortage": ("xls", make_cats_shortage),
+    "adserving": ("xlsx", bench_providers.make_adserving),
+    "weborama": ("xlsx", bench_providers.make_weborama),
+    "yandex": ("xlsx", bench_yandex_xlsx.make_report),
+}
+
+
+# --- разборщики: блоб -> число записей результата (для контроля, что разбор не пустой) ---
+
+def _cats_stat(fmt: str) -> Callable[[bytes], int]:
+    def run(blob: bytes) -> int:
+        df = cats_export.parse_stat_bytes(blob, fmt, "cp1251", ";")
+        return len(cats_export._normalize_metrics(cats_export.normalize_columns(df, {})))
+    return run
+
+
+def _yandex(blob: bytes) -> int:
+    with contextlib.redirect_stdout(io.StringIO()):       # parse_xlsx печатает итог
+        return 1 if yandex_import.parse_xlsx(blob)[1] else 0
+
+
+# имя -> (фикстура, разбор)
+PARSERS: Dict[str, Tuple[str, Callable[[bytes], int]]] = {
+    "system_xlsx": ("system", lambda b: len(parser.parse_system_xlsx(b)[0])),
+    "metrica_xlsx": ("metrica", lambda b: len(parser.parse_metrica_xlsx(b)[0])),
+    "cats_stat_xlsx": ("cats_stat", _cats_stat("xlsx")),
+    "cats_stat_csv": ("cats_stat_csv", _cats_stat("csv")),
+    "cats_campaigns": ("cats_campaigns", lambda b: len(campaigns._parse_spreadsheetml_campaigns(b))),
+    "cats_shortage": ("cats_shortage", lambda b: len(campaigns._parse_cats_shortage_xls(b, "cpm"))),
+    "shortage_margin": ("cats_shortage", lambda b: len(campaigns._parse_shortage_spreadsheet(b, "cpm"))),
+    "adserving": ("adserving", lambda b: len(REGISTRY["adserving"].parse(b))),
+    "weborama": ("weborama", lambda b: len(REGISTRY["weborama"].parse(b))),
+    "yandex_xlsx": ("yandex", _yandex),
+}
+
+
+def fixture(corpus: Path, name: str, rows: int, seed: int) -> bytes:
+    ext, make = FIXTURES[name]
+    path = corpus / f"v{CORPUS_VERSION}" / f"{name}_{rows}_s{seed}.{ext}"
+    if path.exists():
+        return path.read_bytes()
+    t0 = time.perf_counter()
+    blob = make(rows, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(blob)
+    tmp.replace(path)
+    print(f"  generated {path.name} ({len(blob) / 1e6:.1f} MB, {time.perf_counter() - t0:.1f}s)")
+    return blob
+
+
+# --- замер ---
+
+def measure(run: Callable[[bytes], int], blob: bytes, rows: int, repeat: int, min_time: float,
+            budget: float) -> Dict[str, Any]:
+    """
+    Лучшее из не менее ``repeat`` прогонов, пока не набрано ``min_time`` секунд
+    (мелкие файлы иначе шумят на десятки процентов), но не дольше ``budget``.
+    """
+    best = None
+    spent = 0.0
+    records = 0
+    runs = 0
+    while True:
+        gc.collect()
+        t0 = time.perf_counter()
+        records = run(blob)
+        sec = time.perf_counter() - t0
+        best = sec if best is None else min(best, sec)
+        spent += sec
+        runs += 1
+        if spent > budget or runs >= MAX_RUNS or (runs >= repeat and spent >= min_time):
+            break
+
+    gc.collect()
+    gen0 = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    holder = [run(blob)]                          # результат жив до замера удержанной памяти
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gen0 = gc.get_stats()[0]["collections"] - gen0
+    del holder
+
+    return {
+        "rows": rows,
+        "records": records,
+        "runs": runs,
+        "bytes": len(blob),
+        "best_s": round(best, 4),
+        "rows_per_s": round(rows / best, 1) if best else None,
+        "mb_per_s": round(len(blob) / 1e6 / best, 2) if best else None,
+        "peak_mib": round((peak - base) / 2 ** 20, 2),
+        "retained_kib": round((current - base) / 1024, 1),
+        "gc_gen0": gen0,
+    }
+
+
+def check(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+          mem_tolerance: float) -> List[Tuple[str, str]]:
+    """Регрессии относительно базовой линии: (ключ «parser@rows», описание); ключ должен быть в обоих отчётах."""
+    problems = []
+    old = baseline.get("results", {})
+    for key, cur in results.items():
+        prev = old.get(key)
+        if not prev:
+            continue
+        if prev.get("rows_per_s") and cur["rows_per_s"] < prev["rows_per_s"] * (1 - tolerance):
+            problems.append((key, f"{cur['rows_per_s']:.0f} rows/s vs {prev['rows_per_s']:.0f} "
+                                  f"({cur['rows_per_s'] / prev['rows_per_s'] - 1:+.0%})"))
+        # мелкие пики (<1 MiB) шумят от прогона к прогону — их не сравниваем
+        if prev.get("peak_mib", 0) >= 1 and cur["peak_mib"] > prev["peak_mib"] * (1 + mem_tolerance):
+            problems.append((key, f"peak {cur['peak_mib']:.1f} MiB vs {prev['peak_mib']:.1f} MiB "
+                                  f"({cur['peak_mib'] / prev['peak_mib'] - 1:+.0%})"))
+        if prev.get("records") is not None and cur["records"] != prev["records"]:
+            problems.append((key, f"{cur['records']} records vs {prev['records']} — разбор изменил результат"))
+    return problems
+
+
+def remeasure(report: Dict[str, Any], keys: List[str], corpus: Path, args: argparse.Namespace) -> None:
+    """Повторный замер подозрительных пар: время на общей машине скачет, в отчёт идёт лучшее из двух."""
+    for key in keys:
+        name, rows = key.rsplit("@", 1)
+        fx, run = PARSERS[name]
+        again = measure(run, fixture(corpus, fx, int(rows), args.seed), int(rows), args.repeat,
+                        args.min_time, args.budget)
+        cur = report["results"][key]
+        if again["best_s"] < cur["best_s"]:
+            for k in ("best_s", "rows_per_s", "mb_per_s", "runs"):
+                cur[k] = again[k]
+        cur["peak_mib"] = min(cur["peak_mib"], again["peak_mib"])
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Parser throughput / memory against a stored baseline")
+    ap.add_argument("--corpus", default=str(Path(tempfile.gettempdir()) / "inlab_parser_corpus"),
+                    help="Каталог корпуса (создаётся и переиспользуется)")
+    ap.add_argument("--sizes", default="1000,20000,200000", help="Строк в файле, через запятую")
+    ap.add_argument("--parsers", default="", help="Через запятую (по умолчанию — все)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--min-time", type=float, default=1.0, help="Повторять замер, пока не наберётся секунд")
+    ap.add_argument("--budget", type=float, default=5.0, help="Не больше секунд на повторы одного замера")
+    ap.add_argument("--baseline", default=str(BASELINE_PATH))
+    ap.add_argument("--save-baseline", action="store_true", help="Записать прогон как базовую линию")
+    ap.add_argument("--tolerance", type=float, default=0.5,
+                    help="Допустимое падение строк/с (доля); шум на общей ВМ — до 45%%")
+    ap.add_argument("--mem-tolerance", type=float, default=0.25, help="Допустимый рост пика памяти (доля)")
+    ap.add_argument("--retries", type=int, default=2, help="Перемерить подозрительные пары перед провалом")
+    ap.add_argument("--out", default="", help="Куда ещё записать JSON-отчёт")
+    args = ap.parse_args()
+
+    corpus = (_CWD / args.corpus).resolve()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    names = [n.strip() for n in args.parsers.split(",") if n.strip() in PARSERS] or list(PARSERS)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "corpus_version": CORPUS_VERSION,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    print(f"corpus: {corpus}")
+    print(f"{'parser':<16} {'rows':>7} {'MB':>6} {'best s':>8} {'rows/s':>10} {'MB/s':>6} "
+          f"{'peak MiB':>9} {'kept KiB':>9} {'gc0':>6}  records")
+    for name in names:
+        fx, run = PARSERS[name]
+        for rows in sizes:
+            blob = fixture(corpus, fx, rows, args.seed)
+            res = measure(run, blob, rows, args.repeat, args.min_time, args.budget)
+            report["results"][f"{name}@{rows}"] = res
+            print(f"{name:<16} {rows:7d} {res['bytes'] / 1e6:6.1f} {res['best_s']:8.3f} {res['rows_per_s']:10.0f} "
+                  f"{res['mb_per_s']:6.2f} {res['peak_mib']:9.1f} {res['retained_kib']:9.0f} {res['gc_gen0']:6d}  "
+                  f"{res['records']}")
+
+    baseline_path = (_CWD / args.baseline).resolve()
+    out_path = (_CWD / args.out).resolve() if args.out else None
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline -> {baseline_path}")
+    elif not baseline_path.exists():
+        print(f"no baseline at {baseline_path} (--save-baseline to create)")
+    else:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        meta = baseline.get("meta", {})
+        if meta.get("machine") != report["meta"]["machine"] or meta.get("python") != report["meta"]["python"]:
+            print(f"warning: baseline from {meta.get('platform')} / Python {meta.get('python')} "
+                  f"(commit {meta.get('commit')}) — сравнение между машинами неточно")
+        if meta.get("corpus_version") != CORPUS_VERSION or meta.get("seed") != args.seed:
+            print("warning: baseline measured on a different corpus version/seed")
+        problems = check(report["results"], baseline, args.tolerance, args.mem_tolerance)
+        for _ in range(args.retries):
+            if not problems:
+                break
+            keys = sorted({k for k, _ in problems})
+            print(f"re-measuring {len(keys)} suspected regression(s): {', '.join(keys)}")
+            remeasure(report, keys, corpus, args)
+            problems = check(report["results"], baseline, args.tolerance, args.mem_tolerance)
+        report["regressions"] = [f"{k}: {msg}" for k, msg in problems]
+        if problems:
+            print(f"\nREGRESSIONS vs baseline (commit {meta.get('commit')}):")
+            for line in report["regressions"]:
+                print(f"  {line}")
+        else:
+            print(f"\nno regressions vs baseline (commit {meta.get('commit')}, "
+                  f"tolerance {args.tolerance:.0%} speed / {args.mem_tolerance:.0%} memory)")
+
+    os.chdir(_CWD)
+    if out_path:
+        out_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
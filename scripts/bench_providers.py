@@ -0,0 +1,144 @@
+# scripts/bench_providers.py
+"""
+Бенчмарк разборщиков отчётов верификаторов (scripts/providers).
+
+Для каждого зарегистрированного провайдера генерирует фикстуры в форме
+реальных отчётов (шапка отчёта над заголовком, лишние листы и колонки,
+итоговая строка) или берёт готовые файлы из ``--fixtures DIR/<provider>/*.xlsx``
+и меряет разбор: файлов/с, строк/с и МБ/с.
+
+    python scripts/bench_providers.py --files 20 --rows 2000
+    python scripts/bench_providers.py --fixtures tests_data/verifiers
+"""
+import argparse
+import io
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from openpyxl import Workbook
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from providers import REGISTRY  # noqa: E402
+from providers.adserving import EXPECTED  # noqa: E402
+
+START = date(2025, 10, 1)
+
+
+def _save(wb: Workbook) -> bytes:
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def make_adserving(rows: int, seed: int = 0) -> bytes:
+    """10 строк шапки, заголовок, строки по placement x день, итог."""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Report")
+    ws.append(["Adserving verification report"])
+    for i in range(9):
+        ws.append([f"Filter {i}", f"value {i}"])
+    header = ["Placement"] + list(EXPECTED.values()) + ["Comment"]
+    ws.append(header)
+    for n in range(rows):
+        impr = rnd.randint(1000, 100000)
+        rec = int(impr * 0.9)
+        row = {
+            "Date": START + timedelta(days=n % 30),
+            "Impressions (Net)": impr,
+            "Clicks (Net)": rnd.randint(0, 500),
+            "Impressions (GIVT)": int(impr * 0.01),
+            "GIVT Rate": 0.01,
+            "Clicks (GIVT)": 1,
+            "GIVT Clicks Rate": 0.002,
+            "Impressions (SIVT)": int(impr * 0.02),
+            "SIVT Rate": 0.02,
+            "Negative>Unsafe Impressions": int(impr * 0.001),
+            "Unsafe Rate": 0.001,
+            "Total Recordable Impressions": rec,
+            "Recordable Impressions Rate": 0.9,
+            "Total Viewable Impressions (IAB)": int(rec * 0.6),
+            "Viewable Impressions Rate (IAB)": 0.6,
+        }
+        ws.append([f"placement-{n % 17}"] + [row[h] for h in EXPECTED.values()] + ["ok"])
+    ws.append(["Total", "Total"] + [None] * len(EXPECTED))
+    wb.create_sheet("Legend").append(["see docs"])
+    return _save(wb)
+
+
+def make_weborama(rows: int, seed: int = 0) -> bytes:
+    """Сводный лист впереди, данные на «Froud Total», проценты строками «0,07%»."""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet("Summary")
+    for i in range(50):
+        summary.append([f"k{i}", i])
+    ws = wb.create_sheet("Froud Total")
+    ws.append(["Date", "Campaign", "Site", "Imp WCM", "GIVT (%)", "SIVT (%)", "Final percent", "Note"])
+    for n in range(rows):
+        ws.append([
+            START + timedelta(days=n % 30), "camp", f"site{n % 23}",
+            rnd.randint(1000, 100000),
+            f"{rnd.uniform(0, 2):.2f}%".replace(".", ","),
+            rnd.uniform(0, 3),
+            f"{rnd.uniform(0, 5):.2f}%".replace(".", ","),
+            "",
+        ])
+    return _save(wb)
+
+
+GENERATORS = {"adserving": make_adserving, "weborama": make_weborama}
+
+
+def load_fixtures(root: Path) -> Dict[str, List[bytes]]:
+    return {
+        p.name: [f.read_bytes() for f in sorted(p.glob("*.xlsx"))]
+        for p in sorted(root.iterdir()) if p.is_dir() and p.name in REGISTRY
+    }
+
+
+def bench(provider: str, blobs: List[bytes], repeat: int) -> None:
+    parser = REGISTRY[provider]
+    best = None
+    days = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        days = sum(len(parser.parse(b)) for b in blobs)
+        sec = time.perf_counter() - t0
+        best = sec if best is None else min(best, sec)
+    nbytes = sum(len(b) for b in blobs)
+    print(
+        f"{provider:<10} files={len(blobs):<4} days={days:<6} best of {repeat}: {best:.3f}s  "
+        f"{len(blobs) / best:8.1f} files/s  {nbytes / 1e6 / best:6.2f} MB/s"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Verifier report parser throughput")
+    ap.add_argument("--fixtures", default="", help="Каталог с подкаталогами <provider>/*.xlsx (иначе синтетика)")
+    ap.add_argument("--files", type=int, default=20)
+    ap.add_argument("--rows", type=int, default=2000, help="Строк данных в синтетическом файле")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.fixtures:
+        corpus = load_fixtures(Path(args.fixtures))
+    else:
+        corpus = {
+            name: [gen(args.rows, seed) for seed in range(args.files)]
+            for name, gen in GENERATORS.items() if name in REGISTRY
+        }
+    for provider, blobs in corpus.items():
+        if blobs:
+            bench(provider, blobs, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# scripts/bench_ru_locale.py
+"""
+Бенчмарк разбора RU-чисел и дат (app/services/ru_locale) на колонках по
+``--rows`` значений (по умолчанию 100 000) против прежних построчных
+вариантов, скопированных сюда как эталон:
+
+- numbers    — apply(_coerce_number) из старого cats_export против to_float_series
+  (целые, «1 234,56», «12,5%», «1 234,50 руб.», пустые и мусор вперемешку);
+- scalar     — parse_num из _parse_cats_shortage_xls против to_float по списку;
+- dates      — pd.to_datetime(dayfirst=True) против to_date_series
+  (DD.MM.YYYY, ISO с временем, серийные номера Excel, «Итого»);
+- normalize  — старый _normalize_metrics против нынешнего на выгрузке Cats.
+
+Для каждого — лучшее время из ``--repeat``, ускорение и сверка результатов:
+расхождения печатаются (старый разбор дат с dayfirst теряет смешанные
+форматы — это видно в строке dates).
+
+    python scripts/bench_ru_locale.py --rows 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+# cats_export создаёт data/cats в cwd при импорте — не в репозитории
+os.chdir(tempfile.mkdtemp(prefix="bench_ru_locale_"))
+
+from app.services import cats_export  # noqa: E402
+from app.services.ru_locale import to_date_series, to_float, to_float_series  # noqa: E402
+
+START = date(2025, 1, 1)
+
+
+# --- прежние реализации (эталон) ---
+
+def old_coerce_number(x):
+    if pd.isna(x):
+        return None
+    if isinstance(x, (int, float)):
+        return float(x)
+    s = str(x).strip().replace(" ", "").replace(",", ".").replace("%", "")
+    try:
+        return float(s)
+    except Exception:
+        return None
+
+
+def old_parse_num(x):
+    if x is None:
+        return None
+    s = str(x)
+    s = s.replace("\xa0", "").replace(" ", "").replace(",", ".").replace("руб.", "").replace("р.", "").strip()
+    if not s or s.lower() in ("nan", "none"):
+        return None
+    try:
+        return float(s)
+    except Exception:
+        return None
+
+
+def old_normalize_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    rename = {"Переходы": "clicks", "Показы": "impressions", "Охват": "uniques", "День": "date"}
+    df = df.rename(columns={k: v for k, v in rename.items() if k in df.columns})
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors="coerce").dt.date
+    for src, base in (("CTR", "ctr"), ("VTR", "vtr")):
+        if src in df.columns:
+            vals = df[src].apply(old_coerce_number)
+            df[f"{base}_percent"] = vals
+            df[f"{base}_ratio"] = vals.apply(lambda v: (v / 100.0) if v is not None else None)
+    if "impressions" in df.columns and "uniques" in df.columns:
+        imp = df["impressions"].apply(old_coerce_number)
+        uni = df["uniques"].apply(old_coerce_number)
+        df["freq"] = [round(i / u, 2) if (u and u > 0 and i is not None) else None for i, u in zip(imp, uni)]
+    return df
+
+
+# --- данные ---
+
+def number_column(rows: int, seed: int) -> pd.Series:
+    rnd = random.Random(seed)
+    out: List[Any] = []
+    for n in range(rows):
+        v = rnd.uniform(0, 100_000)
+        k = n % 8
+        out.append(
+            int(v) if k == 0 else
+            round(v, 2) if k == 1 else
+            f"{v:,.2f}".replace(",", "\xa0").replace(".", ",") if k == 2 else
+            f"{v / 1000:.2f}%".replace(".", ",") if k == 3 else
+            f"{v:,.2f} руб.".replace(",", " ").replace(".", ",", 1) if k == 4 else
+            str(int(v)) if k == 5 else
+            "" if k == 6 else
+            None
+        )
+    return pd.Series(out, dtype=object)
+
+
+def date_column(rows: int) -> pd.Series:
+    out: List[Any] = []
+    for n in range(rows):
+        d = START + timedelta(days=n % 700)
+        k = n % 4
+        out.append(
+            d.strftime("%d.%m.%Y") if k in (0, 1) else
+            f"{d.isoformat()} 00:00:00" if k == 2 else
+            (d - date(1899, 12, 30)).days
+        )
+    out[-1] = "Итого"
+    return pd.Series(out, dtype=object)
+
+
+def cats_frame(rows: int, seed: int) -> pd.DataFrame:
+    """Как после parse_stat_bytes: даты строками, CTR строкой с запятой, VTR числом, «Итого» в конце."""
+    rnd = np.random.default_rng(seed)
+    impr = rnd.integers(5_000, 200_000, rows)
+    clk = (impr * rnd.uniform(0.001, 0.02, rows)).astype(int)
+    uni = (impr * rnd.uniform(0.3, 0.8, rows)).astype(int)
+    days = [(START + timedelta(days=int(n % 700))).strftime("%d.%m.%Y") for n in range(rows)]
+    ctr = [f"{c / i * 100:.2f}".replace(".", ",") for c, i in zip(clk, impr)]
+    df = pd.DataFrame({"День": days, "Показы": impr, "Переходы": clk, "Охват": uni, "CTR": ctr,
+                       "VTR": rnd.uniform(20, 90, rows).round(2)})
+    df.loc[len(df)] = ["Итого", impr.sum(), clk.sum(), uni.sum(), None, None]
+    return df
+
+
+# --- замер ---
+
+def best_of(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best, res = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        sec = time.perf_counter() - t0
+        best = sec if best is None else min(best, sec)
+    return best, res
+
+
+def _floats(v) -> np.ndarray:
+    return pd.to_numeric(pd.Series(list(v), dtype=object), errors="coerce").to_numpy(dtype="float64")
+
+
+def diff_floats(a, b) -> int:
+    x, y = _floats(a), _floats(b)
+    return int((~(np.isclose(x, y, rtol=1e-12, atol=0) | (np.isnan(x) & np.isnan(y)))).sum())
+
+
+def diff_dates(a: pd.Series, b: pd.Series) -> int:
+    return int((~((a == b) | (a.isna() & b.isna()))).sum())
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="RU-locale number/date parsing: vectorized vs row-wise")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    nums = number_column(args.rows, args.seed)
+    num_list = nums.tolist()
+    dates = date_column(args.rows)
+    cats = cats_frame(args.rows, args.seed)
+
+    cases: List[Tuple[str, Callable[[], Any], Callable[[], Any], Callable[[Any, Any], int]]] = [
+        ("numbers", lambda: nums.apply(old_coerce_number), lambda: to_float_series(nums), diff_floats),
+        ("scalar", lambda: [old_parse_num(x) for x in num_list], lambda: [to_float(x) for x in num_list],
+         diff_floats),
+        ("dates", lambda: pd.to_datetime(dates, dayfirst=True, errors="coerce"), lambda: to_date_series(dates),
+         diff_dates),
+        ("normalize", lambda: old_normalize_metrics(cats.copy()),
+         lambda: cats_export._normalize_metrics(cats.copy()),
+         lambda a, b: sum(diff_floats(a[c], b[c]) for c in ("ctr_percent", "ctr_ratio", "vtr_percent", "freq"))
+         + diff_dates(pd.to_datetime(a["date"]), pd.to_datetime(b["date"]))),
+    ]
+
+    print(f"{args.rows} values, best of {args.repeat}")
+    print(f"{'case':<10} {'old ms':>9} {'new ms':>9} {'speedup':>8} {'Mvals/s':>8}  differing")
+    results: Dict[str, Tuple[float, float]] = {}
+    for name, old, new, diff in cases:
+        t_old, r_old = best_of(old, args.repeat)
+        t_new, r_new = best_of(new, args.repeat)
+        results[name] = (t_old, t_new)
+        print(f"{name:<10} {t_old * 1000:9.1f} {t_new * 1000:9.1f} {t_old / t_new:7.1f}x "
+              f"{args.rows / t_new / 1e6:8.2f}  {diff(r_old, r_new)}")
+
+
+if __name__ == "__main__":
+    main()
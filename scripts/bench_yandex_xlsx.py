@@ -0,0 +1,130 @@
+# scripts/bench_yandex_xlsx.py
+"""
+Бенчмарк разбора вложений Яндекс.Метрики (yandex_import.parse_xlsx и
+выбор .xlsx из архива).
+
+Корпус — отчёты в форме настоящих выгрузок: строка «Отчёт … с D по D»,
+строки фильтров, заголовок в 5-й строке, «Итого и средние» в 6-й, дальше
+строки источников; время визита строкой «0:01:23» или временем Excel.
+Часть вложений упакована в .zip вместе с посторонними файлами. Можно
+подложить свои файлы: ``--fixtures DIR`` (*.xlsx и *.zip).
+
+Печатает вложений/с и пик памяти Python (tracemalloc) на одно вложение.
+
+    python scripts/bench_yandex_xlsx.py --files 50 --rows 500
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import random
+import sys
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from typing import List, Tuple
+
+from openpyxl import Workbook
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+import yandex_import  # noqa: E402
+
+HEADER = ["Источник трафика", "Визиты", "Посетители", "Отказы", "Глубина просмотра", "Время на сайте"]
+
+
+def make_report(rows: int, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    day = datetime.date(2025, 10, 1) + datetime.timedelta(days=seed % 28)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Отчёт")
+    ws.append([f"Отчёт «Кампания {seed}» с {day} по {day}"])
+    ws.append(["Сегмент: Источник трафика"])
+    ws.append(["Фильтр: UTM Campaign"])
+    ws.append([None])
+    ws.append(HEADER)
+    ws.append(["Итого и средние", rows * 50, rows * 40, 0.3, 1.8, "0:01:10"])
+    for n in range(rows):
+        sec = rnd.randint(0, 600)
+        t = f"{sec // 3600}:{sec // 60 % 60:02d}:{sec % 60:02d}" if n % 2 else datetime.time(0, sec // 60, sec % 60)
+        ws.append([f"source-{n}", rnd.randint(1, 100), rnd.randint(1, 80), rnd.random(), rnd.uniform(1, 5), t])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def make_zip(xlsx: bytes, seed: int) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("readme.txt", "report")
+        zf.writestr(f"Таблица_{seed}.xlsx", xlsx)
+        zf.writestr("chart.xlsx", make_report(5, seed + 1000))
+    return buf.getvalue()
+
+
+def corpus(files: int, rows: int, zipped_every: int) -> List[Tuple[str, bytes]]:
+    out = []
+    for seed in range(files):
+        x = make_report(rows, seed)
+        if zipped_every and seed % zipped_every == zipped_every - 1:
+            out.append((f"report_{seed}.zip", make_zip(x, seed)))
+        else:
+            out.append((f"report_{seed}.xlsx", x))
+    return out
+
+
+def process(name: str, blob: bytes):
+    """То же, что делают store_attachment/store_zip до записи в БД."""
+    if name.lower().endswith(".zip"):
+        chosen = yandex_import.choose_attachment(list(yandex_import.iter_zip_xlsx(name, blob)))
+        if not chosen:
+            return None, None
+        blob = yandex_import.read_zip_member(blob, chosen[2])
+        if blob is None:
+            return None, None
+    return yandex_import.parse_xlsx(blob)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Yandex Metrica attachment parsing throughput")
+    ap.add_argument("--fixtures", default="", help="Каталог с *.xlsx / *.zip (иначе синтетика)")
+    ap.add_argument("--files", type=int, default=50)
+    ap.add_argument("--rows", type=int, default=500, help="Строк источников в синтетическом отчёте")
+    ap.add_argument("--zipped-every", type=int, default=5, help="Каждое N-е вложение — архив (0 — без архивов)")
+    args = ap.parse_args()
+
+    if args.fixtures:
+        items = [(p.name, p.read_bytes()) for p in sorted(Path(args.fixtures).iterdir())
+                 if p.suffix.lower() in (".xlsx", ".zip")]
+    else:
+        items = corpus(args.files, args.rows, args.zipped_every)
+    if not items:
+        print("no fixtures")
+        return
+
+    # parse_xlsx печатает строку на каждое вложение — в замере она не нужна
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        ok = sum(1 for name, blob in items if process(name, blob)[1])
+        sec = time.perf_counter() - t0
+
+        peaks = []
+        for name, blob in items[:10]:
+            tracemalloc.start()
+            process(name, blob)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    nbytes = sum(len(b) for _, b in items)
+    print(
+        f"{len(items)} attachments ({nbytes / 1e6:.1f} MB, {ok} with metrics) in {sec:.2f}s: "
+        f"{len(items) / sec:.1f} attachments/s; peak Python memory per attachment "
+        f"{max(peaks) / 1e6:.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
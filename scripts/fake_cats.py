@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fake_cats.py
+------------
+Локальная заглушка админки Cats для бенчмарков и прогонов без сети.
+HTTP-сервер в том же процессе (поток на соединение, keep-alive), отдаёт
+ровно то, что забирают наши клиенты:
+
+- форма логина ``/iface/home/login/`` (GET — форма с csrf_token, POST —
+  cookie сессии и редирект на ``/iface/home/`` с «Dashboard»);
+- выгрузка уникальных по кампании ``/iface/campaigns/stat/uniques/{id}?&export=xlsx``
+  — xlsx «День/Показы/Переходы/Охват/CTR/VTR» со строкой «Итого»
+  (export_and_ingest);
+- SpreadsheetML-выгрузка кампаний ``/iface/campaigns/show/main/?export=xls``
+  (campaigns_import_cats);
+- SpreadsheetML shortage ``/iface/statistics/shortage/campaigns/{cpm|cpc}/``
+  с фильтром ``payout_model[i]`` (_margin_update_all_core);
+- HTML-список креативов ``/iface/creatives/?page=N`` с пагинацией и, по
+  желанию, ссылкой «Все (N)» (импорт флайтов).
+
+Без cookie защищённые страницы отвечают 302 на форму логина — как настоящий
+Cats. URL выгрузки в cats_export зашит (``PRODUCTION_BASE``), поэтому на
+время прогона ``with srv.intercept():`` направляет запросы requests на этот
+адрес в заглушку — код приложения и config не меняются. Префикс ``/iface`` можно повторять (``/iface/iface/...``): разные
+места кода склеивают базовый URL по-разному.
+
+Данные синтетические и детерминированные (``CatsDataset``: кампании × дни,
+креативы, средние цены), готовые ответы кешируются, так что время сервера
+не попадает в замер клиента. ``latency`` — задержка на каждый запрос,
+``export_latency`` — дополнительно на каждую выгрузку. Счётчики в
+``server.stats``: запросы по маршрутам, логины, TCP-соединения, байты,
+пик одновременных запросов.
+
+    with FakeCatsServer(CatsDataset(campaigns=500), latency=0.02) as srv:
+        print(srv.base_url)        # http://127.0.0.1:<port>/iface/
+
+    python scripts/fake_cats.py --campaigns 500 --days 31 --port 8081 --latency 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlencode, urlsplit
+
+import requests
+from openpyxl import Workbook
+
+USERNAME = "bench@inlab.example"
+PASSWORD = "bench"
+COOKIE = "cats_session"
+SS_NS = "urn:schemas-microsoft-com:office:spreadsheet"
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PRODUCTION_BASE = "https://catsnetwork.ru/iface/"      # зашит в cats_export._build_download_conf
+
+
+# --- данные ---
+
+@dataclass
+class CatsCampaign:
+    id: int
+    name: str
+    advertiser: str
+    payout_model: str          # cpm | cpc | cpc_ic
+    avg_price: float
+
+
+@dataclass
+class CatsCreative:
+    id: int
+    name: str
+    campaign_name: str
+    start: date
+    end: date
+
+
+def _ru(x: float, nd: int = 2) -> str:
+    """1234.5 -> «1 234,50» (неразрывный пробел, как в выгрузках Cats)."""
+    return f"{x:,.{nd}f}".replace(",", "\xa0").replace(".", ",")
+
+
+class CatsDataset:
+    """
+    Синтетический кабинет: ``campaigns`` кампаний по ``days`` дней с начала
+    месяца, ``creatives_per_campaign`` креативов на кампанию. Каждая 25-я
+    кампания — «Foxible …», каждая 40-я — тестовая: их фильтруют импортёры.
+    """
+
+    def __init__(self, campaigns: int = 200, days: int = 31, creatives_per_campaign: int = 3,
+                 seed: int = 0, month_start: Optional[date] = None):
+        self.seed = seed
+        self.days = days
+        self.month_start = month_start or date.today().replace(day=1)
+        rnd = random.Random(seed)
+        self.campaigns: List[CatsCampaign] = []
+        for n in range(campaigns):
+            pm = ("cpm", "cpm", "cpc", "cpc_ic")[n % 4]
+            if n % 25 == 24:
+                name = f"Foxible {n}"
+            elif n % 40 == 39:
+                name = f"test кампания {n}"
+            else:
+                name = f"Кампания {n} · бренд {n % 37}"
+            price = rnd.uniform(80, 400) if pm == "cpm" else rnd.uniform(5, 40)
+            self.campaigns.append(CatsCampaign(100000 + n, name, f"Рекламодатель {n % 53}", pm, round(price, 2)))
+        self.by_id = {c.id: c for c in self.campaigns}
+        self.creatives: List[CatsCreative] = []
+        for c in self.campaigns:
+            for k in range(creatives_per_campaign):
+                start = self.month_start + timedelta(days=rnd.randrange(max(days, 1)))
+                self.creatives.append(CatsCreative(
+                    500000 + len(self.creatives),
+                    f"{c.name} / креатив {k + 1}" if k else f"{c.name} / основной",
+                    c.name, start, start + timedelta(days=rnd.randint(7, 60)),
+                ))
+        self.creatives.sort(key=lambda x: -x.id)      # field=creative_id&order=desc
+
+    def daily(self, cid: int) -> List[Tuple[date, int, int, int, float]]:
+        """(день, показы, переходы, охват, VTR %) — детерминированно от seed и id."""
+        rnd = random.Random(self.seed * 1_000_003 + cid)
+        out = []
+        for d in range(self.days):
+            impr = rnd.randint(5_000, 200_000)
+            out.append((self.month_start + timedelta(days=d), impr, int(impr * rnd.uniform(0.001, 0.02)),
+                        int(impr * rnd.uniform(0.3, 0.8)), round(rnd.uniform(20, 90), 2)))
+        return out
+
+
+# --- рендер ответов ---
+
+def uniques_xlsx(ds: CatsDataset, cid: int) -> bytes:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Уникальные")
+    ws.append(["День", "Показы", "Переходы", "Охват", "CTR", "VTR"])
+    ti = tc = tu = 0
+    for day, impr, clk, uni, vtr in ds.daily(cid):
+        ti, tc, tu = ti + impr, tc + clk, tu + uni
+        # CTR — строкой с запятой, как в выгрузке; VTR — числом
+        ws.append([day.strftime("%d.%m.%Y"), impr, clk, uni, _ru(clk / impr * 100), vtr])
+    ws.append(["Итого", ti, tc, tu, _ru(tc / ti * 100) if ti else None, None])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _ss_cell(v) -> str:
+    if v is None:
+        return "<ss:Cell/>"
+    if isinstance(v, (int, float)):
+        return f'<ss:Cell><ss:Data ss:Type="Number">{v}</ss:Data></ss:Cell>'
+    return f'<ss:Cell><ss:Data ss:Type="String">{escape(str(v))}</ss:Data></ss:Cell>'
+
+
+def spreadsheet_xml(sheet: str, header: List[str], rows: List[list]) -> bytes:
+    """SpreadsheetML 2003 (то, что Cats отдаёт как .xls). Пустые ячейки пропускаются через ss:Index."""
+    out = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n<?mso-application progid="Excel.Sheet"?>\n',
+        f'<ss:Workbook xmlns:ss="{SS_NS}"><ss:Worksheet ss:Name="{escape(sheet)}"><ss:Table>',
+        "<ss:Row>", "".join(_ss_cell(h) for h in header), "</ss:Row>",
+    ]
+    for row in rows:
+        out.append("<ss:Row>")
+        skipped = False
+        for i, v in enumerate(row):
+            if v is None or v == "":
+                skipped = True
+                continue
+            cell = _ss_cell(v)
+            if skipped:
+                cell = cell.replace("<ss:Cell>", f'<ss:Cell ss:Index="{i + 1}">', 1)
+                skipped = False
+            out.append(cell)
+        out.append("</ss:Row>")
+    out.append("</ss:Table></ss:Worksheet></ss:Workbook>")
+    return "".join(out).encode("utf-8")
+
+
+def campaigns_xml(ds: CatsDataset) -> bytes:
+    header = ["№", "ID", "Название", "Рекламодатель", "Модель оплаты", "Формат", "Категория", "Статус"]
+    rows = [[n + 1, c.id, c.name, c.advertiser, c.payout_model.upper(), "Баннер" if n % 3 else "Видео",
+             "" if n % 5 == 0 else f"Категория {n % 11}", "active"]
+            for n, c in enumerate(ds.campaigns)]
+    return spreadsheet_xml("Кампании", header, rows)
+
+
+def shortage_xml(ds: CatsDataset, metric: str, payout_models: List[str]) -> bytes:
+    header = ["ID", "Название кампании", "Модель оплаты", "План", "Факт", "Недобор, %",
+              f"Средний {metric.upper()}, руб."]
+    rows = []
+    for n, c in enumerate(ds.campaigns):
+        if c.payout_model not in payout_models:
+            continue
+        plan = 100_000 * (1 + n % 9)
+        fact = int(plan * (0.5 + (n % 7) / 10))
+        # цена то числом, то строкой «1 234,56 руб.» — встречаются обе
+        price = c.avg_price if n % 2 else f"{_ru(c.avg_price)} руб."
+        rows.append([c.id, c.name, c.payout_model, plan if n % 6 else None, fact,
+                     _ru((plan - fact) / plan * 100), price])
+    return spreadsheet_xml("Shortage", header, rows)
+
+
+def login_html(token: str, error: str = "") -> bytes:
+    return (
+        "<!doctype html><html><head><title>Cats — вход</title>"
+        f'<meta name="csrf-token" content="{token}"></head><body>'
+        + (f'<div class="error">{escape(error)}</div>' if error else "")
+        + '<form id="login-form" method="post" action="/iface/home/login/">'
+        f'<input type="hidden" name="csrf_token" value="{token}">'
+        '<input name="login"><input type="password" name="password">'
+        '<button type="submit" name="submit">Войти</button></form></body></html>'
+    ).encode("utf-8")
+
+
+DASHBOARD_HTML = (
+    "<!doctype html><html><head><title>Cats</title></head><body>"
+    '<div class="dashboard"><h1>Dashboard</h1></div></body></html>'
+).encode("utf-8")
+
+
+def creatives_html(ds: CatsDataset, query: Dict[str, List[str]], page: Optional[int], per_page: int,
+                   all_link: bool) -> bytes:
+    items = ds.creatives
+    pages = max(1, -(-len(items) // per_page))
+    chunk = items if page is None else items[(page - 1) * per_page: page * per_page]
+
+    def href(p) -> str:
+        q = {k: v[-1] for k, v in query.items()}
+        q["page"] = p
+        return "/iface/creatives/?" + urlencode(q)
+
+    out = [
+        "<!doctype html><html><head><title>Creatives</title></head><body>",
+        '<div class="filters"><a href="/iface/creatives/">Сбросить</a></div>',
+        '<table class="table"><thead><tr><th>ID</th><th>Название</th><th>Название кампании</th>'
+        "<th>Шаблон</th><th>Старт</th><th>Завершение</th></tr></thead><tbody>",
+    ]
+    for cr in chunk:
+        out.append(
+            # ссылка — на названии: flights считает страницей пагинации любую ссылку с числом
+            f'<tr><td>{cr.id}</td><td><a href="/iface/creatives/edit/{cr.id}/">{escape(cr.name)}</a></td>'
+            f"<td>{escape(cr.campaign_name)}</td><td>banner_240x400</td>"
+            f"<td>{cr.start:%d.%m.%Y}</td><td>{cr.end:%d.%m.%Y}</td></tr>"
+        )
+    out.append('</tbody></table><ul class="pagination">')
+    if page is not None:
+        out.extend(f'<li><a href="{escape(href(p))}">{p}</a></li>' for p in range(1, pages + 1))
+        if all_link:
+            out.append(f'<li><a href="{escape(href("all"))}">Все ({len(items)})</a></li>')
+    out.append("</ul></body></html>")
+    return "".join(out).encode("utf-8")
+
+
+# --- сервер ---
+
+class ServerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.logins = 0
+        self.connections = 0
+        self.bytes_out = 0
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def enter(self) -> None:
+        with self._lock:
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+
+    def leave(self, route: str, nbytes: int) -> None:
+        with self._lock:
+            self.inflight -= 1
+            self.requests[route] += 1
+            self.bytes_out += nbytes
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            snap = {
+                "requests": sum(self.requests.values()),
+                "logins": self.logins,
+                "connections": self.connections,
+                "bytes_out": self.bytes_out,
+                "max_inflight": self.max_inflight,
+            }
+            snap.update({f"route:{k}": v for k, v in self.requests.items()})
+            return snap
+
+    def reset_peak(self) -> None:
+        with self._lock:
+            self.max_inflight = self.inflight
+
+
+_UNIQUES_RE = re.compile(r"^/campaigns/stat/uniques/(\d+)/?$")
+_SHORTAGE_RE = re.compile(r"^/statistics/shortage/campaigns/(cpm|cpc)/?$")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeCatsServer"
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.stats._lock:
+            self.server.stats.connections += 1
+
+    def log_message(self, fmt, *args) -> None:     # без access-лога в stderr
+        pass
+
+    # --- ответы ---
+
+    def reply(self, route: str, status: int, body: bytes = b"", ctype: str = "text/html; charset=utf-8",
+              headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+        self.server.stats.leave(route, len(body))
+
+    def to_login(self, route: str) -> None:
+        self.reply(route, 302, headers={"Location": "/iface/home/login/"})
+
+    def authed(self) -> bool:
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            k, _, v = part.strip().partition("=")
+            if k == COOKIE and v in self.server.sessions:
+                return True
+        return False
+
+    # --- маршрутизация ---
+
+    def do_GET(self) -> None:
+        self.handle_request()
+
+    def do_POST(self) -> None:
+        self.handle_request()
+
+    def handle_request(self) -> None:
+        srv = self.server
+        srv.stats.enter()
+        if srv.latency:
+            time.sleep(srv.latency)
+        url = urlsplit(self.path)
+        path = url.path
+        while path == "/iface" or path.startswith("/iface/"):
+            path = path[len("/iface"):] or "/"
+        query = parse_qs(url.query, keep_blank_values=True)
+        body = b""
+        if self.command == "POST":
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        if path.rstrip("/") == "/home/login":
+            return self.login(body)
+        if not self.authed():
+            return self.to_login("unauthorized")
+        if path.rstrip("/") in ("", "/home"):
+            return self.reply("dashboard", 200, DASHBOARD_HTML)
+
+        m = _UNIQUES_RE.match(path)
+        if m:
+            cid = int(m.group(1))
+            if cid not in srv.dataset.by_id:
+                return self.reply("uniques", 404, b"<html><body>Not found</body></html>")
+            blob = srv.cached(("uniques", cid), lambda: uniques_xlsx(srv.dataset, cid))
+            fname = quote(f"Уникальные_{cid}.xlsx")
+            return self.export("uniques", blob, XLSX_TYPE, f"attachment; filename*=UTF-8''{fname}")
+
+        if path.rstrip("/") == "/campaigns/show/main":
+            blob = srv.cached(("campaigns",), lambda: campaigns_xml(srv.dataset))
+            return self.export("campaigns", blob, "application/vnd.ms-excel",
+                               'attachment; filename="campaigns.xls"')
+
+        m = _SHORTAGE_RE.match(path)
+        if m:
+            metric = m.group(1)
+            models = sorted(v for k, vs in query.items() if k.startswith("payout_model") for v in vs)
+            blob = srv.cached(("shortage", metric, tuple(models)),
+                              lambda: shortage_xml(srv.dataset, metric, models or [metric]))
+            return self.export("shortage", blob, "application/vnd.ms-excel",
+                               f'attachment; filename="shortage_{metric}.xls"')
+
+        if path.rstrip("/") == "/creatives":
+            raw = (query.get("page") or ["1"])[0]
+            page = None if raw == "all" else max(1, int(raw) if raw.isdigit() else 1)
+            blob = srv.cached(("creatives", page, url.query),
+                              lambda: creatives_html(srv.dataset, query, page, srv.per_page, srv.all_link))
+            return self.reply("creatives_all" if page is None else "creatives", 200, blob)
+
+        self.reply("not_found", 404, b"<html><body>Not found</body></html>")
+
+    def export(self, route: str, blob: bytes, ctype: str, cdisp: str) -> None:
+        if self.server.export_latency:
+            time.sleep(self.server.export_latency)
+        self.reply(route, 200, blob, ctype, {"Content-Disposition": cdisp})
+
+    def login(self, body: bytes) -> None:
+        srv = self.server
+        if self.command != "POST":
+            return self.reply("login_form", 200, login_html(secrets.token_hex(16)))
+        form = {k: v[-1] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+        user = form.get(srv.username_field)
+        if user != srv.username or form.get(srv.password_field) != srv.password:
+            return self.reply("login_failed", 200, login_html(secrets.token_hex(16), "Неверный логин или пароль"))
+        sid = secrets.token_hex(16)
+        with srv.stats._lock:
+            srv.sessions.add(sid)
+            srv.stats.logins += 1
+        self.reply("login", 302, headers={"Location": "/iface/home/",
+                                          "Set-Cookie": f"{COOKIE}={sid}; Path=/; HttpOnly"})
+
+
+class FakeCatsServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, dataset: CatsDataset, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, export_latency: float = 0.0, per_page: int = 50,
+                 all_link: bool = False, username: str = USERNAME, password: str = PASSWORD,
+                 username_field: str = "login", password_field: str = "password"):
+        super().__init__((host, port), _Handler)
+        self.dataset = dataset
+        self.latency = latency
+        self.export_latency = export_latency
+        self.per_page = per_page
+        self.all_link = all_link
+        self.username, self.password = username, password
+        self.username_field, self.password_field = username_field, password_field
+        self.sessions: set = set()
+        self.stats = ServerStats()
+        self._cache: Dict[tuple, bytes] = {}
+        self._cache_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/iface/"
+
+    def cached(self, key: tuple, render: Callable[[], bytes]) -> bytes:
+        blob = self._cache.get(key)
+        if blob is None:
+            blob = render()
+            with self._cache_lock:
+                self._cache.setdefault(key, blob)
+        return blob
+
+    def system_config(self) -> Dict[str, object]:
+        """Секция ``system`` config.yaml, нацеленная на этот сервер."""
+        base = self.base_url
+        return {
+            "base_url": base,
+            "connect_url": base,
+            "auth": {
+                "type": "form",
+                "username": self.username,
+                "password": self.password,
+                "form": {
+                    "login_url": base + "home/login/",
+                    "username_field": self.username_field,
+                    "password_field": self.password_field,
+                    "success_check": {"text_contains": "Dashboard"},
+                    "csrf": {"hidden_input_name": "csrf_token"},
+                },
+            },
+        }
+
+    @contextmanager
+    def intercept(self, prefix: str = PRODUCTION_BASE):
+        """
+        Запросы requests на ``prefix`` (боевой Cats) уходят в заглушку. Подмена —
+        в Session.request до подготовки запроса, так что cookie сессии,
+        полученные от заглушки при логине, подставляются как обычно.
+        """
+        orig = requests.Session.request
+        base = self.base_url
+
+        def request(session, method, url, *args, **kwargs):
+            if isinstance(url, str) and url.startswith(prefix):
+                url = base + url[len(prefix):]
+            return orig(session, method, url, *args, **kwargs)
+
+        requests.Session.request = request
+        try:
+            yield self
+        finally:
+            requests.Session.request = orig
+
+    def start(self) -> "FakeCatsServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-cats", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeCatsServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.stop()
+        return False
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Local Cats admin stand-in with synthetic data")
+    ap.add_argument("--campaigns", type=int, default=200)
+    ap.add_argument("--days", type=int, default=31, help="Дней статистики с начала месяца")
+    ap.add_argument("--creatives", type=int, default=3, help="Креативов на кампанию")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", type=float, default=0.0, help="Задержка на запрос, секунд")
+    ap.add_argument("--export-latency", type=float, default=0.0, help="Доп. задержка на выгрузку, секунд")
+    ap.add_argument("--per-page", type=int, default=50, help="Креативов на страницу")
+    ap.add_argument("--all-link", action="store_true", help="Показывать ссылку «Все (N)»")
+    args = ap.parse_args()
+
+    ds = CatsDataset(args.campaigns, args.days, args.creatives, args.seed)
+    srv = FakeCatsServer(ds, port=args.port, latency=args.latency, export_latency=args.export_latency,
+                         per_page=args.per_page, all_link=args.all_link)
+    print(f"fake Cats on {srv.base_url} ({len(ds.campaigns)} campaigns, {len(ds.creatives)} creatives); "
+          f"login {srv.username} / {srv.password}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fake_imap.py
+------------
+Локальная заглушка IMAP для бенчмарков и проверки импортёров без боевого
+ящика. Сервер в том же процессе (поток на соединение, 127.0.0.1, без TLS)
+и понимает ровно то, что шлют наши клиенты (imaplib + IMAPCompatClient):
+
+- CAPABILITY, LOGIN (любой пароль), SELECT/EXAMINE (EXISTS, UIDVALIDITY,
+  UIDNEXT), LIST, NOOP, IDLE, CLOSE, LOGOUT;
+- SEARCH / UID SEARCH: ALL, SEEN, UNSEEN, FROM, SUBJECT, TO, SINCE, BEFORE,
+  ON, UID, OR, NOT, скобки, CHARSET;
+- FETCH / UID FETCH: UID, FLAGS, RFC822, RFC822.SIZE, INTERNALDATE,
+  ENVELOPE, BODYSTRUCTURE, BODY[...] и BODY.PEEK[...] с <offset.length>;
+- STORE / UID STORE: FLAGS, +FLAGS, -FLAGS (.SILENT).
+
+Письма берутся из каталога фикстур (``*.eml`` и mbox-файлы ``*.mbox``;
+подкаталог — папка, файлы в корне — INBOX) или добавляются из кода
+(``MailStore.add``). ``latency`` — задержка на каждый ответ сервера (один
+round trip), ``bandwidth`` — ограничение отдачи, байт/с. Счётчики в
+``server.stats``: команды (round trips), байты туда и обратно, логины.
+
+    with FakeIMAPServer(MailStore.from_dir("fixtures/mail"), latency=0.02) as srv:
+        client = IMAPCompatClient("127.0.0.1", srv.port, ssl=False)
+
+    python scripts/fake_imap.py fixtures/mail --port 1143 --latency 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import email
+import email.utils
+import mailbox
+import re
+import socketserver
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.header import Header
+from email.message import Message
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+# --- хранилище писем ---
+
+def _raw_body(part: Message) -> bytes:
+    """Тело части как в исходном письме (с Content-Transfer-Encoding)."""
+    payload = part.get_payload()
+    if isinstance(payload, list):
+        return part.as_bytes().split(b"\n\n", 1)[-1]
+    return payload.encode("utf-8", "surrogateescape") if isinstance(payload, str) else b""
+
+
+def _q(v: Optional[str]) -> bytes:
+    """Строка IMAP: quoted для простого ASCII, иначе литерал."""
+    if v is None:
+        return b"NIL"
+    b = v.encode("utf-8", "surrogateescape") if isinstance(v, str) else v
+    if all(32 <= c < 127 for c in b) and b'"' not in b and b"\\" not in b:
+        return b'"' + b + b'"'
+    return b"{%d}\r\n" % len(b) + b
+
+
+def _param_value(v: Any) -> str:
+    if isinstance(v, tuple):
+        v = email.utils.collapse_rfc2231_value(v)
+    v = str(v)
+    # не-ASCII имена файлов отдаём encoded-word, как делают почтовые серверы
+    return v if v.isascii() else Header(v, "utf-8").encode()
+
+
+def _params(msg: Message, header: str) -> bytes:
+    params = msg.get_params(header=header) or []
+    items = [(k, v) for k, v in params[1:] if k]
+    if not items:
+        return b"NIL"
+    return b"(" + b" ".join(_q(k.upper() if header == "content-type" else k) + b" " + _q(_param_value(v))
+                            for k, v in items) + b")"
+
+
+def _addresses(value: Optional[str]) -> bytes:
+    if not value:
+        return b"NIL"
+    out = []
+    for name, addr in email.utils.getaddresses([value]):
+        local, _, host = addr.partition("@")
+        out.append(b"(" + _q(name or None) + b" NIL " + _q(local or None) + b" " + _q(host or None) + b")")
+    return b"(" + b"".join(out) + b")" if out else b"NIL"
+
+
+def envelope(msg: Message) -> bytes:
+    frm = msg.get("From")
+    fields = [
+        _q(msg.get("Date")), _q(msg.get("Subject")),
+        _addresses(frm), _addresses(msg.get("Sender") or frm), _addresses(msg.get("Reply-To") or frm),
+        _addresses(msg.get("To")), _addresses(msg.get("Cc")), _addresses(msg.get("Bcc")),
+        _q(msg.get("In-Reply-To")), _q(msg.get("Message-ID")),
+    ]
+    return b"(" + b" ".join(fields) + b")"
+
+
+def bodystructure(msg: Message) -> bytes:
+    if msg.is_multipart():
+        children = b"".join(bodystructure(p) for p in msg.get_payload())
+        return b"(" + children + b" " + _q(msg.get_content_subtype()) + b" " + _params(msg, "content-type") + b" NIL NIL NIL)"
+    body = _raw_body(msg)
+    mtype, subtype = msg.get_content_maintype(), msg.get_content_subtype()
+    head = [
+        _q(mtype), _q(subtype), _params(msg, "content-type"),
+        _q(msg.get("Content-ID")), _q(msg.get("Content-Description")),
+        _q((msg.get("Content-Transfer-Encoding") or "7bit").strip()), str(len(body)).encode(),
+    ]
+    if mtype == "text":
+        head.append(str(body.count(b"\n")).encode())
+    disp = msg.get("Content-Disposition")
+    disposition = (b"(" + _q(disp.split(";")[0].strip()) + b" " + _params(msg, "content-disposition") + b")"
+                   if disp else b"NIL")
+    return b"(" + b" ".join(head + [b"NIL", disposition, b"NIL", b"NIL"]) + b")"
+
+
+def _section_part(msg: Message, path: List[int]) -> Optional[Message]:
+    part = msg
+    for n in path:
+        if part.is_multipart():
+            children = part.get_payload()
+            if not 1 <= n <= len(children):
+                return None
+            part = children[n - 1]
+        elif n != 1:
+            return None
+    return part
+
+
+class StoredMessage:
+    """Письмо в папке; ENVELOPE/BODYSTRUCTURE считаются один раз при первом запросе."""
+
+    __slots__ = ("uid", "raw", "flags", "internaldate", "_msg", "_env", "_bs")
+
+    def __init__(self, uid: int, raw: bytes, flags: Iterable[str] = ()):
+        self.uid = uid
+        self.raw = raw.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+        self.flags = set(flags)
+        self._msg: Optional[Message] = None
+        self._env: Optional[bytes] = None
+        self._bs: Optional[bytes] = None
+        try:
+            self.internaldate = email.utils.parsedate_to_datetime(self.msg.get("Date"))
+        except Exception:
+            self.internaldate = datetime.now(timezone.utc)
+        self._msg = None
+
+    @property
+    def msg(self) -> Message:
+        if self._msg is None:
+            self._msg = email.message_from_bytes(self.raw)
+        return self._msg
+
+    def envelope(self) -> bytes:
+        if self._env is None:
+            self._env = envelope(self.msg)
+        return self._env
+
+    def bodystructure(self) -> bytes:
+        if self._bs is None:
+            self._bs = bodystructure(self.msg)
+        return self._bs
+
+    def section(self, spec: str) -> bytes:
+        spec = spec.upper()
+        head, _, body = self.raw.partition(b"\r\n\r\n")
+        if spec == "":
+            return self.raw
+        if spec == "HEADER" or spec.startswith("HEADER.FIELDS"):
+            return head + b"\r\n\r\n"
+        if spec == "TEXT":
+            return body
+        part = _section_part(self.msg, [int(x) for x in spec.split(".") if x.isdigit()])
+        return _raw_body(part).replace(b"\r\n", b"\n").replace(b"\n", b"\r\n") if part is not None else b""
+
+
+class Folder:
+    def __init__(self, name: str, uidvalidity: int):
+        self.name = name
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.messages: List[StoredMessage] = []
+
+
+class MailStore:
+    """Папки с письмами; ``add`` из любого потока будит IDLE-сессии папки."""
+
+    def __init__(self):
+        self.folders: Dict[str, Folder] = {}
+        self.changed = threading.Condition()
+
+    def folder(self, name: str) -> Folder:
+        key = "INBOX" if name.upper() == "INBOX" else name
+        if key not in self.folders:
+            self.folders[key] = Folder(key, uidvalidity=len(self.folders) + 1)
+        return self.folders[key]
+
+    def add(self, folder: str, raw: bytes, flags: Iterable[str] = ()) -> int:
+        with self.changed:
+            f = self.folder(folder)
+            uid = f.uidnext
+            f.uidnext += 1
+            f.messages.append(StoredMessage(uid, raw, flags))
+            self.changed.notify_all()
+        return uid
+
+    @classmethod
+    def from_dir(cls, root: str | Path) -> "MailStore":
+        """``*.eml`` и ``*.mbox``; подкаталог — папка (``a/b`` -> ``a/b``), корень — INBOX."""
+        store = cls()
+        root = Path(root)
+        for path in sorted(root.rglob("*")):
+            if not path.is_file() or path.suffix.lower() not in (".eml", ".mbox"):
+                continue
+            rel = path.parent.relative_to(root).as_posix()
+            folder = "INBOX" if rel in ("", ".") else rel
+            if path.suffix.lower() == ".eml":
+                store.add(folder, path.read_bytes())
+            else:
+                for m in mailbox.mbox(str(path), create=False):
+                    store.add(folder, m.as_bytes())
+        return store
+
+
+# --- разбор команд клиента ---
+
+_ARG_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+
+def _atom_end(line: bytes, pos: int) -> int:
+    """Конец атома с учётом скобок внутри [...] (BODY.PEEK[HEADER.FIELDS (FROM)])."""
+    depth = 0
+    while pos < len(line):
+        c = line[pos:pos + 1]
+        if c == b"[":
+            depth += 1
+        elif c == b"]":
+            depth -= 1
+        elif depth == 0 and c in (b" ", b"(", b")"):
+            break
+        pos += 1
+    return pos
+
+
+def parse_args(line: bytes) -> List[Any]:
+    """``(UID ENVELOPE) "x" FROM`` -> [[b'UID', b'ENVELOPE'], b'x', b'FROM']."""
+    stack: List[List[Any]] = [[]]
+    pos = 0
+    while pos < len(line):
+        while pos < len(line) and line[pos:pos + 1] == b" ":
+            pos += 1
+        if pos >= len(line):
+            break
+        c = line[pos:pos + 1]
+        if c == b"(":
+            stack.append([])
+            pos += 1
+        elif c == b")":
+            done = stack.pop()
+            stack[-1].append(done)
+            pos += 1
+        elif c == b'"':
+            m = _ARG_RE.match(line, pos)
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", m.group(3)))
+            pos = m.end()
+        else:
+            end = _atom_end(line, pos)
+            stack[-1].append(line[pos:end])
+            pos = end
+    while len(stack) > 1:
+        done = stack.pop()
+        stack[-1].append(done)
+    return stack[0]
+
+
+def _imap_date(s: bytes) -> datetime:
+    d, mon, y = s.decode().split("-")
+    return datetime(int(y), MONTHS.index(mon.title()[:3]) + 1, int(d), tzinfo=timezone.utc)
+
+
+def _seq_set(spec: bytes, top: int) -> set:
+    out = set()
+    for chunk in spec.decode().split(","):
+        if ":" in chunk:
+            a, b = chunk.split(":")
+            lo = top if a == "*" else int(a)
+            hi = top if b == "*" else int(b)
+            lo, hi = min(lo, hi), max(lo, hi)
+            out.update(range(lo, hi + 1))
+        else:
+            out.add(top if chunk == "*" else int(chunk))
+    return out
+
+
+class _Search:
+    def __init__(self, args: List[Any], msgs: List[StoredMessage]):
+        self.args = list(args)
+        self.msgs = msgs
+
+    def _key(self):
+        tok = self.args.pop(0)
+        if isinstance(tok, list):
+            preds = []
+            sub = _Search(tok, self.msgs)
+            while sub.args:
+                preds.append(sub._key())
+            return lambda m, i: all(p(m, i) for p in preds)
+        k = tok.upper()
+        if k == b"ALL":
+            return lambda m, i: True
+        if k == b"SEEN":
+            return lambda m, i: "\\Seen" in m.flags
+        if k == b"UNSEEN":
+            return lambda m, i: "\\Seen" not in m.flags
+        if k == b"NOT":
+            p = self._key()
+            return lambda m, i: not p(m, i)
+        if k == b"OR":
+            a, b = self._key(), self._key()
+            return lambda m, i: a(m, i) or b(m, i)
+        if k in (b"FROM", b"TO", b"SUBJECT", b"CC"):
+            needle = self.args.pop(0).decode("utf-8", "replace").lower()
+            hdr = k.decode().title()
+            return lambda m, i: needle in _decoded(m.msg.get(hdr)).lower()
+        if k in (b"SINCE", b"BEFORE", b"ON"):
+            day = _imap_date(self.args.pop(0)).date()
+            if k == b"SINCE":
+                return lambda m, i: m.internaldate.date() >= day
+            if k == b"BEFORE":
+                return lambda m, i: m.internaldate.date() < day
+            return lambda m, i: m.internaldate.date() == day
+        if k == b"UID":
+            top = self.msgs[-1].uid if self.msgs else 0
+            uids = _seq_set(self.args.pop(0), top)
+            return lambda m, i: m.uid in uids
+        if re.fullmatch(rb"[\d:*,]+", k):
+            seqs = _seq_set(k, len(self.msgs))
+            return lambda m, i: i in seqs
+        raise ValueError(f"unsupported SEARCH key {k!r}")
+
+    def run(self) -> List[Tuple[int, StoredMessage]]:
+        if self.args and isinstance(self.args[0], bytes) and self.args[0].upper() == b"CHARSET":
+            self.args = self.args[2:]
+        preds = []
+        while self.args:
+            preds.append(self._key())
+        return [(i, m) for i, m in enumerate(self.msgs, 1) if all(p(m, i) for p in preds)]
+
+
+def _decoded(v: Optional[str]) -> str:
+    if not v:
+        return ""
+    try:
+        return str(email.header.make_header(email.header.decode_header(v)))
+    except Exception:
+        return str(v)
+
+
+_SECTION_RE = re.compile(r"^(BODY(?:\.PEEK)?)\[([^\]]*)\](?:<(\d+)\.(\d+)>)?$", re.I)
+
+
+# --- сервер ---
+
+class ServerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands: Counter = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connections = 0
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.commands.values())
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"round_trips": sum(self.commands.values()), "bytes_in": self.bytes_in,
+                    "bytes_out": self.bytes_out, "connections": self.connections,
+                    "logins": self.commands["LOGIN"]}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "FakeIMAPServer"
+
+    def setup(self) -> None:
+        super().setup()
+        self.folder: Optional[Folder] = None
+        self.readonly = True
+        with self.server.stats._lock:
+            self.server.stats.connections += 1
+
+    # -- ввод/вывод --
+    def send(self, data: bytes) -> None:
+        srv = self.server
+        if srv.bandwidth:
+            step = max(1024, int(srv.bandwidth / 20))
+            for i in range(0, len(data), step):
+                chunk = data[i:i + step]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / srv.bandwidth)
+        else:
+            self.wfile.write(data)
+        with srv.stats._lock:
+            srv.stats.bytes_out += len(data)
+
+    def line(self) -> Optional[bytes]:
+        raw = self.rfile.readline()
+        if not raw:
+            return None
+        data = raw
+        # синхронизирующий литерал {n}: продолжение команды после "+"
+        while True:
+            m = re.search(rb"\{(\d+)\}\r?\n$", data)
+            if not m:
+                break
+            self.send(b"+ go ahead\r\n")
+            lit = self.rfile.read(int(m.group(1)))
+            data = data[:m.start()] + b'"' + lit.replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"' + self.rfile.readline()
+        with self.server.stats._lock:
+            self.server.stats.bytes_in += len(data)
+        return data.rstrip(b"\r\n")
+
+    def handle(self) -> None:
+        self.send(b"* OK fake IMAP4rev1 ready\r\n")
+        while True:
+            try:
+                line = self.line()
+            except (ConnectionError, OSError):
+                return
+            if line is None:
+                return
+            tag, _, rest = line.partition(b" ")
+            cmd, _, args = rest.partition(b" ")
+            cmd = cmd.upper().decode("ascii", "replace")
+            uid = False
+            if cmd == "UID":
+                uid = True
+                cmd, _, args = args.partition(b" ")
+                cmd = cmd.upper().decode("ascii", "replace")
+            with self.server.stats._lock:
+                self.server.stats.commands[("UID " if uid else "") + cmd] += 1
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            try:
+                out, done = self.dispatch(tag, cmd, args, uid)
+            except Exception as e:
+                out, done = b"", tag + b" BAD " + str(e).encode("utf-8", "replace")
+            self.send(out + done + b"\r\n")
+            if cmd == "LOGOUT":
+                return
+
+    # -- команды --
+    def dispatch(self, tag: bytes, cmd: str, args: bytes, uid: bool) -> Tuple[bytes, bytes]:
+        ok = tag + b" OK " + cmd.encode() + b" completed"
+        if cmd == "CAPABILITY":
+            return b"* CAPABILITY " + " ".join(self.server.capabilities).encode() + b"\r\n", ok
+        if cmd in ("LOGIN", "AUTHENTICATE"):
+            return b"", ok
+        if cmd in ("NOOP", "CHECK"):
+            return self._pending_exists(), ok
+        if cmd == "LOGOUT":
+            return b"* BYE fake IMAP\r\n", ok
+        if cmd == "LIST":
+            lines = b"".join(b'* LIST (\\HasNoChildren) "/" ' + _q(name) + b"\r\n" for name in self.server.store.folders)
+            return lines, ok
+        if cmd in ("SELECT", "EXAMINE"):
+            name = parse_args(args)[0].decode("utf-8", "replace")
+            self.folder = self.server.store.folder(name)
+            self.readonly = cmd == "EXAMINE"
+            self.seen_exists = len(self.folder.messages)
+            f = self.folder
+            out = (b"* FLAGS (\\Seen \\Answered \\Flagged \\Deleted \\Draft)\r\n"
+                   b"* %d EXISTS\r\n* 0 RECENT\r\n* OK [UIDVALIDITY %d] UIDs valid\r\n"
+                   b"* OK [UIDNEXT %d] predicted next UID\r\n" % (len(f.messages), f.uidvalidity, f.uidnext))
+            code = b"[READ-ONLY]" if self.readonly else b"[READ-WRITE]"
+            return out, tag + b" OK " + code + b" " + cmd.encode() + b" completed"
+        if cmd == "CLOSE":
+            self.folder = None
+            return b"", ok
+        if self.folder is None:
+            return b"", tag + b" NO no mailbox selected"
+        if cmd == "SEARCH":
+            hits = _Search(parse_args(args), list(self.folder.messages)).run()
+            ids = [m.uid if uid else i for i, m in hits]
+            return b"* SEARCH" + b"".join(b" %d" % n for n in ids) + b"\r\n", ok
+        if cmd == "FETCH":
+            seq, _, items = args.partition(b" ")
+            return b"".join(self._fetch(i, m, parse_args(items), uid) for i, m in self._select(seq, uid)), ok
+        if cmd == "STORE":
+            seq, _, rest = args.partition(b" ")
+            op, _, flags = rest.partition(b" ")
+            return self._store(seq, op.upper(), parse_args(flags), uid), ok
+        if cmd == "IDLE":
+            return self._idle(), ok
+        return b"", tag + b" BAD unknown command " + cmd.encode()
+
+    def _select(self, seq: bytes, uid: bool) -> List[Tuple[int, StoredMessage]]:
+        msgs = self.folder.messages
+        if uid:
+            top = msgs[-1].uid if msgs else 0
+            want = _seq_set(seq, top)
+            return [(i, m) for i, m in enumerate(msgs, 1) if m.uid in want]
+        want = _seq_set(seq, len(msgs))
+        return [(i, m) for i, m in enumerate(msgs, 1) if i in want]
+
+    def _fetch(self, seqno: int, m: StoredMessage, items: List[Any], uid: bool) -> bytes:
+        if items and isinstance(items[0], list):
+            items = items[0]
+        names = [it.decode("ascii", "replace") if isinstance(it, bytes) else "" for it in items]
+        if uid and not any(n.upper() == "UID" for n in names):
+            names.insert(0, "UID")
+        parts: List[bytes] = []
+        for name in names:
+            up = name.upper()
+            if up == "UID":
+                parts.append(b"UID %d" % m.uid)
+            elif up == "FLAGS":
+                parts.append(b"FLAGS (" + " ".join(sorted(m.flags)).encode() + b")")
+            elif up == "INTERNALDATE":
+                parts.append(b'INTERNALDATE "' + m.internaldate.strftime("%d-%b-%Y %H:%M:%S %z").encode() + b'"')
+            elif up == "RFC822.SIZE":
+                parts.append(b"RFC822.SIZE %d" % len(m.raw))
+            elif up == "ENVELOPE":
+                parts.append(b"ENVELOPE " + m.envelope())
+            elif up == "BODYSTRUCTURE":
+                parts.append(b"BODYSTRUCTURE " + m.bodystructure())
+            elif up in ("RFC822", "BODY[]", "BODY.PEEK[]") or _SECTION_RE.match(name):
+                if up == "RFC822":
+                    key, data, peek = b"RFC822", m.raw, False
+                else:
+                    sm = _SECTION_RE.match(name)
+                    peek = sm.group(1).upper() == "BODY.PEEK"
+                    data = m.section(sm.group(2))
+                    key = b"BODY[" + sm.group(2).encode() + b"]"
+                    if sm.group(3) is not None:
+                        off, length = int(sm.group(3)), int(sm.group(4))
+                        data = data[off:off + length]
+                        key += b"<%d>" % off
+                if not peek and not self.readonly:
+                    m.flags.add("\\Seen")
+                parts.append(key + b" {%d}\r\n" % len(data) + data)
+        return b"* %d FETCH (" % seqno + b" ".join(parts) + b")\r\n"
+
+    def _store(self, seq: bytes, op: bytes, flags: List[Any], uid: bool) -> bytes:
+        if flags and isinstance(flags[0], list):
+            flags = flags[0]
+        names = {f.decode() for f in flags if isinstance(f, bytes)}
+        silent = op.endswith(b".SILENT")
+        out = []
+        for i, m in self._select(seq, uid):
+            if op.startswith(b"+"):
+                m.flags |= names
+            elif op.startswith(b"-"):
+                m.flags -= names
+            else:
+                m.flags = set(names)
+            if not silent:
+                out.append(b"* %d FETCH (%sFLAGS (%s))\r\n" % (
+                    i, b"UID %d " % m.uid if uid else b"", " ".join(sorted(m.flags)).encode()))
+        return b"".join(out)
+
+    def _pending_exists(self) -> bytes:
+        n = len(self.folder.messages) if self.folder else 0
+        if self.folder is not None and n != self.seen_exists:
+            self.seen_exists = n
+            return b"* %d EXISTS\r\n" % n
+        return b""
+
+    def _idle(self) -> bytes:
+        """«+ idling», новые письма папки -> «* n EXISTS», до строки DONE."""
+        self.send(b"+ idling\r\n")
+        done = threading.Event()
+
+        def wait_done():
+            self.rfile.readline()
+            done.set()
+            with self.server.store.changed:
+                self.server.store.changed.notify_all()
+
+        threading.Thread(target=wait_done, daemon=True).start()
+        store = self.server.store
+        while not done.is_set():
+            with store.changed:
+                store.changed.wait(0.5)
+            if not done.is_set():
+                pending = self._pending_exists()
+                if pending:
+                    self.send(pending)
+        return b""
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, store: MailStore, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, bandwidth: Optional[float] = None,
+                 capabilities: Iterable[str] = ("IMAP4rev1", "IDLE", "UIDPLUS")):
+        super().__init__((host, port), _Handler)
+        self.store = store
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.capabilities = list(capabilities)
+        self.stats = ServerStats()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FakeIMAPServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-imap", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeIMAPServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.stop()
+        return False
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Local IMAP stand-in fed from .eml/mbox fixtures")
+    ap.add_argument("fixtures", help="Каталог с *.eml / *.mbox (подкаталоги — папки)")
+    ap.add_argument("--port", type=int, default=1143)
+    ap.add_argument("--latency", type=float, default=0.0, help="Задержка на ответ, секунд")
+    ap.add_argument("--bandwidth", type=float, default=0.0, help="Отдача, КиБ/с (0 — без ограничения)")
+    args = ap.parse_args()
+
+    store = MailStore.from_dir(args.fixtures)
+    srv = FakeIMAPServer(store, port=args.port, latency=args.latency,
+                         bandwidth=args.bandwidth * 1024 or None)
+    print(f"fake IMAP on 127.0.0.1:{srv.port}: "
+          + ", ".join(f"{f.name}={len(f.messages)}" for f in store.folders.values()))
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# scripts/gen_dataset.py
+"""
+Синтетический набор данных в форме рабочего каталога приложения.
+
+В ``OUT`` появляются campaign_hub.db, yandex_metrics.db, data/cats/<id>/
+latest_normalized.csv и config.yaml — ровно то, что приложение читает
+относительно текущего каталога. Схема (таблицы, индексы, представления,
+триггеры) копируется без строк из ``--schema-from`` / ``--yandex-schema-from``
+(по умолчанию — БД в корне репозитория), данные генерируются детерминированно
+от ``--seed``:
+
+- N кампаний × D дней Cats: raw_system_daily, fact_daily и CSV через тот же
+  _normalize_metrics, что и export_and_ingest;
+- метрики Яндекса (yandex_daily_metrics, ~70% кампаний);
+- verifier EAV (verifier_daily_metric + verifier_campaigns, ~50% кампаний);
+- ручные правки daily_overrides (~2% ячеек);
+- агентства, клиенты, брони (1–2 на кампанию), маржа за текущий месяц
+  (margin_stats + ежедневные margin_snapshots);
+- группы кампаний по 5–12 участников;
+- виджет: издатель, сайты, видео, плейсменты, сессии и события;
+- пользователь ``admin`` / ``admin`` с ролью admin.
+
+    python scripts/gen_dataset.py /tmp/hub --campaigns 500 --days 90
+"""
+import argparse
+import hashlib
+import json
+import random
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+import yaml
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+ADMIN_LOGIN = "admin"
+ADMIN_PASSWORD = "admin"
+SITE_TOKEN = "bench-site-0"
+PROVIDERS = ("adserving", "weborama", "adriver", "targetads")
+EVENT_TYPES = ("view", "play", "progress_25", "progress_50", "progress_75", "complete", "click")
+MODULES = ("campaigns", "directories", "bookings", "logs", "settings", "dataflow", "users", "sales")
+
+
+def copy_schema(src: Path, dst: sqlite3.Connection) -> int:
+    """DDL из src (без строк и без sqlite_*): таблицы, затем индексы, представления, триггеры."""
+    if not src.exists():
+        raise SystemExit(f"schema template not found: {src} (use --schema-from / --yandex-schema-from)")
+    con = sqlite3.connect(f"file:{src}?mode=ro", uri=True)
+    try:
+        ddl = con.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 WHEN 'view' THEN 2 ELSE 3 END"
+        ).fetchall()
+    finally:
+        con.close()
+    for (sql,) in ddl:
+        dst.execute(sql)
+    return len(ddl)
+
+
+def _days(n: int) -> List[date]:
+    end = date.today() - timedelta(days=1)
+    return [end - timedelta(days=n - 1 - i) for i in range(n)]
+
+
+def write_cats_csv(out: Path, cid: int, rows: List[tuple]) -> None:
+    """CSV в том виде, в каком его оставляет export_and_ingest (строка «Итого» в конце)."""
+    from app.services.cats_export import _normalize_metrics
+
+    df = pd.DataFrame(
+        [(d.strftime("%d.%m.%Y"), i, c, u, f"{c / i * 100:.2f}".replace(".", ","), v) for d, i, c, u, _, v in rows]
+        + [("Итого", sum(r[1] for r in rows), sum(r[2] for r in rows), sum(r[3] for r in rows), None, None)],
+        columns=["День", "Показы", "Переходы", "Охват", "CTR", "VTR"],
+    )
+    p = out / "data" / "cats" / str(cid)
+    p.mkdir(parents=True, exist_ok=True)
+    _normalize_metrics(df).to_csv(p / "latest_normalized.csv", index=False)
+
+
+def generate(out: Path, campaigns: int, days: int, seed: int, schema_from: Path, yandex_schema_from: Path) -> Dict[str, int]:
+    rnd = random.Random(seed)
+    out.mkdir(parents=True, exist_ok=True)
+    for name in ("campaign_hub.db", "yandex_metrics.db"):
+        (out / name).unlink(missing_ok=True)
+    shutil.rmtree(out / "data" / "cats", ignore_errors=True)
+    counts: Dict[str, int] = {}
+    day_list = _days(days)
+    today = date.today()
+    month_key = today.replace(day=1).strftime("%Y-%m-01")
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    hub = sqlite3.connect(out / "campaign_hub.db")
+    ya = sqlite3.connect(out / "yandex_metrics.db")
+    with hub, ya:
+        copy_schema(schema_from, hub)
+        copy_schema(yandex_schema_from, ya)
+
+        # --- доступ ---
+        hub.executemany("INSERT INTO roles (id, code, name) VALUES (?, ?, ?)",
+                        [(1, "admin", "Администратор"), (2, "publisher", "Издатель")])
+        hub.executemany("INSERT INTO modules (code, name) VALUES (?, ?)", [(m, m.title()) for m in MODULES])
+        hub.executemany("INSERT INTO role_module_permissions (role_id, module_code, can_view, can_edit) VALUES (1, ?, 1, 1)",
+                        [(m,) for m in MODULES])
+        pw = hashlib.sha256(ADMIN_PASSWORD.encode("utf-8")).hexdigest()
+        hub.executemany("INSERT INTO users (id, login, password_hash, role_id) VALUES (?, ?, ?, ?)",
+                        [(1, ADMIN_LOGIN, pw, 1), (2, "publisher", pw, 2)])
+
+        # --- кампании и Cats ---
+        cids = [100000 + n for n in range(campaigns)]
+        hub.executemany("INSERT INTO campaigns (id, name, is_active) VALUES (?, ?, 1)",
+                        [(cid, f"Кампания {n} · бренд {n % 37}") for n, cid in enumerate(cids)])
+        rsd, fd, ymet, vmet, vcamp, ovr = [], [], [], [], [], []
+        for n, cid in enumerate(cids):
+            rows = []
+            for d in day_list:
+                impr = rnd.randint(5_000, 200_000)
+                clk = int(impr * rnd.uniform(0.001, 0.02))
+                reach = int(impr * rnd.uniform(0.3, 0.8))
+                v100 = int(impr * rnd.uniform(0.2, 0.9))
+                rows.append((d, impr, clk, reach, v100, round(v100 / impr * 100, 2)))
+                iso = d.isoformat()
+                rsd.append((cid, iso, impr, clk, reach, v100))
+                fd.append((cid, iso, impr, clk))
+                if n % 10 < 7:
+                    visits = int(clk * rnd.uniform(0.5, 0.9))
+                    ymet.append((cid, iso, visits, int(visits * 0.9), rnd.uniform(0.1, 0.4),
+                                 rnd.uniform(1.0, 3.0), rnd.uniform(20, 120)))
+                if n % 2 == 0:
+                    provider = PROVIDERS[n // 2 % len(PROVIDERS)]
+                    vi = int(impr * rnd.uniform(0.9, 1.05))
+                    for metric, value in (
+                        ("impressions", vi), ("clicks", int(clk * rnd.uniform(0.9, 1.05))),
+                        ("givt_impr", int(vi * 0.01)), ("givt_rate_pct", 1.0),
+                        ("sivt_impr", int(vi * 0.02)), ("sivt_rate_pct", 2.0),
+                        ("viewable_impr", int(vi * 0.6)), ("viewable_rate_pct", 60.0),
+                    ):
+                        vmet.append((cid, provider, iso, metric, float(value),
+                                     "percent" if metric.endswith("_pct") else "count", provider))
+                if rnd.random() < 0.02:
+                    ovr.append((cid, iso, rnd.choice(("impressions", "clicks", "uniques")), str(rnd.randint(1000, 9000))))
+            if n % 2 == 0:
+                vcamp.append((cid, PROVIDERS[n // 2 % len(PROVIDERS)], f"[C{n:05d}]"))
+            write_cats_csv(out, cid, rows)
+        hub.executemany("INSERT INTO raw_system_daily (campaign_id, date, impressions, clicks, reach, view_100) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", rsd)
+        hub.executemany("INSERT INTO fact_daily (campaign_id, date, impressions, clicks) VALUES (?, ?, ?, ?)", fd)
+        hub.executemany("INSERT INTO verifier_campaigns (campaign_id, provider, verifier_name) VALUES (?, ?, ?)", vcamp)
+        hub.executemany("INSERT INTO verifier_daily_metric (campaign_id, provider, date, metric, value, unit, source) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", vmet)
+        hub.executemany("INSERT OR REPLACE INTO daily_overrides (campaign_id, date, metric, value) VALUES (?, ?, ?, ?)", ovr)
+        ya.executemany("INSERT INTO yandex_daily_metrics (campaign_id, report_date, visits, visitors, bounce_rate, "
+                       "page_depth, avg_time_sec) VALUES (?, ?, ?, ?, ?, ?, ?)", ymet)
+        counts.update(campaigns=campaigns, raw_system_daily=len(rsd), yandex_daily_metrics=len(ymet),
+                      verifier_daily_metric=len(vmet), daily_overrides=len(ovr))
+
+        # --- брони и маржа ---
+        n_agencies = max(3, campaigns // 20)
+        hub.executemany("INSERT INTO agencies (id, name) VALUES (?, ?)",
+                        [(a + 1, f"Агентство {a}") for a in range(n_agencies)])
+        hub.executemany("INSERT INTO clients (id, name, industry) VALUES (?, ?, ?)",
+                        [(c + 1, f"Клиент {c}", ("FMCG", "Банки", "Авто", "Ритейл")[c % 4]) for c in range(campaigns // 5 + 1)])
+        bookings, mstats, msnaps = [], [], []
+        snap_days = [today.replace(day=d) for d in range(1, today.day + 1)][-days:]
+        for n, cid in enumerate(cids):
+            for k in range(1 + n % 2):
+                bid = len(bookings) + 1
+                model = ("CPM", "CPM", "CPC", "CPV")[(n + k) % 4]
+                price = rnd.uniform(150, 450) if model == "CPM" else rnd.uniform(10, 60)
+                inv = rnd.randint(100, 5000) * 1000
+                budget = inv / 1000 * price if model == "CPM" else inv * price / 100
+                start = day_list[0] + timedelta(days=rnd.randrange(max(days // 2, 1)))
+                bookings.append((
+                    bid, f"Бронь {n}-{k} · бренд {n % 37}", cid, n % (campaigns // 5 + 1) + 1, n % n_agencies + 1,
+                    f"Бренд {n % 37}", ("Баннер", "Видео", "Нативка")[n % 3], model, model.lower(), "active",
+                    start.isoformat(), (start + timedelta(days=30)).isoformat(), round(budget, 2),
+                    round(price, 2), inv, round(rnd.uniform(0, 15), 2), f"Менеджер {n % 9}",
+                    f"Бренд {n % 37}", f"Агентство {n % n_agencies}", today.strftime("%m.%Y"),
+                ))
+                if model in ("CPM", "CPC"):
+                    cats = price * rnd.uniform(0.4, 0.9)
+                    mstats.append((bid, cid, month_key, model.lower(), round(price, 2), round(cats, 2),
+                                   round(cats / price * 100, 2), now))
+                    for sd in snap_days:
+                        c2 = cats * rnd.uniform(0.95, 1.05)
+                        msnaps.append((bid, cid, month_key, sd.isoformat(), model.lower(), round(price, 2),
+                                       round(c2, 2), round(c2 / price * 100, 2), now))
+        hub.executemany(
+            "INSERT INTO bookings (id, name, campaign_id, client_id, agency_id, brand, format, buying_model, payout_model, "
+            "status, start_date, end_date, budget_client_net, client_price, inventory, vz_percent, sales_manager, "
+            "client_brand, agency_name, month_str) VALUES (" + ", ".join("?" * 20) + ")", bookings)
+        hub.executemany("INSERT INTO margin_stats (booking_id, campaign_id, month, metric_type, client_price, "
+                        "cats_avg_price, purchase_percent, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", mstats)
+        hub.executemany("INSERT INTO margin_snapshots (booking_id, campaign_id, month, snapshot_date, metric_type, "
+                        "client_price, cats_avg_price, purchase_percent, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        msnaps)
+        counts.update(bookings=len(bookings), margin_stats=len(mstats), margin_snapshots=len(msnaps))
+
+        # --- группы ---
+        groups, members, pos = [], [], 0
+        while pos < len(cids):
+            size = rnd.randint(5, 12)
+            gid = len(groups) + 1
+            groups.append((gid, f"Группа {gid}"))
+            members.extend((gid, cid, k) for k, cid in enumerate(cids[pos:pos + size]))
+            pos += size
+        hub.executemany("INSERT INTO campaign_groups (id, name) VALUES (?, ?)", groups)
+        hub.executemany("INSERT INTO campaign_group_members (group_id, campaign_id, order_num) VALUES (?, ?, ?)", members)
+        counts.update(campaign_groups=len(groups))
+
+        # --- виджет ---
+        hub.execute("INSERT INTO publishers (id, name, user_id, is_active, created_at, updated_at) "
+                    "VALUES (1, 'Издатель', 2, 1, ?, ?)", (now, now))
+        hub.executemany("INSERT INTO publisher_sites (id, publisher_id, name, domain, public_token, is_active, created_at) "
+                        "VALUES (?, 1, ?, ?, ?, 1, ?)",
+                        [(s + 1, f"Сайт {s}", f"site{s}.example", f"bench-site-{s}", now) for s in range(3)])
+        hub.executemany("INSERT INTO widget_videos (id, title, src_type, src_url, is_active, created_at) "
+                        "VALUES (?, ?, 'mp4', ?, 1, ?)",
+                        [(v + 1, f"Видео {v}", f"https://cdn.example/v{v}.mp4", now) for v in range(5)])
+        hub.executemany("INSERT INTO widget_placements (id, site_id, external_article_id, page_url_pattern, video_id, "
+                        "status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'active', ?, ?)",
+                        [(p + 1, p % 3 + 1, f"a{p}", f"/news/{p}/", p % 5 + 1, now, now) for p in range(30)])
+        sessions, events = [], []
+        for s in range(campaigns * 5):
+            sessions.append((s + 1, f"bench-sess-{s}", s % 30 + 1, 1, (s % 30) % 3 + 1, f"https://site.example/news/{s % 30}/",
+                             f"a{s % 30}", "127.0.0.1", "bench", now))
+            for k in range(rnd.randint(1, len(EVENT_TYPES))):
+                events.append((s + 1, EVENT_TYPES[k], now, k * 5.0, now))
+        hub.executemany("INSERT INTO widget_sessions (id, session_token, placement_id, publisher_id, site_id, page_url, "
+                        "article_id, client_ip, user_agent, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", sessions)
+        hub.executemany("INSERT INTO widget_events (session_id, event_type, event_ts, video_time, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)", events)
+        counts.update(widget_sessions=len(sessions), widget_events=len(events))
+
+    hub.close()
+    ya.close()
+    (out / "config.yaml").write_text(yaml.safe_dump({"system": {"auth": {"type": "none"}}}), encoding="utf-8")
+    return counts
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Synthetic campaign_hub dataset (DBs + data/ + config.yaml)")
+    ap.add_argument("out", help="Каталог для набора данных")
+    ap.add_argument("--campaigns", type=int, default=200)
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--schema-from", default=str(ROOT_DIR / "campaign_hub.db"), help="БД-образец схемы")
+    ap.add_argument("--yandex-schema-from", default=str(ROOT_DIR / "yandex_metrics.db"))
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    counts = generate(Path(args.out), args.campaigns, args.days, args.seed,
+                      Path(args.schema_from), Path(args.yandex_schema_from))
+    print(json.dumps(counts, ensure_ascii=False))
+    print(f"generated in {time.perf_counter() - t0:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
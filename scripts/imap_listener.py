@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+imap_listener.py
+----------------
+Долгоживущий режим импорта: держит IMAP IDLE на папках, куда приходят
+отчёты Яндекс.Метрики и верификаторов, и запускает импорт папки, как только
+в ней появилось письмо — без кнопки «импорт» и без cron.
+
+- папки: ящики из campaign_yandex + mailbox активных биндингов verifier
+  (или ``imap_listener.folders`` / ``--folders``); новые папки — после
+  перезапуска, новые привязки в уже слушаемых папках подхватываются сразу;
+- импорт инкрементальный (контрольные точки UID), поэтому событие стоит
+  ровно столько, сколько новых писем;
+- после импорта версии затронутых кампаний растут (app/services/ingest_events.py,
+  одна БД на все источники: $CAMPAIGN_DB или campaign_hub.db);
+- обрыв соединения — переподключение с экспоненциальной паузой; NOOP раз в
+  ``noop_sec`` (и вместо IDLE, если сервер его не умеет).
+
+config.yaml::
+
+    imap_listener:
+      folders: [INBOX]      # по умолчанию — из привязок
+      idle_sec: 300
+      noop_sec: 60
+      debounce_sec: 2
+
+Проверка на локальной заглушке IMAP: отдельный конфиг с ``imap.host:
+127.0.0.1``, ``imap.ssl: false`` и ``--config`` (или INLAB_CONFIG).
+
+    python scripts/imap_listener.py [--folders INBOX] [--config config.yaml]
+"""
+import argparse
+import logging
+import os
+import signal
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import yaml
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+for p in (str(SCRIPTS_DIR), str(ROOT_DIR)):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+import verifier_import  # noqa: E402
+import yandex_import  # noqa: E402
+from app.services import ingest_events, metrics, yandex_bindings  # noqa: E402
+from app.services.imap_idle import FolderWatcher  # noqa: E402
+from app.services.imap_pool import ImportStats  # noqa: E402
+from app.services.imap_utils import IMAPCompatClient  # noqa: E402
+
+log = logging.getLogger("app.imap_listener")
+
+
+def yandex_folders() -> set:
+    return {b["mailbox"] for b in yandex_bindings.list_enabled()}
+
+
+def verifier_folders(db_path: str) -> set:
+    conn = sqlite3.connect(db_path)
+    try:
+        verifier_import.ensure_schema(conn)
+        rows = conn.execute(
+            """
+            SELECT COALESCE(NULLIF(mailbox,''),'INBOX') FROM verifier_campaigns WHERE active=1
+            UNION
+            SELECT COALESCE(NULLIF(mailbox,''),'INBOX') FROM verifier_group_bindings WHERE active=1
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+    return {r[0] for r in rows}
+
+
+class Ingestor:
+    """Обработчик события папки: импорт затронутыми импортёрами + bump версий кампаний."""
+
+    def __init__(self, verifier_db: str):
+        self.verifier_db = verifier_db
+        # один импорт каждого вида за раз: папки делят БД и пул соединений
+        self._locks = {"yandex": threading.Lock(), "verifier": threading.Lock()}
+
+    def __call__(self, folder: str, reason: str) -> None:
+        touched = set()
+        if folder in yandex_folders():
+            with self._locks["yandex"], metrics.job("yandex"):
+                stats = yandex_import.run_import(mailboxes=[folder])
+            ingest_events.bump(stats.campaigns, "yandex")
+            touched |= stats.campaigns
+        if folder in verifier_folders(self.verifier_db):
+            stats = ImportStats("verifier")
+            with self._locks["verifier"], metrics.job("verifier") as run:
+                if verifier_import.run_import(["--db", self.verifier_db, "--folders", folder], stats=stats):
+                    run.outcome = "error"
+            ingest_events.bump(stats.campaigns, "verifier")
+            touched |= stats.campaigns
+        log.info("imap listener %s (%s): campaigns updated %s", folder, reason, sorted(touched) or "-")
+        metrics.write_textfile("imap_listener")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="IMAP IDLE listener: import reports as soon as they arrive")
+    ap.add_argument("--config", default=os.getenv("INLAB_CONFIG", str(ROOT_DIR / "config.yaml")))
+    ap.add_argument("--db", default=verifier_import.DEFAULT_DB, help="verifier database (campaign_hub.db)")
+    ap.add_argument("--folders", default="", help="Comma-separated folders (default: from bindings)")
+    args = ap.parse_args()
+
+    # импортёры читают тот же файл
+    os.environ["INLAB_CONFIG"] = args.config
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    imap_cfg = cfg.get("imap") or {}
+    lcfg = cfg.get("imap_listener") or {}
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    metrics.TEXTFILE_DIR = ROOT_DIR / "logs" / "metrics"
+    metrics.restore_textfile("imap_listener")
+
+    if args.folders.strip():
+        folders = {f.strip() for f in args.folders.split(",") if f.strip()}
+    elif lcfg.get("folders"):
+        folders = set(lcfg["folders"])
+    else:
+        folders = yandex_folders() | verifier_folders(args.db)
+    if not folders:
+        print("[ERROR] nothing to watch: no bindings and no imap_listener.folders", file=sys.stderr)
+        return 2
+
+    use_ssl = bool(imap_cfg.get("ssl", True))
+
+    def connect() -> IMAPCompatClient:
+        client = IMAPCompatClient(
+            imap_cfg.get("host", "imap.yandex.com"),
+            int(imap_cfg.get("port") or (993 if use_ssl else 143)),
+            ssl=use_ssl,
+        )
+        client.login(imap_cfg.get("user", ""), imap_cfg.get("password", ""), imap_cfg.get("two_factor"))
+        return client
+
+    ingest = Ingestor(args.db)
+    watchers = [
+        FolderWatcher(
+            folder, connect, ingest,
+            idle_sec=float(lcfg.get("idle_sec", 300)),
+            noop_sec=float(lcfg.get("noop_sec", 60)),
+            debounce_sec=float(lcfg.get("debounce_sec", 2)),
+        )
+        for folder in sorted(folders)
+    ]
+    print(f"[INFO] watching {len(watchers)} folders on {imap_cfg.get('host')}: {', '.join(sorted(folders))}")
+
+    done = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: done.set())
+    for w in watchers:
+        w.start()
+    try:
+        while not done.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for w in watchers:
+            w.stop()
+        for w in watchers:
+            w.join(timeout=10)
+        metrics.write_textfile("imap_listener")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,17 @@
 # Usage:
 #   python scripts/import_bookings_excel.py "/path/to/Total Direct'25 (1).xlsx" --sheet "Свод" --db campaign_hub.db
 
-import argparse, json, sqlite3
+import argparse, json, sqlite3, sys
 from datetime import datetime
+from pathlib import Path
 import pandas as pd
 
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.services.ru_locale import to_date_iso, to_float  # noqa: E402
+
 MAP = {
     'Месяц размещения': 'month_str',
     'ID РК в системе': 'campaign_id',
@@ -57,28 +64,6 @@ def get_or_create(conn, table, name):
     cur = conn.execute(f"INSERT INTO {table}(name) VALUES (?)", (name,))
     return cur.lastrowid
 
-def as_date(x):
-    if pd.isna(x): return None
-    try:
-        if isinstance(x, (pd.Timestamp,)):
-            return x.strftime("%Y-%m-%d")
-        s = str(x)
-        dt = pd.to_datetime(s, errors='coerce', dayfirst=True)
-        if pd.isna(dt): return None
-        return dt.strftime("%Y-%m-%d")
-    except Exception:
-        return None
-
-def coerce_float(x):
-    if pd.isna(x): return None
-    try:
-        return float(x)
-    except Exception:
-        try:
-            return float(str(x).replace(" ", "").replace(",", "."))  # 10 000,50 -> 10000.50
-        except Exception:
-            return None
-
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("xlsx")
@@ -116,7 +101,7 @@ def main():
                 continue
             v = row.get(src, None)
             if dst in ("start_date", "end_date", "plan_payment_date", "fact_payment_date"):
-                rec[dst] = as_date(v)
+                rec[dst] = to_date_iso(v)
             elif dst in ("campaign_id",):
                 try:
                     rec[dst] = int(v) if v is not None and not pd.isna(v) else None
@@ -124,7 +109,7 @@ def main():
                     rec[dst] = None
             elif isinstance(v, (int, float)) or (isinstance(v, str) and v.strip() != ""):
                 if dst.startswith(("budget","inventory","price")) or dst in ("vz_percent","refund_amount","cpm_cpc_to_platform"):
-                    rec[dst] = coerce_float(v)
+                    rec[dst] = to_float(v)  # «10 000,50» -> 10000.5
                 else:
                     rec[dst] = str(v).strip()
             else:
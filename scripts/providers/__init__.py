@@ -1,9 +1,4 @@
+from providers.base import PROVIDERS_FROM_EMAIL, REGISTRY, ProviderParser, get_parser, parse_report, register
+# импорт модулей регистрирует разборщики в REGISTRY
 from providers.adserving import parse_adserving_xlsx
 from providers.weborama import parse_weborama_xlsx
-
-PROVIDERS_FROM_EMAIL = {
-    "adserving": "report@serving-sys.ru",
-    "weborama": "no_reply@weborama.com.ru",
-    "adriver": "sanar@adriver.ru",
-    "targetads": "info@targetads.io",
-}
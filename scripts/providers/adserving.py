@@ -1,8 +1,7 @@
-
 from __future__ import annotations
-import io
-from typing import Dict, List, Tuple
-import pandas as pd
+from typing import Dict, List, Optional
+
+from providers.base import ProviderParser, col_sum, register
 
 EXPECTED = {
     "date": "Date",
@@ -22,79 +21,65 @@ EXPECTED = {
     "viewable_rate": "Viewable Impressions Rate (IAB)",
 }
 
-def _detect_header_row(df_raw: pd.DataFrame) -> int:
-    for i in range(min(len(df_raw), 30)):
-        row = df_raw.iloc[i].fillna('').astype(str).str.strip().str.lower().tolist()
-        if 'date' in row and ('impressions (net)' in row or 'impressions(net)' in row):
-            return i
-    return 10  # fallback
-
-def parse_adserving_xlsx(content: bytes) -> Dict[str, Dict[str, float]]:
-    """Parse XLSX bytes; return mapping date(YYYY-MM-DD) -> metrics dict.
-    Metrics: impressions, clicks, givt_impr, givt_rate_pct, sivt_impr, sivt_rate_pct,
-             unsafe_impr, unsafe_rate_pct, viewable_impr, viewable_rate_pct,
-             recordable_impr, recordable_rate_pct
-    All *_pct returned in percent units (e.g., 0.07 means 0.07%).
-    """
-    xls = pd.ExcelFile(io.BytesIO(content))
-    sheet = xls.sheet_names[0]
-    raw = pd.read_excel(xls, sheet_name=sheet, header=None)
-    hdr = _detect_header_row(raw)
-    df = pd.read_excel(xls, sheet_name=sheet, header=hdr)
+# суммируемые колонки; проценты пересчитываются из сумм, колонки *_rate не читаются
+SUM_COLS = ["impr_net", "clk_net", "impr_givt", "impr_sivt", "unsafe_impr",
+            "recordable_impr", "viewable_impr"]
 
-    # keep only expected columns if present
-    keep = [c for c in EXPECTED.values() if c in df.columns]
-    df = df[keep].copy()
 
-    # normalize date
-    df[EXPECTED["date"]] = pd.to_datetime(df[EXPECTED["date"]], errors="coerce").dt.tz_localize(None)
-    df = df.dropna(subset=[EXPECTED["date"]])
-    df["date"] = df[EXPECTED["date"]].dt.date.astype(str)
+def pct(numer, denom):
+    return float(numer * 100.0 / denom) if denom and denom > 0 else None
 
-    # numeric conversions
-    def _to_float(s):
-        return pd.to_numeric(s, errors="coerce")
 
-    for key, col in EXPECTED.items():
-        if col in df.columns and key != "date":
-            df[col] = _to_float(df[col])
+@register
+class AdservingParser(ProviderParser):
+    """Заголовок — строка с 'Date' и 'Impressions (Net)' в первых 30 строках листа."""
 
-    # aggregate by date (sum counts)
-    agg_map = {}
-    # sums
-    sum_cols = ["impr_net","clk_net","impr_givt","impr_sivt","unsafe_impr",
-                "recordable_impr","viewable_impr"]
-    # averages by recomputation from sums (preferred)
-    out = {}
-    for date, g in df.groupby("date"):
-        sums = {}
-        for k in sum_cols:
-            col = EXPECTED.get(k)
-            sums[k] = float(g[col].sum()) if col in g.columns else 0.0
+    name = "adserving"
+    columns = {EXPECTED[k]: k for k in ["date"] + SUM_COLS}
+    required = ("Date", "Impressions (Net)")
 
-        # derive percent rates from sums if possible
-        def pct(numer, denom):
-            return float(numer * 100.0 / denom) if denom and denom > 0 else None
+    def is_header(self, row) -> bool:
+        cells = {str(v).strip().lower() for v in row if v is not None}
+        return "date" in cells and ("impressions (net)" in cells or "impressions(net)" in cells)
 
-        impr = sums.get("impr_net", 0.0)
-        viewable_impr = sums.get("viewable_impr", 0.0)
-        recordable_impr = sums.get("recordable_impr", 0.0)
-        givt_impr = sums.get("impr_givt", 0.0)
-        sivt_impr = sums.get("impr_sivt", 0.0)
-        unsafe_impr = sums.get("unsafe_impr", 0.0)
+    def project(self, header):
+        cols = super().project(header)
+        # старые выгрузки пишут 'Impressions(Net)' без пробела
+        if "impr_net" not in dict(cols):
+            for i, v in enumerate(header):
+                if v is not None and str(v).strip().lower() == "impressions(net)":
+                    cols.append(("impr_net", i))
+        return cols
 
-        out[date] = {
+    def finish(self, rows: List[Dict[str, Optional[float]]], present: List[str]) -> Dict[str, Optional[float]]:
+        sums = {k: col_sum(rows, k) if k in present else 0.0 for k in SUM_COLS}
+        impr = sums["impr_net"]
+        viewable_impr = sums["viewable_impr"]
+        recordable_impr = sums["recordable_impr"]
+        givt_impr = sums["impr_givt"]
+        sivt_impr = sums["impr_sivt"]
+        unsafe_impr = sums["unsafe_impr"]
+        return {
             "impressions": impr,
-            "clicks": sums.get("clk_net", 0.0),
+            "clicks": sums["clk_net"],
             "givt_impr": givt_impr,
             "givt_rate_pct": pct(givt_impr, impr),
             "sivt_impr": sivt_impr,
             "sivt_rate_pct": pct(sivt_impr, impr),
-            "unsafe_impr": unsafe_impr if "unsafe_impr" in sums else None,
-            "unsafe_rate_pct": pct(unsafe_impr, impr) if "unsafe_impr" in sums else None,
-            "viewable_impr": viewable_impr if "viewable_impr" in sums else None,
-            "viewable_rate_pct": pct(viewable_impr, impr) if "viewable_impr" in sums else None,
-            "recordable_impr": recordable_impr if "recordable_impr" in sums else None,
-            "recordable_rate_pct": pct(recordable_impr, impr) if "recordable_impr" in sums else None,
+            "unsafe_impr": unsafe_impr,
+            "unsafe_rate_pct": pct(unsafe_impr, impr),
+            "viewable_impr": viewable_impr,
+            "viewable_rate_pct": pct(viewable_impr, impr),
+            "recordable_impr": recordable_impr,
+            "recordable_rate_pct": pct(recordable_impr, impr),
         }
-    return out
+
+
+def parse_adserving_xlsx(content: bytes) -> Dict[str, Dict[str, float]]:
+    """Parse XLSX bytes; return mapping date(YYYY-MM-DD) -> metrics dict.
+    Metrics: impressions, clicks, givt_impr, givt_rate_pct, sivt_impr, sivt_rate_pct,
+             unsafe_impr, unsafe_rate_pct, viewable_impr, viewable_rate_pct,
+             recordable_impr, recordable_rate_pct
+    All *_pct returned in percent units (e.g., 0.07 means 0.07%).
+    """
+    return AdservingParser().parse(content)
@@ -0,0 +1,179 @@
+"""
+Потоковый разбор отчётов верификаторов.
+
+Отчёт читается openpyxl в режиме ``read_only`` за один проход по строкам
+листа: поиск строки заголовка, выбор нужных колонок и разбор данных идут
+в одном цикле, без повторного чтения книги и без DataFrame на весь лист.
+
+Провайдер — подкласс ``ProviderParser`` с декоратором ``@register``:
+задаёт лист, признаки строки заголовка, колонки (заголовок -> ключ) и
+свёртку строк по дате. Реестр ключуется именами из ``PROVIDERS_FROM_EMAIL``.
+"""
+from __future__ import annotations
+
+import io
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from openpyxl import load_workbook
+
+PROVIDERS_FROM_EMAIL = {
+    "adserving": "report@serving-sys.ru",
+    "weborama": "no_reply@weborama.com.ru",
+    "adriver": "sanar@adriver.ru",
+    "targetads": "info@targetads.io",
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d.%m.%Y", "%d/%m/%Y", "%m/%d/%Y")
+
+Metrics = Dict[str, Dict[str, Optional[float]]]
+
+
+def to_date(v: Any) -> Optional[str]:
+    """Ячейка даты -> 'YYYY-MM-DD'; строки «Total» и пустые -> None."""
+    if isinstance(v, datetime):
+        return v.date().isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, str):
+        s = v.strip()
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(s, fmt).date().isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+def to_float(v: Any) -> Optional[float]:
+    if isinstance(v, bool) or v is None:
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    try:
+        return float(str(v).strip())
+    except ValueError:
+        return None
+
+
+def _norm(v: Any) -> str:
+    return str(v).strip().lower() if v is not None else ""
+
+
+class ProviderParser:
+    """
+    Базовый разборщик. Подклассу достаточно задать:
+
+    - ``name`` — ключ из PROVIDERS_FROM_EMAIL;
+    - ``sheets`` — предпочтительные листы (без регистра), иначе первый;
+    - ``columns`` — {заголовок колонки: ключ}; читаются только они;
+    - ``required`` — заголовки, по которым узнаётся строка заголовка;
+    - ``finish(by_date)`` — свёртка строк дня в метрики.
+    """
+
+    name: str = ""
+    sheets: Sequence[str] = ()
+    columns: Dict[str, str] = {}
+    required: Sequence[str] = ()
+    date_column: str = "Date"
+    header_scan_rows: int = 30
+
+    @property
+    def from_email(self) -> str:
+        return PROVIDERS_FROM_EMAIL[self.name]
+
+    def _sheet(self, wb):
+        want = [s.lower() for s in self.sheets]
+        for w in want:
+            for n in wb.sheetnames:
+                if n.strip().lower() == w:
+                    return wb[n]
+        return wb[wb.sheetnames[0]]
+
+    def is_header(self, row: Sequence[Any]) -> bool:
+        cells = {_norm(v) for v in row}
+        return all(_norm(r) in cells for r in self.required)
+
+    def project(self, header: Sequence[Any]) -> List[Tuple[str, int]]:
+        """Позиции нужных колонок: [(ключ, индекс)]; первая из одноимённых."""
+        pos: Dict[str, int] = {}
+        for i, v in enumerate(header):
+            key = self.columns.get(str(v).strip()) if v is not None else None
+            if key and key not in pos:
+                pos[key] = i
+        return list(pos.items())
+
+    def value(self, key: str, v: Any) -> Optional[float]:
+        return to_float(v)
+
+    def rows(self, content: bytes) -> Tuple[List[str], Iterable[Tuple[str, Dict[str, Optional[float]]]]]:
+        """(найденные ключи колонок, генератор (дата, {ключ: значение}))."""
+        wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        ws = self._sheet(wb)
+        # размеры листа в read_only берутся из <dimension>, а её часто пишут неверно
+        ws.reset_dimensions()
+        it = ws.iter_rows(values_only=True)
+        cols: List[Tuple[str, int]] = []
+        for n, row in enumerate(it):
+            if n >= self.header_scan_rows:
+                break
+            if row and self.is_header(row):
+                cols = self.project(row)
+                break
+        if not cols or "date" not in dict(cols):
+            wb.close()
+            raise ValueError(f"{self.name}: header row with {list(self.required)} not found")
+
+        def gen():
+            try:
+                for row in it:
+                    if not row:
+                        continue
+                    vals = {k: (row[i] if i < len(row) else None) for k, i in cols}
+                    d = to_date(vals.pop("date"))
+                    if d is None:
+                        continue
+                    yield d, {k: self.value(k, v) for k, v in vals.items()}
+            finally:
+                wb.close()
+
+        return [k for k, _ in cols], gen()
+
+    def parse(self, content: bytes) -> Metrics:
+        present, rows = self.rows(content)
+        by_date: Dict[str, List[Dict[str, Optional[float]]]] = {}
+        for d, vals in rows:
+            by_date.setdefault(d, []).append(vals)
+        return {d: self.finish(by_date[d], present) for d in sorted(by_date)}
+
+    def finish(self, rows: List[Dict[str, Optional[float]]], present: List[str]) -> Dict[str, Optional[float]]:
+        raise NotImplementedError
+
+
+def col_sum(rows: List[Dict[str, Optional[float]]], key: str) -> float:
+    return float(sum(r[key] for r in rows if r.get(key) is not None))
+
+
+def col_mean(rows: List[Dict[str, Optional[float]]], key: str) -> Optional[float]:
+    vals = [r[key] for r in rows if r.get(key) is not None]
+    return sum(vals) / len(vals) if vals else None
+
+
+REGISTRY: Dict[str, ProviderParser] = {}
+
+
+def register(cls: Type[ProviderParser]) -> Type[ProviderParser]:
+    if cls.name not in PROVIDERS_FROM_EMAIL:
+        raise ValueError(f"provider {cls.name!r} is not in PROVIDERS_FROM_EMAIL")
+    REGISTRY[cls.name] = cls()
+    return cls
+
+
+def get_parser(provider: str) -> Optional[ProviderParser]:
+    return REGISTRY.get(provider)
+
+
+def parse_report(provider: str, content: bytes) -> Metrics:
+    """Разобрать отчёт провайдера; для провайдера без разборщика — {}."""
+    parser = get_parser(provider)
+    return parser.parse(content) if parser is not None else {}
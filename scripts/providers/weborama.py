@@ -1,16 +1,10 @@
-
 from __future__ import annotations
-import io
-from typing import Dict, List, Tuple
-import pandas as pd
+from typing import Dict, List, Optional
+
+from providers.base import ProviderParser, col_mean, col_sum, register, to_float
+
+PCT_COLS = {"GIVT (%)": "givt_pct", "SIVT (%)": "sivt_pct", "Final percent": "ivt_total_pct"}
 
-def _find_sheet(xls: pd.ExcelFile) -> str:
-    names = xls.sheet_names
-    for want in ["Froud Total", "Fraud Total"]:
-        for n in names:
-            if n.strip().lower() == want.lower():
-                return n
-    return names[0]
 
 def _to_percent(v):
     # Input can be like 0.07 or "0,07%" (meaning 0.07%)
@@ -26,38 +20,30 @@ def _to_percent(v):
     except Exception:
         return None
 
-def parse_weborama_xlsx(content: bytes) -> Dict[str, Dict[str, float]]:
-    """Parse bytes of Weborama XLSX and return date->metrics.
-    Uses 'Froud Total' sheet.
-    Metrics: impressions (Imp WCM), givt_rate_pct, sivt_rate_pct, ivt_total_pct,
-             givt_impr, sivt_impr (derived from rates).
-    """
-    xls = pd.ExcelFile(io.BytesIO(content))
-    sheet = _find_sheet(xls)
-    df = pd.read_excel(xls, sheet_name=sheet)
 
-    # normalize date
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce").dt.tz_localize(None)
-    df = df.dropna(subset=["Date"])
-    df["date"] = df["Date"].dt.date.astype(str)
+@register
+class WeboramaParser(ProviderParser):
+    """Лист 'Froud Total' (опечатка в самих отчётах) или 'Fraud Total'; заголовок — первая строка."""
+
+    name = "weborama"
+    sheets = ("Froud Total", "Fraud Total")
+    columns = {"Date": "date", "Imp WCM": "impr", **PCT_COLS}
+    required = ("Date",)
+    header_scan_rows = 5
 
-    # numeric conversions
-    for c in ["Imp WCM", "GIVT (%)", "SIVT (%)", "Final percent"]:
-        if c in df.columns:
-            if c == "Imp WCM":
-                df[c] = pd.to_numeric(df[c], errors="coerce")
-            else:
-                df[c] = df[c].map(_to_percent)
+    def value(self, key: str, v) -> Optional[float]:
+        return to_float(v) if key == "impr" else _to_percent(v)
+
+    def finish(self, rows: List[Dict[str, Optional[float]]], present: List[str]) -> Dict[str, Optional[float]]:
+        impr = col_sum(rows, "impr") if "impr" in present else 0.0
+        givt_pct = col_mean(rows, "givt_pct")
+        sivt_pct = col_mean(rows, "sivt_pct")
+        ivt_total_pct = col_mean(rows, "ivt_total_pct")
 
-    out = {}
-    for date, g in df.groupby("date"):
-        impr = float(g["Imp WCM"].sum()) if "Imp WCM" in g.columns else 0.0
-        givt_pct = g["GIVT (%)"].mean() if "GIVT (%)" in g.columns else None
-        sivt_pct = g["SIVT (%)"].mean() if "SIVT (%)" in g.columns else None
-        ivt_total_pct = g["Final percent"].mean() if "Final percent" in g.columns else None
         def cnt(pct):
             return float(round(impr * (pct or 0.0) / 100.0)) if impr else 0.0
-        out[date] = {
+
+        return {
             "impressions": impr,
             "givt_rate_pct": givt_pct,
             "sivt_rate_pct": sivt_pct,
@@ -69,4 +55,12 @@ def parse_weborama_xlsx(content: bytes) -> Dict[str, Dict[str, float]]:
             "unsafe_impr": None,
             "viewable_impr": None
         }
-    return out
+
+
+def parse_weborama_xlsx(content: bytes) -> Dict[str, Dict[str, float]]:
+    """Parse bytes of Weborama XLSX and return date->metrics.
+    Uses 'Froud Total' sheet.
+    Metrics: impressions (Imp WCM), givt_rate_pct, sivt_rate_pct, ivt_total_pct,
+             givt_impr, sivt_impr (derived from rates).
+    """
+    return WeboramaParser().parse(content)
@@ -4,23 +4,30 @@ import argparse
 import sys
 from pathlib import Path
 
-# видеть пакет providers рядом со скриптом
+# видеть пакет providers рядом со скриптом и пакет app (метрики) из корня
 sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(1, str(Path(__file__).resolve().parent.parent))
 
 import email
+import hashlib
 import imaplib
 import os
 import re
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from email.header import decode_header, make_header
 from typing import Dict, Iterable, List, Optional, Tuple
 
-import pandas as pd
-
-from providers import parse_adserving_xlsx, parse_weborama_xlsx, PROVIDERS_FROM_EMAIL
+from providers import PROVIDERS_FROM_EMAIL, parse_report
+from app.services import imap_sync, metrics
+from app.services.imap_pool import DEFAULT_POOL_SIZE, IMAPPool, ImportStats, ParsePipeline
+from app.services.imap_utils import chunked
 
 DEFAULT_DB = "campaign_hub.db"
+FETCH_BATCH = 10   # писем RFC822 в одном UID FETCH
 
 DDL = [
     # биндинги на отдельные кампании (добавлены новые колонки под режимы матчинга)
@@ -50,6 +57,9 @@ DDL = [
         updated_at        TEXT NOT NULL DEFAULT (datetime('now')),
         UNIQUE(group_id, provider)
     );""",
+    # импортёр выбирает активные биндинги одним запросом
+    "CREATE INDEX IF NOT EXISTS idx_verifier_campaigns_active ON verifier_campaigns(active, campaign_id)",
+    "CREATE INDEX IF NOT EXISTS idx_verifier_group_bindings_active ON verifier_group_bindings(active, group_id)",
     # журнал импортированных файлов
     """CREATE TABLE IF NOT EXISTS verifier_import_files (
         id              INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -143,6 +153,86 @@ def fetch_attachments_from_message(m, allowed_ext=(".xlsx",)):
             attachments.append((fname_decoded, payload))
     return attachments
 
+@dataclass
+class CachedMessage:
+    subject: str
+    from_addr: str
+    message_id: str
+    attachments: List[Tuple[str, str, bytes]]     # (имя, sha256, содержимое)
+
+
+class RunCache:
+    """
+    Кеш одного запуска: несколько биндингов одной папки часто ловят одни и
+    те же письма (один отправитель, общая тема).
+
+    - письма — по (папка, UID): RFC822 качается и разбирается на вложения
+      один раз, остальные проходы берут готовое; если письмо сейчас качает
+      соседний поток, проход ждёт его, а не качает второй раз;
+    - содержимое вложений — по sha256 (одинаковый файл в разных письмах
+      хранится один раз);
+    - результат разбора XLSX — по (провайдер, sha256); разбор идёт в
+      единственном потоке pipeline, поэтому словарь без блокировки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._messages: Dict[Tuple[str, int], Optional[CachedMessage]] = {}
+        self._pending: Dict[Tuple[str, int], threading.Event] = {}
+        self._blobs: Dict[str, bytes] = {}
+        self.parsed: Dict[Tuple[str, str], Dict[str, Dict[str, float]]] = {}
+
+    def claim(self, folder: str, uids: Iterable[int]) -> Tuple[List[int], List[int]]:
+        """Разделить UID на «качаю я» и «уже скачаны или качаются другим потоком»."""
+        mine, others = [], []
+        with self._lock:
+            for uid in uids:
+                key = (folder, uid)
+                if key in self._messages or key in self._pending:
+                    others.append(uid)
+                else:
+                    self._pending[key] = threading.Event()
+                    mine.append(uid)
+        return mine, others
+
+    def put(self, folder: str, uid: int, raw: Optional[bytes]) -> None:
+        msg = None
+        if raw:
+            m = email.message_from_bytes(raw)
+            atts = []
+            for name, payload in fetch_attachments_from_message(m, allowed_ext=(".xlsx",)):
+                sha = hashlib.sha256(payload).hexdigest()
+                with self._lock:
+                    payload = self._blobs.setdefault(sha, payload)
+                atts.append((name, sha, payload))
+            msg = CachedMessage(
+                subject=decode_subj(m.get('Subject', '')),
+                from_addr=email.utils.parseaddr(m.get('From', ''))[1].lower(),
+                message_id=m.get('Message-Id', ''),
+                attachments=atts,
+            )
+        with self._lock:
+            self._messages[(folder, uid)] = msg
+            ev = self._pending.pop((folder, uid), None)
+        if ev is not None:
+            ev.set()
+
+    def release(self, folder: str, uids: Iterable[int]) -> None:
+        """Снять незавершённые заявки (FETCH упал): ждущие проходы получат None."""
+        for uid in uids:
+            with self._lock:
+                ev = self._pending.pop((folder, uid), None)
+            if ev is not None:
+                ev.set()
+
+    def get(self, folder: str, uid: int) -> Optional[CachedMessage]:
+        with self._lock:
+            ev = self._pending.get((folder, uid))
+        if ev is not None:
+            ev.wait()
+        with self._lock:
+            return self._messages.get((folder, uid))
+
 def match_text(text: str, pattern: str, mode: str) -> bool:
     t = (text or "").strip()
     p = (pattern or "").strip()
@@ -164,61 +254,135 @@ def match_text(text: str, pattern: str, mode: str) -> bool:
             return False
     return False
 
-def upsert_metrics(conn: sqlite3.Connection, campaign_id: int, provider: str, date: str, metrics: Dict[str, Optional[float]]):
+UPSERT_TAIL = """
+ON CONFLICT(campaign_id, provider, date, metric)
+DO UPDATE SET
+  value  = excluded.value,
+  unit   = excluded.unit,
+  source = excluded.source
+"""
+
+def metric_rows(metrics_by_date: Dict[str, Dict[str, Optional[float]]]) -> List[Tuple[str, str, float, str]]:
+    """{date: {metric: value}} -> [(date, metric, value, unit)] без пустых значений."""
+    return [
+        (d, k, float(v), "percent" if k.endswith("_pct") else "count")
+        for d, m in metrics_by_date.items()
+        for k, v in m.items()
+        if v is not None
+    ]
+
+def write_campaign_rows(conn: sqlite3.Connection, campaign_ids: List[int], provider: str,
+                        rows: List[Tuple[str, str, float, str]], msg_id: str, subject: str, att_name: str) -> int:
+    """Метрики и журнал файла для явного списка кампаний: executemany, без commit."""
     cur = conn.cursor()
-    for k, v in metrics.items():
-        if v is None:
-            continue
-        unit = "percent" if k.endswith("_pct") else "count"
-        cur.execute(
-            """
-            INSERT INTO verifier_daily_metric
-              (campaign_id, provider, date, metric, value, unit, source)
-            VALUES
-              (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(campaign_id, provider, date, metric)
-            DO UPDATE SET
-              value  = excluded.value,
-              unit   = excluded.unit,
-              source = excluded.source
-            """,
-            (campaign_id, provider, date, k, float(v), unit, provider)
-        )
-    conn.commit()
-
-def record_import_file(conn: sqlite3.Connection, campaign_id: int, provider: str, msg_id: str, subject: str, att_name: str, report_date: str):
+    cur.executemany(
+        """
+        INSERT INTO verifier_daily_metric
+          (campaign_id, provider, date, metric, value, unit, source)
+        VALUES
+          (?, ?, ?, ?, ?, ?, ?)
+        """ + UPSERT_TAIL,
+        [(cid, provider, d, k, v, unit, provider) for cid in campaign_ids for d, k, v, unit in rows],
+    )
+    written = cur.rowcount
+    dates = sorted({r[0] for r in rows})
+    cur.executemany(
+        """INSERT OR IGNORE INTO verifier_import_files(campaign_id, provider, message_id, subject, attachment_name, report_date, rows_parsed)
+           VALUES (?, ?, ?, ?, ?, ?, 1)""",
+        [(cid, provider, msg_id, subject, att_name, d) for cid in campaign_ids for d in dates],
+    )
+    return written
+
+def write_group_rows(conn: sqlite3.Connection, group_id: int, provider: str,
+                     rows: List[Tuple[str, str, float, str]], msg_id: str, subject: str, att_name: str) -> int:
+    """
+    Раздача отчёта всем участникам группы одним INSERT ... SELECT по
+    campaign_group_members: строки отчёта кладутся во временную таблицу один
+    раз, размножение по кампаниям делает SQLite.
+    """
     cur = conn.cursor()
-    try:
-        cur.execute(
-            """INSERT OR IGNORE INTO verifier_import_files(campaign_id, provider, message_id, subject, attachment_name, report_date, rows_parsed)
-               VALUES (?, ?, ?, ?, ?, ?, 1)""",
-            (campaign_id, provider, msg_id, subject, att_name, report_date)
-        )
-        conn.commit()
-    except Exception as e:
-        # не фейлим импорт, просто журнал не записан
-        pass
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _verifier_stage (date TEXT, metric TEXT, value REAL, unit TEXT)")
+    cur.execute("DELETE FROM _verifier_stage")
+    cur.executemany("INSERT INTO _verifier_stage (date, metric, value, unit) VALUES (?, ?, ?, ?)", rows)
+    cur.execute(
+        """
+        INSERT INTO verifier_daily_metric
+          (campaign_id, provider, date, metric, value, unit, source)
+        SELECT m.campaign_id, ?, s.date, s.metric, s.value, s.unit, ?
+        FROM _verifier_stage s
+        JOIN campaign_group_members m ON m.group_id = ?
+        WHERE 1
+        """ + UPSERT_TAIL,
+        (provider, provider, group_id),
+    )
+    written = cur.rowcount
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO verifier_import_files
+          (campaign_id, provider, message_id, subject, attachment_name, report_date, rows_parsed)
+        SELECT m.campaign_id, ?, ?, ?, ?, d.date, 1
+        FROM (SELECT DISTINCT date FROM _verifier_stage) d
+        JOIN campaign_group_members m ON m.group_id = ?
+        """,
+        (provider, msg_id, subject, att_name, group_id),
+    )
+    cur.execute("DELETE FROM _verifier_stage")
+    return written
 
 def parse_and_store(provider: str, content: bytes) -> Dict[str, Dict[str, float]]:
-    if provider == "adserving":
-        return parse_adserving_xlsx(content)
-    elif provider == "weborama":
-        return parse_weborama_xlsx(content)
-    # остальные добавим позже
-    return {}
+    # разборщики провайдеров — в реестре providers; adriver/targetads добавим позже
+    return parse_report(provider, content)
+
+def ingest(conn: sqlite3.Connection, provider: str, payload: bytes, sha: str, target: Tuple[str, int, List[int]],
+           msg_id: str, subject: str, att_name: str, stats: ImportStats, cache: RunCache) -> None:
+    """
+    Задание потока-разборщика: XLSX -> дневные метрики кампании или группы.
+    Всё по одному вложению — одна транзакция (один fsync), а не commit на
+    каждую пару (кампания, дата). Один и тот же файл разбирается один раз
+    за запуск, сколько бы биндингов его ни поймало.
+    """
+    key = (provider, sha)
+    if key in cache.parsed:
+        stats.add("parse_hits")
+        metrics_by_date = cache.parsed[key]
+    else:
+        metrics_by_date = cache.parsed[key] = parse_and_store(provider, payload)
+        stats.add("parsed")
+    if not metrics_by_date:
+        return
+    rows = metric_rows(metrics_by_date)
+    kind, key, campaign_ids = target
+    with conn:
+        if kind == "group":
+            written = write_group_rows(conn, key, provider, rows, msg_id, subject, att_name)
+        else:
+            written = write_campaign_rows(conn, campaign_ids, provider, rows, msg_id, subject, att_name)
+    stats.add("selected")
+    stats.add("imported", len(metrics_by_date) * len(campaign_ids))
+    stats.add("rows", written)
+    metrics.ROWS_INGESTED.labels("verifier").inc(written)
+    stats.touched(campaign_ids)
+
+def save_checkpoint(conn: sqlite3.Connection, sync: imap_sync.SyncPlan, last_uid: int) -> None:
+    imap_sync.save(conn, sync, last_uid)
 
 def get_group_members(conn: sqlite3.Connection, group_id: int) -> List[int]:
     cur = conn.cursor()
     rows = cur.execute("SELECT campaign_id FROM campaign_group_members WHERE group_id=?", (group_id,)).fetchall()
     return [int(r[0]) for r in rows]
 
-def main():
+def run_import(argv: Optional[List[str]] = None, stats: Optional[ImportStats] = None):
     ap = argparse.ArgumentParser(description="Import verifier reports from IMAP and store into campaign_hub.db")
     ap.add_argument("--db", default=DEFAULT_DB, help="SQLite database path (default: campaign_hub.db)")
     ap.add_argument("--campaigns", default="", help="Comma-separated campaign IDs to import (default: all active campaign bindings)")
     ap.add_argument("--groups", default="", help="Comma-separated group IDs to import (default: all active group bindings)")
     ap.add_argument("--since", default="", help="Since date (YYYY-MM-DD). Default: 1st day of current month (MSK).")
-    args = ap.parse_args()
+    ap.add_argument("--full", action="store_true", help="Ignore the UID checkpoint and rescan the date window")
+    ap.add_argument("--workers", type=int, default=0, help="Parallel IMAP connections (default: imap.pool_size or 4)")
+    ap.add_argument("--folders", default="", help="Comma-separated mailbox folders to import (default: all bound folders)")
+    args = ap.parse_args(argv)
+    # выборочный запуск не двигает контрольную точку: остальные привязки его не видели
+    partial = bool(args.campaigns.strip() or args.groups.strip() or args.since)
 
     db_path = args.db
     conn = sqlite3.connect(db_path)
@@ -229,14 +393,14 @@ def main():
     if args.campaigns.strip():
         ids = [int(x.strip()) for x in args.campaigns.split(",") if x.strip()]
         q = """
-            SELECT campaign_id, provider, verifier_name, subject_mode, COALESCE(filename_pattern,''), filename_mode, COALESCE(from_email,'')
+            SELECT campaign_id, provider, verifier_name, subject_mode, COALESCE(filename_pattern,''), filename_mode, COALESCE(from_email,''), COALESCE(NULLIF(mailbox,''),'INBOX')
             FROM verifier_campaigns
             WHERE active=1 AND campaign_id IN ({})
         """.format(",".join(["?"]*len(ids)))
         cur.execute(q, ids)
     else:
         cur.execute("""
-            SELECT campaign_id, provider, verifier_name, subject_mode, COALESCE(filename_pattern,''), filename_mode, COALESCE(from_email,'')
+            SELECT campaign_id, provider, verifier_name, subject_mode, COALESCE(filename_pattern,''), filename_mode, COALESCE(from_email,''), COALESCE(NULLIF(mailbox,''),'INBOX')
             FROM verifier_campaigns
             WHERE active=1
         """)
@@ -246,24 +410,25 @@ def main():
     if args.groups.strip():
         gids = [int(x.strip()) for x in args.groups.split(",") if x.strip()]
         qg = """
-            SELECT id, group_id, provider, subject_pattern, subject_mode, COALESCE(filename_pattern,''), filename_mode, COALESCE(from_email,'')
+            SELECT id, group_id, provider, subject_pattern, subject_mode, COALESCE(filename_pattern,''), filename_mode, COALESCE(from_email,''), COALESCE(NULLIF(mailbox,''),'INBOX')
             FROM verifier_group_bindings
             WHERE active=1 AND group_id IN ({})
         """.format(",".join(["?"]*len(gids)))
         cur.execute(qg, gids)
     else:
         cur.execute("""
-            SELECT id, group_id, provider, subject_pattern, subject_mode, COALESCE(filename_pattern,''), filename_mode, COALESCE(from_email,'')
+            SELECT id, group_id, provider, subject_pattern, subject_mode, COALESCE(filename_pattern,''), filename_mode, COALESCE(from_email,''), COALESCE(NULLIF(mailbox,''),'INBOX')
             FROM verifier_group_bindings
             WHERE active=1
         """)
     group_bindings = cur.fetchall()
 
-    cfg = load_config("config.yaml")
+    cfg = load_config(os.getenv("INLAB_CONFIG", "config.yaml"))
     imap_host = cfg.get("imap", {}).get("host")
     imap_user = cfg.get("imap", {}).get("user")
     imap_pass = cfg.get("imap", {}).get("password")
     use_ssl = bool(cfg.get("imap", {}).get("ssl", True))
+    imap_port = int(cfg.get("imap", {}).get("port") or (993 if use_ssl else 143))
 
     if not imap_host or not imap_user or not imap_pass:
         print("[ERROR] IMAP credentials are missing in config.yaml under 'imap'", file=sys.stderr)
@@ -276,110 +441,166 @@ def main():
         since_dt = first_day_current_month_msk()
     since_str = to_imap_since(since_dt)
 
-    print(f"[INFO] Connecting IMAP {imap_host} as {imap_user}")
-    M = imaplib.IMAP4_SSL(imap_host) if use_ssl else imaplib.IMAP4(imap_host)
-    M.login(imap_user, imap_pass)
-
-    SELECTED = 0
-    IMPORTED = 0
-
-    try:
-        # helper to run a single search/import pass
-        def run_pass(scope: str,
-                     provider: str,
-                     subj_pat: str,
-                     subj_mode: str,
-                     fname_pat: str,
-                     fname_mode: str,
-                     from_email: str,
-                     apply_to_campaign_ids: List[int]):
-
-            nonlocal SELECTED, IMPORTED
-
-            from_addr = (from_email or PROVIDERS_FROM_EMAIL.get(provider))
-            if not from_addr:
-                print(f"[WARN] {scope}: provider {provider} has no from_email; skipped", file=sys.stderr)
-                return
-
-            mailbox = 'INBOX'
-            M.select(mailbox)
-
-            # Для перфоманса: если subj_mode != regex и subj_pat не пуст — ограничим IMAP по SUBJECT (contains)
-            if subj_mode.lower() != "regex" and subj_pat and subj_pat.strip():
-                typ, data = M.search(None, 'FROM', f'"{from_addr}"', 'SINCE', since_str, 'SUBJECT', f'"{subj_pat}"')
-            else:
-                typ, data = M.search(None, 'FROM', f'"{from_addr}"', 'SINCE', since_str)
-
-            if typ != 'OK':
-                print(f"[WARN] {scope}: IMAP search failed", file=sys.stderr)
+    # проходы: (scope, provider, subj_pat, subj_mode, fname_pat, fname_mode, from_email, target),
+    # target = ("campaign"|"group", id, campaign_ids)
+    passes_by_folder: Dict[str, list] = {}
+    # 1) покампанийные биндинги
+    for campaign_id, provider, subj_pat, subj_mode, fname_pat, fname_mode, from_email, mailbox in camp_bindings:
+        passes_by_folder.setdefault(mailbox, []).append(
+            (f"campaign:{campaign_id}", provider, subj_pat, subj_mode, fname_pat, fname_mode, from_email,
+             ("campaign", int(campaign_id), [int(campaign_id)]))
+        )
+    # 2) групповые биндинги
+    for _id, group_id, provider, subj_pat, subj_mode, fname_pat, fname_mode, from_email, mailbox in group_bindings:
+        members = get_group_members(conn, int(group_id))
+        if not members:
+            continue
+        passes_by_folder.setdefault(mailbox, []).append(
+            (f"group:{group_id}", provider, subj_pat, subj_mode, fname_pat, fname_mode, from_email,
+             ("group", int(group_id), members))
+        )
+    if args.folders.strip():
+        only = {f.strip() for f in args.folders.split(",") if f.strip()}
+        passes_by_folder = {f: p for f, p in passes_by_folder.items() if f in only}
+    n_passes = sum(len(v) for v in passes_by_folder.values())
+    workers = max(1, min(args.workers or int(cfg.get("imap", {}).get("pool_size") or DEFAULT_POOL_SIZE), n_passes or 1))
+
+    print(f"[INFO] Connecting IMAP {imap_host} as {imap_user}: {n_passes} bindings in {len(passes_by_folder)} folders, {workers} connections")
+    account = imap_sync.account_key(imap_user, imap_host)
+    stats = stats if stats is not None else ImportStats("verifier")
+    pool = IMAPPool(imap_host, imap_port, imap_user, imap_pass, ssl=use_ssl, size=workers)
+    pipeline = ParsePipeline(setup=lambda: sqlite3.connect(db_path), teardown=lambda c: c.close())
+    cache = RunCache()
+
+    def run_pass(folder: str,
+                 sync: imap_sync.SyncPlan,
+                 scope: str,
+                 provider: str,
+                 subj_pat: str,
+                 subj_mode: str,
+                 fname_pat: str,
+                 fname_mode: str,
+                 from_email: str,
+                 target: Tuple[str, int, List[int]]):
+        """Один биндинг: SEARCH + FETCH в сетевом потоке, разбор XLSX и запись — в pipeline."""
+        from_addr = (from_email or PROVIDERS_FROM_EMAIL.get(provider))
+        if not from_addr:
+            print(f"[WARN] {scope}: provider {provider} has no from_email; skipped", file=sys.stderr)
+            return
+
+        # Для перфоманса: если subj_mode != regex и subj_pat не пуст — ограничим IMAP по SUBJECT (contains)
+        criteria = ['FROM', f'"{from_addr}"']
+        if subj_mode.lower() != "regex" and subj_pat and subj_pat.strip():
+            criteria += ['SUBJECT', f'"{subj_pat}"']
+
+        with pool.connection() as client:
+            client.select_folder(folder, readonly=False)
+            try:
+                uids = sync.new_uids(client.uid_search(*sync.criteria(*criteria, since=since_str)))
+            except imaplib.IMAP4.error as e:
+                print(f"[WARN] {scope}: IMAP search failed: {e}", file=sys.stderr)
                 return
-
-            msg_ids = data[0].split()
-            for num in msg_ids:
-                typ, msg_data = M.fetch(num, '(RFC822)')
-                if typ != 'OK':
+            # все проходы папки видят один снимок: письма после SELECT плана — в следующий запуск
+            if sync.uidnext:
+                uids = [u for u in uids if u < sync.uidnext]
+
+            # качаем только письма, которых ещё не видел ни один проход этого запуска
+            mine, _ = cache.claim(folder, uids)
+            try:
+                for batch in chunked(mine, FETCH_BATCH):
+                    fetched = client.uid_fetch(batch, '(UID RFC822)')
+                    stats.fetched(len(fetched), sum(len(a.get('RFC822') or b'') for a in fetched.values()))
+                    for uid in batch:
+                        cache.put(folder, uid, (fetched.get(uid) or {}).get('RFC822'))
+            finally:
+                cache.release(folder, mine)
+        stats.add("cache_hits", len(uids) - len(mine))
+
+        for uid in sorted(uids):
+            msg = cache.get(folder, uid)
+            if msg is None:
+                continue
+            if msg.from_addr != from_addr.lower():
+                continue
+            # python-уровень: subject match по режиму
+            if not match_text(msg.subject, subj_pat, subj_mode):
+                continue
+            for att_name, sha, payload in msg.attachments:
+                # фильтрация по имени файла, если задана
+                if fname_pat and not match_text(att_name, fname_pat, fname_mode):
                     continue
-                msg = email.message_from_bytes(msg_data[0][1])
-                subj = decode_subj(msg.get('Subject', ''))
-                from_ = email.utils.parseaddr(msg.get('From', ''))[1].lower()
-                if from_ != from_addr.lower():
+                pipeline.submit(ingest, provider, payload, sha, target,
+                                msg.message_id, msg.subject, att_name, stats, cache, group=folder)
+
+    failed_folders = set()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imap") as ex:
+            futures = {}
+            for folder, passes in passes_by_folder.items():
+                try:
+                    with pool.connection() as client:
+                        info = client.select_folder(folder, readonly=True)
+                except Exception as e:
+                    print(f"[WARN] {folder}: SELECT failed: {e}", file=sys.stderr)
+                    failed_folders.add(folder)
                     continue
-                # python-уровень: subject match по режиму
-                if not match_text(subj, subj_pat, subj_mode):
+                sync = imap_sync.plan(
+                    conn, account, folder, "verifier", info,
+                    imap_sync.fingerprint([b for b in camp_bindings + group_bindings if b[-1] == folder]),
+                    full=args.full or partial,
+                )
+                print(f"[INFO] {folder}: {sync.reason}")
+                if sync.up_to_date:
+                    print(f"[INFO] {folder}: no new messages (UIDNEXT={sync.uidnext})")
                     continue
+                for p in passes:
+                    futures[ex.submit(run_pass, folder, sync, *p)] = (folder, sync, p[0])
+
+            done_syncs = {}
+            for fut in as_completed(futures):
+                folder, sync, scope = futures[fut]
+                try:
+                    fut.result()
+                    done_syncs[folder] = sync
+                except Exception as e:
+                    print(f"[WARN] {scope}: {e}", file=sys.stderr)
+                    failed_folders.add(folder)
+
+        # контрольная точка — только если все биндинги папки прошли; в очереди после их записи
+        if not partial:
+            for folder, sync in done_syncs.items():
+                if folder not in failed_folders:
+                    pipeline.submit(save_checkpoint, sync, sync.high_water(()), group=folder, only_if_ok=True)
+    finally:
+        # pool первым: close() пайплайна поднимает ошибку его setup()
+        pool.close()
+        pipeline.close()
+
+    print(f"[DONE] messages matched: {stats['selected']}, daily rows imported: {stats['imported']}")
+    print(f"[DONE] throughput: {stats.rates()}; parse busy {pipeline.busy_sec:.1f}s, IMAP logins {pool.logins}")
+    print(f"[DONE] cache: {stats['cache_hits']} message fetches saved, "
+          f"{stats['parsed']} attachments parsed, {stats['parse_hits']} parses reused")
+    print(f"[DONE] metric rows written: {stats['rows']} ({stats['rows'] / stats.elapsed():.0f} rows/s)")
+    if pipeline.errors:
+        print(f"[ERROR] {len(pipeline.errors)} attachments failed to import in "
+              f"{', '.join(sorted(pipeline.failed_groups))}; checkpoints not moved", file=sys.stderr)
+        failed_folders |= pipeline.failed_groups
+    return 1 if failed_folders else 0
 
-                atts = fetch_attachments_from_message(msg, allowed_ext=(".xlsx",))
-                if not atts:
-                    continue
 
-                for att_name, payload in atts:
-                    # фильтрация по имени файла, если задана
-                    if fname_pat and not match_text(att_name, fname_pat, fname_mode):
-                        continue
-
-                    metrics_by_date = parse_and_store(provider, payload)
-                    if not metrics_by_date:
-                        continue
-
-                    SELECTED += 1
-                    for d, m in metrics_by_date.items():
-                        for campaign_id in apply_to_campaign_ids:
-                            upsert_metrics(conn, campaign_id, provider, d, m)
-                            record_import_file(conn, campaign_id, provider, msg.get('Message-Id', ''), subj, att_name, d)
-                            IMPORTED += 1
-
-        # 1) покампанийные биндинги
-        for campaign_id, provider, subj_pat, subj_mode, fname_pat, fname_mode, from_email in camp_bindings:
-            run_pass(scope=f"campaign:{campaign_id}",
-                     provider=provider,
-                     subj_pat=subj_pat,
-                     subj_mode=subj_mode,
-                     fname_pat=fname_pat,
-                     fname_mode=fname_mode,
-                     from_email=from_email,
-                     apply_to_campaign_ids=[int(campaign_id)])
-
-        # 2) групповые биндинги
-        for _id, group_id, provider, subj_pat, subj_mode, fname_pat, fname_mode, from_email in group_bindings:
-            members = get_group_members(conn, int(group_id))
-            if not members:
-                continue
-            run_pass(scope=f"group:{group_id}",
-                     provider=provider,
-                     subj_pat=subj_pat,
-                     subj_mode=subj_mode,
-                     fname_pat=fname_pat,
-                     fname_mode=fname_mode,
-                     from_email=from_email,
-                     apply_to_campaign_ids=members)
-
-        print(f"[DONE] messages matched: {SELECTED}, daily rows imported: {IMPORTED}")
-        return 0
+def main():
+    # метрики живут в logs/metrics/verifier_import.prom и подхватываются /metrics
+    metrics.TEXTFILE_DIR = Path(__file__).resolve().parent.parent / "logs" / "metrics"
+    metrics.restore_textfile("verifier_import")
+    try:
+        with metrics.job("verifier") as run:
+            rc = run_import()
+            if rc:
+                run.outcome = "error"
+        return rc
     finally:
-        try:
-            M.logout()
-        except Exception:
-            pass
+        metrics.write_textfile("verifier_import")
+
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,46 @@
+# scripts/yandex_bindings_from_config.py
+"""
+Одноразовый перенос ``yandex_campaigns`` из config.yaml в таблицу
+campaign_yandex (yandex_metrics.db). Обратная операция к
+build_config_from_db.py; запускать можно сколько угодно раз (upsert).
+
+    python scripts/yandex_bindings_from_config.py            # перенести
+    python scripts/yandex_bindings_from_config.py --strip    # + убрать ключ из config.yaml
+"""
+import argparse
+import os
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from app.services import config_store, yandex_bindings  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Move yandex_campaigns from config.yaml into campaign_yandex")
+    ap.add_argument("--db", default=yandex_bindings.db_path(), help="yandex_metrics.db path")
+    ap.add_argument("--strip", action="store_true", help="remove yandex_campaigns from config.yaml afterwards")
+    args = ap.parse_args()
+
+    items = config_store.snapshot().get_list("yandex_campaigns")
+    conn = yandex_bindings.connect(args.db)
+    try:
+        n = yandex_bindings.import_from_config(items, conn)
+        total = len(yandex_bindings.list_enabled(conn))
+    finally:
+        conn.close()
+    print(f"imported {n} of {len(items)} yaml bindings; enabled in DB: {total}")
+
+    if args.strip and items:
+        cfg = config_store.load_raw()
+        cfg.pop("yandex_campaigns", None)
+        config_store.save_raw(cfg)
+        print("yandex_campaigns removed from config.yaml")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
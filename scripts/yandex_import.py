@@ -1,31 +1,60 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-inlab_import7.py
+yandex_import.py
 ----------------
-Вариант №7 с фиксами + расширенный лог:
-- Поиск писем: UTF-8 + quoted bytes (FROM + SINCE + HEADER Subject <yname>).
-- Извлечение вложений «цепко»: .xlsx по имени ИЛИ по MIME, а также .xlsx из .zip.
-- Дедуп перенесён ПОСЛЕ выбора вложения и идёт по паре (message_id, attachment_name),
-  чтобы старые записи с attachment_name=NULL не блокировали загрузку файлов.
-- Независимость от текущего каталога: config.yaml и БД ищутся относительно расположения этого скрипта.
-- Подробный лог по шагам: конфиг, кампании, выбор ящика, поиск писем, тема, фильтры, вложения, парсинг.
-
-Включить подробный лог по частям письма: YANDEX_IMPORT_DEBUG=1
+Импорт ежедневных отчётов Яндекс.Метрики («Отчёт «<name>» за DD.MM.YYYY»)
+из IMAP в yandex_metrics.db.
+
+Один проход на ящик, а не на кампанию:
+- SEARCH FROM+SINCE по окну дат (одна команда на ящик);
+- UID FETCH (ENVELOPE BODYSTRUCTURE) пачками — темы сверяются со всеми
+  привязками ящика в памяти, полные письма не скачиваются;
+- дедуп по (message_id, attachment_name) ДО скачивания — имя вложения уже
+  известно из BODYSTRUCTURE;
+- BODY.PEEK[section] только выбранного .xlsx (или .zip с .xlsx внутри).
+Несколько кампаний с одним yandex_name получают метрики из одного файла.
+
+Ящики обрабатываются параллельно через пул IMAP-соединений (``--workers``,
+по умолчанию ``imap.pool_size`` или 4); разбор XLSX и запись в SQLite идут в
+отдельном потоке внахлёст со скачиванием (app/services/imap_pool.py).
+В итоге печатается скорость: сообщений/с и КиБ/с.
+
+Заменяет прежние варианты yandex_import2..8 / 6_fast / 7_fix / _month
+(месячное окно — ``--month``).
+
+Повторные запуски инкрементальны: для каждого ящика хранится контрольная
+точка UIDVALIDITY + последний UID (app/services/imap_sync.py), и ищутся
+только новые письма. Окно дат работает при первом запуске, при смене
+UIDVALIDITY или набора привязок, а также с ``--full``/``--days``/``--month``.
+
+    python scripts/yandex_import.py [--days 35] [--month] [--full] [--workers 4]
+
+Включить подробный лог: YANDEX_IMPORT_DEBUG=1
 """
 
+import argparse
 import os
-import imaplib
-import email
+import sys
 import io
 import yaml
+import openpyxl
 import sqlite3
 import datetime
 import re
-import pandas as pd
 import zipfile
-from email.header import decode_header, make_header
-from email import policy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# пакет app (метрики) — из корня проекта
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from app.services import imap_sync, metrics, yandex_bindings  # noqa: E402
+from app.services.imap_pool import DEFAULT_POOL_SIZE, IMAPPool, ImportStats, ParsePipeline  # noqa: E402
+from app.services.imap_utils import (  # noqa: E402
+    chunked, decode_part, parse_bodystructure, parse_envelope,
+)
 
 # ------------ Настройки / константы ------------
 DEBUG = os.getenv('YANDEX_IMPORT_DEBUG', '0') == '1'
@@ -45,15 +74,6 @@ def dprint(*args, **kwargs):
         print(*args, **kwargs)
 
 
-def dec_header(s: str) -> str:
-    if not s:
-        return ""
-    try:
-        return str(make_header(decode_header(s)))
-    except Exception:
-        return s
-
-
 def ru_date_to_date(s: str) -> datetime.date:
     return datetime.datetime.strptime(s, "%d.%m.%Y").date()
 
@@ -63,82 +83,101 @@ def parse_report_date_from_header(v):
     return datetime.datetime.strptime(m.group(2), "%Y-%m-%d").date() if m else None
 
 
+HEADER_ROW = 5        # строка заголовка колонок (1-based); 6-я — «Итого и средние»
+FIRST_DATA_ROW = 7
+NUM_COLS = ('Визиты', 'Посетители', 'Отказы', 'Глубина просмотра')
+# Колонка времени может называться по-разному или отсутствовать
+TIME_COLS = ('Время на сайте', 'Среднее время на сайте', 'Среднее время на сайте, сек')
+MAX_XLSX_BYTES = 64 * 1024 * 1024   # больше из архива не распаковываем
+
+
+def _num(v) -> float:
+    if v is None or isinstance(v, bool):
+        return 0.0
+    if isinstance(v, (int, float)):
+        return float(v) if v == v else 0.0
+    try:
+        return float(str(v).strip())
+    except ValueError:
+        return 0.0
+
+
+def _cell(row, i):
+    return row[i] if i is not None and i < len(row) else None
+
+
+def t2s(v) -> float:
+    s = str(v)
+    if ":" in s:
+        try:
+            h, m, s0 = [int(x) for x in s.split(":")]
+            return float(h * 3600 + m * 60 + s0)
+        except Exception:
+            return 0.0
+    try:
+        return float(v)
+    except Exception:
+        return 0.0
+
+
 def parse_xlsx(b):
-    """Парсит .xlsx‑отчёт Яндекс.Метрики. Возвращает (report_date, metrics_dict|None)."""
+    """
+    Парсит .xlsx‑отчёт Яндекс.Метрики. Возвращает (report_date, metrics_dict|None).
+
+    Один потоковый проход openpyxl read_only по первому листу: дата отчёта
+    из A1, заголовок из 5-й строки, данные с 7-й; из строк берутся только
+    нужные колонки и сразу складываются в суммы — память не растёт с
+    размером отчёта.
+    """
     try:
-        df = pd.read_excel(io.BytesIO(b))
+        wb = openpyxl.load_workbook(io.BytesIO(b), read_only=True, data_only=True)
     except Exception as e:
         print("parse_xlsx: failed to read excel:", e)
         return None, None
 
-    if len(df) < 6:
-        print("parse_xlsx: dataframe too short, rows:", len(df))
-        return None, None
-
-    header = df.iloc[3].tolist()
-    rows = df.iloc[5:].copy()
-    rows.columns = header
-
     d = None
+    cols = {}
+    time_col = None
+    n_rows = 0
+    visits = visitors = bounce_w = depth_w = time_w = 0.0
     try:
-        import openpyxl
-        wb = openpyxl.load_workbook(io.BytesIO(b), data_only=True)
-        d = parse_report_date_from_header(wb.active.cell(1, 1).value)
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        for i, row in enumerate(ws.iter_rows(values_only=True), start=1):
+            if i == 1:
+                d = parse_report_date_from_header(row[0] if row else None)
+            elif i == HEADER_ROW:
+                header = [str(v).strip() if v is not None else None for v in row]
+                cols = {c: header.index(c) for c in NUM_COLS if c in header}
+                time_col = next((header.index(c) for c in TIME_COLS if c in header), None)
+            elif i >= FIRST_DATA_ROW:
+                if not any(v is not None for v in row):
+                    continue
+                n_rows += 1
+                v = _num(_cell(row, cols.get('Визиты')))
+                visits += v
+                visitors += _num(_cell(row, cols.get('Посетители')))
+                bounce_w += _num(_cell(row, cols.get('Отказы'))) * v
+                depth_w += _num(_cell(row, cols.get('Глубина просмотра'))) * v
+                if time_col is not None:
+                    time_w += t2s(_cell(row, time_col)) * v
     except Exception as e:
-        dprint("parse_xlsx: openpyxl header parse error:", e)
+        print("parse_xlsx: failed to read excel:", e)
+        return None, None
+    finally:
+        wb.close()
 
-    if rows.empty:
-        print("parse_xlsx: rows empty after slicing (no data)")
+    if not n_rows:
+        print("parse_xlsx: no data rows after the header")
         return d, None
 
-    # --- ключевой фикс: всегда возвращаем Series длиной len(rows)
-    def as_num(col):
-        if col in rows.columns:
-            s = rows[col]
-        else:
-            s = pd.Series([0.0] * len(rows), index=rows.index)
-        s = pd.to_numeric(s, errors='coerce')
-        return s.fillna(0.0).astype(float)
-
-    rows.loc[:, 'Визиты'] = as_num('Визиты')
-    rows.loc[:, 'Посетители'] = as_num('Посетители')
-    rows.loc[:, 'Отказы'] = as_num('Отказы')
-    rows.loc[:, 'Глубина просмотра'] = as_num('Глубина просмотра')
-
-    visits = float(rows['Визиты'].sum())
     if visits <= 0:
         print("parse_xlsx: visits sum <= 0, visits=", visits)
         return d, None
 
-    visitors = float(rows['Посетители'].sum())
-    bounce = float((rows['Отказы'] * rows['Визиты']).sum() / visits)
-    depth = float((rows['Глубина просмотра'] * rows['Визиты']).sum() / visits)
-
-    def t2s(v) -> float:
-        s = str(v)
-        if ":" in s:
-            try:
-                h, m, s0 = [int(x) for x in s.split(":")]
-                return float(h * 3600 + m * 60 + s0)
-            except Exception:
-                return 0.0
-        try:
-            return float(v)
-        except Exception:
-            return 0.0
-
-    # Колонка времени может называться по-разному или отсутствовать
-    time_candidates = [
-        'Время на сайте',
-        'Среднее время на сайте',
-        'Среднее время на сайте, сек'
-    ]
-    time_col = next((c for c in time_candidates if c in rows.columns), None)
-    if time_col is None:
-        avg = 0.0
-    else:
-        time_series = rows[time_col].apply(t2s)
-        avg = float((time_series * rows['Визиты']).sum() / visits)
+    bounce = bounce_w / visits
+    depth = depth_w / visits
+    avg = time_w / visits
 
     print(
         "parse_xlsx: metrics ->",
@@ -167,114 +206,323 @@ def imap_since_date(d: datetime.date) -> str:
     return f"{d.day:02d}-{months[d.month - 1]}-{d.year}"
 
 
-def imap_utf8_quoted_bytes(s: str) -> bytes:
-    """Готовим корректный quoted-string и кодируем в UTF-8."""
-    s = (s or "").replace('\\', '\\\\').replace('"', '\\"')
-    return f'"{s}"'.encode('utf-8')
-
-
-def normalize_filename(part) -> str | None:
-    """Пытаемся получить имя вложения из разных источников заголовков."""
-    fn = part.get_filename()
-    if not fn:
-        fn = part.get_param('name', header='content-type')
-    if not fn:
-        for header in ('content-disposition', 'content-type'):
-            for key in ('filename*', 'name*'):
-                val = part.get_param(key, header=header)
-                if val:
-                    fn = val
-                    break
-            if fn:
-                break
-    if not fn:
+XLSX_MIMES = {'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+ZIP_MIMES = {'application/zip', 'application/x-zip-compressed'}
+HEADER_BATCH = 200   # писем в одном UID FETCH (ENVELOPE BODYSTRUCTURE)
+BODY_BATCH = 20      # вложений в одном UID FETCH BODY.PEEK[...] — ограничивает память
+
+
+def search_window(days: int, month: bool):
+    """(since, before|None): последние ``days`` дней или текущий календарный месяц."""
+    today = datetime.date.today()
+    if not month:
+        return today - datetime.timedelta(days=days), None
+    first = today.replace(day=1)
+    nxt = datetime.date(first.year + (first.month == 12), first.month % 12 + 1, 1)
+    return first, nxt
+
+
+def is_xlsx(part) -> bool:
+    return bool(part.filename and part.filename.lower().endswith('.xlsx')) or part.ctype in XLSX_MIMES
+
+
+def is_zip(part) -> bool:
+    return bool(part.filename and part.filename.lower().endswith('.zip')) or part.ctype in ZIP_MIMES
+
+
+def choose_attachment(items):
+    """«таблиц*» в имени приоритетнее, иначе самый большой. items: [(name, size, payload)]."""
+    if not items:
         return None
-    try:
-        return str(make_header(decode_header(fn)))
-    except Exception:
-        return str(fn)
+    items = sorted(items, key=lambda x: x[1], reverse=True)
+    for it in items:
+        if it[0] and re.search(r'таблиц', it[0], flags=re.IGNORECASE):
+            return it
+    return items[0]
 
 
-def iter_xlsx_blobs(msg):
+def iter_zip_xlsx(zip_name, raw: bytes):
     """
-    Ищем .xlsx в письме:
-    - по имени файла (.xlsx),
-    - по MIME application/vnd.openxmlformats-officedocument.spreadsheetml.sheet (даже без имени),
-    - внутри .zip архивов.
-    Возвращаем кортежи (display_name, size, bytes).
+    .xlsx внутри архива без распаковки: (display_name, size, ZipInfo) из
+    центрального каталога. Распаковывается потом только выбранный файл.
     """
-    XLSX_MIMES = {
-        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    }
+    try:
+        with zipfile.ZipFile(io.BytesIO(raw)) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith('.xlsx'):
+                    yield (f"{zip_name}:{info.filename}" if zip_name else info.filename, info.file_size, info)
+    except Exception as e:
+        dprint("   zip parse error:", e)
 
-    for part in msg.walk():
-        if part.get_content_maintype() == "multipart":
-            continue
 
-        ctype = part.get_content_type()
-        dispo = part.get_content_disposition()
-        fn = normalize_filename(part)
-        raw = part.get_payload(decode=True) or b''
+def read_zip_member(raw: bytes, info, limit: int = MAX_XLSX_BYTES):
+    """Распаковать один файл архива; больше ``limit`` — None (защита от zip-бомб)."""
+    if info.file_size > limit:
+        print(f"   zip member {info.filename!r} is {info.file_size} bytes, over the {limit} limit; skipped")
+        return None
+    with zipfile.ZipFile(io.BytesIO(raw)) as zf, zf.open(info) as f:
+        blob = f.read(limit + 1)
+    return blob if len(blob) <= limit else None
+
 
-        dprint("  part:", ctype, dispo, fn, len(raw))
+class Match:
+    """Письмо, чья тема совпала с привязкой; вложение ещё не скачано."""
+    __slots__ = ("uid", "env", "cids", "rdate_subj", "parts", "zipped")
 
-        # 1) .xlsx по имени
-        if fn and fn.lower().endswith('.xlsx'):
-            dprint("   -> xlsx by filename:", fn, "size=", len(raw))
-            yield (fn, len(raw), raw)
-            continue
+    def __init__(self, uid, env, cids, rdate_subj, parts, zipped):
+        self.uid = uid
+        self.env = env
+        self.cids = cids
+        self.rdate_subj = rdate_subj
+        self.parts = parts      # выбранная .xlsx-часть или все .zip-части
+        self.zipped = zipped
 
-        # 2) .xlsx по MIME — даже без имени
-        if ctype in XLSX_MIMES and raw:
-            disp_name = fn or "attachment.xlsx"
-            dprint("   -> xlsx by MIME:", disp_name, "size=", len(raw))
-            yield (disp_name, len(raw), raw)
+
+def group_by_mailbox(camps):
+    """{mailbox: {yandex_name.lower(): [campaign_id, ...]}} — несколько кампаний могут делить отчёт."""
+    out = {}
+    for c in camps:
+        name = str(c.get("yandex_name") or "").strip()
+        if not name:
             continue
+        mbox = str(c.get("mailbox", "INBOX")).strip() or "INBOX"
+        out.setdefault(mbox, {}).setdefault(name.lower(), []).append(int(c["id"]))
+    return out
 
-        # 3) .zip с .xlsx внутри
-        if (fn and fn.lower().endswith('.zip')) or ctype in (
-            'application/zip',
-            'application/x-zip-compressed'
-        ):
-            try:
-                with zipfile.ZipFile(io.BytesIO(raw)) as zf:
-                    for n in zf.namelist():
-                        if n.lower().endswith('.xlsx'):
-                            blob = zf.read(n)
-                            disp_name = f"{fn}:{n}" if fn else n
-                            dprint("   -> xlsx in zip:", disp_name, "size=", len(blob))
-                            yield (disp_name, len(blob), blob)
-            except Exception as e:
-                dprint("   zip parse error:", e)
 
+def is_duplicate(cur, mid, fn) -> bool:
+    return bool(mid) and cur.execute(
+        "SELECT 1 FROM yandex_import_files WHERE message_id=? AND attachment_name=?",
+        (mid, fn)
+    ).fetchone() is not None
 
-def main():
+
+def is_duplicate_zip(cur, mid, zip_name) -> bool:
+    prefix = zip_name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + ':'
+    return bool(mid) and cur.execute(
+        "SELECT 1 FROM yandex_import_files WHERE message_id=? AND attachment_name LIKE ? ESCAPE '\\'",
+        (mid, prefix + '%')
+    ).fetchone() is not None
+
+
+def record_file(cur, cid, mid, subj, fn, rdate):
+    cur.execute(
+        """INSERT OR IGNORE INTO yandex_import_files
+           (campaign_id, message_id, subject, attachment_name,
+            report_date, processed_at)
+           VALUES (?,?,?,?,?,?)""",
+        (
+            cid, mid, subj, fn,
+            str(rdate) if rdate else None,
+            datetime.datetime.now(datetime.timezone.utc).isoformat()
+        )
+    )
+
+
+def store_attachment(con, match, fn, blob, stats):
+    """
+    Задание для потока-разборщика: разобрать .xlsx и записать метрики для
+    всех кампаний письма. ``con`` — соединение самого разборщика.
+    """
+    cur = con.cursor()
+    mid, subj = match.env.message_id, match.env.subject
+    d_file, vals = parse_xlsx(blob)
+    rdate = d_file or match.rdate_subj
+    print(f"   [uid={match.uid}] {fn!r}: report_date_from_file={d_file}, rdate_final={rdate}")
+
+    if vals and rdate:
+        cur.executemany(
+            """INSERT OR REPLACE INTO yandex_daily_metrics
+               (campaign_id, report_date, visits, visitors,
+                bounce_rate, page_depth, avg_time_sec)
+               VALUES (?,?,?,?,?,?,?)""",
+            [
+                (cid, str(rdate), vals['visits'], vals['visitors'],
+                 vals['bounce_rate'], vals['page_depth'], vals['avg_time_sec'])
+                for cid in match.cids
+            ]
+        )
+        stats.add("rows", len(match.cids))
+        stats.touched(match.cids)
+        metrics.ROWS_INGESTED.labels("yandex").inc(len(match.cids))
+    else:
+        print(f"   -> no metrics or no date, skip metrics insert (metrics={vals}, rdate={rdate})")
+
+    record_file(cur, match.cids[0], mid, subj, fn, rdate)
+    con.commit()
+    stats.add("files")
+
+
+def store_zip(con, match, zip_name, raw, stats):
+    """Задание для разборщика: выбрать .xlsx внутри архива, проверить дедуп и записать."""
+    chosen = choose_attachment(list(iter_zip_xlsx(zip_name, raw)))
+    if not chosen:
+        return
+    fn, _, info = chosen
+    if is_duplicate(con.cursor(), match.env.message_id, fn):
+        stats.add("dups")
+        return
+    inner = read_zip_member(raw, info)
+    if inner is None:
+        return
+    store_attachment(con, match, fn, inner, stats)
+
+
+def record_empty(con, cid, mid, subj):
+    # Логируем факт письма без xlsx, но не блокируем будущую обработку
+    record_file(con.cursor(), cid, mid, subj, None, None)
+    con.commit()
+
+
+def save_checkpoint(con, sync, last_uid):
+    imap_sync.save(con, sync, last_uid)
+
+
+def scan_mailbox(client, con, pipeline, account, mbox, names, since_date, before_date, stats, full=False):
+    """
+    Один проход по ящику на все привязанные к нему кампании:
+    SEARCH FROM+SINCE -> ENVELOPE/BODYSTRUCTURE пачками -> сопоставление
+    темы со всеми именами в памяти -> BODY.PEEK[section] только выбранных
+    вложений (одна команда на пачку писем с одинаковой секцией).
+
+    Если для ящика есть контрольная точка (imap_sync_state) с тем же
+    UIDVALIDITY и теми же привязками — ищутся только письма с UID выше неё.
+
+    Работает в сетевом потоке: ``con`` — его соединение только для чтения
+    (план синхронизации, дедуп), разбор и запись уходят в ``pipeline``.
+    """
+    cur = con.cursor()
+    print(f"\n=== Mailbox {mbox!r}: {sum(len(v) for v in names.values())} campaigns, {len(names)} report names ===")
+    try:
+        info = client.select_folder(mbox, readonly=True)
+    except Exception as e:
+        # ящик не должен молча выпасть из импорта: run_import посчитает его упавшим
+        raise RuntimeError(f"SELECT {mbox!r} failed: {e}") from e
+    dprint(f"[{mbox}] SELECT -> {info}")
+
+    sync = imap_sync.plan(con, account, mbox, "yandex", info, imap_sync.fingerprint(names), full=full)
+    print(f"[{mbox}] sync: {sync.reason}")
+    if sync.up_to_date:
+        print(f"[{mbox}] no new messages (UIDNEXT={sync.uidnext})")
+        return
+
+    criteria = sync.criteria('FROM', f'"{FROM_ADDR}"', since=imap_since_date(since_date))
+    if before_date and not sync.incremental:
+        criteria += ['BEFORE', imap_since_date(before_date)]
+    uids = sync.new_uids(client.uid_search(*criteria))
+    print(f"[{mbox}] SEARCH {' '.join(map(str, criteria))} -> {len(uids)} messages")
+
+    # --- 1) только заголовки и структура ---
+    matches = []
+    matched = unmatched = 0
+    for batch in chunked(uids, HEADER_BATCH):
+        fetched = client.uid_fetch(batch, '(UID ENVELOPE BODYSTRUCTURE)')
+        stats.fetched(len(fetched), 0)
+        for uid in sorted(fetched):
+            attrs = fetched[uid]
+            env = parse_envelope(attrs.get('ENVELOPE'))
+            m = SUBJ_RE.search(env.subject)
+            cids = names.get(m.group(1).strip().lower()) if m else None
+            if not cids:
+                unmatched += 1
+                dprint(f"  uid={uid} skip: {env.subject!r}")
+                continue
+            parts = parse_bodystructure(attrs.get('BODYSTRUCTURE'))
+            xlsx = [p for p in parts if is_xlsx(p)]
+            zips = [p for p in parts if not is_xlsx(p) and is_zip(p)]
+            rdate_subj = ru_date_to_date(m.group(2))
+            stats.add("matched")
+            matched += 1
+            print(f"  [{mbox}] uid={uid} {env.subject!r} -> campaigns={cids} xlsx={[p.filename for p in xlsx]} zip={[p.filename for p in zips]}")
+
+            if xlsx:
+                fn, _, part = choose_attachment([(p.filename or "attachment.xlsx", p.size, p) for p in xlsx])
+                # дедуп до скачивания: имя вложения известно из BODYSTRUCTURE
+                if is_duplicate(cur, env.message_id, fn):
+                    dprint(f"   -> skip duplicate {env.message_id!r} {fn!r}")
+                    stats.add("dups")
+                    continue
+                matches.append(Match(uid, env, cids, rdate_subj, [part], False))
+            elif zips:
+                # из архива пишется "<zip>:<xlsx>" — уже загруженный архив узнаём по префиксу
+                if all(p.filename and is_duplicate_zip(cur, env.message_id, p.filename) for p in zips):
+                    stats.add("dups")
+                    continue
+                matches.append(Match(uid, env, cids, rdate_subj, zips, True))
+            else:
+                print(f"  [{mbox}] uid={uid} -> no xlsx attachments found, logging empty import_files row")
+                pipeline.submit(record_empty, cids[0], env.message_id, env.subject, group=mbox)
+    print(f"[{mbox}] headers: matched={matched} unmatched={unmatched}, to download={len(matches)}")
+
+    # --- 2) только выбранные вложения; разбор идёт параллельно со скачиванием ---
+    by_section = {}
+    for mt in matches:
+        for part in mt.parts:
+            by_section.setdefault(part.section, []).append((mt, part))
+
+    for section, items in by_section.items():
+        for batch in chunked(items, BODY_BATCH):
+            bodies = client.fetch_sections([mt.uid for mt, _ in batch], section)
+            stats.fetched(0, sum(len(b) for b in bodies.values()))
+            for mt, part in batch:
+                blob = decode_part(bodies.get(mt.uid) or b'', part.encoding)
+                if mt.zipped:
+                    pipeline.submit(store_zip, mt, part.filename, blob, stats, group=mbox)
+                else:
+                    pipeline.submit(store_attachment, mt, part.filename or "attachment.xlsx", blob, stats,
+                                    group=mbox)
+
+    # задания выполняются по порядку: точка сохранится после записи всех вложений ящика
+    # и только если ни одно из них не упало
+    pipeline.submit(save_checkpoint, sync, sync.high_water(uids), group=mbox, only_if_ok=True)
+
+
+def run_import(days: int = SEARCH_DAYS, month: bool = False, full: bool = False, workers: int = 0,
+               mailboxes=None):
+    """Импорт по всем ящикам привязок (или только ``mailboxes``). Возвращает ImportStats."""
     # --- Определяем пути относительно файла ---
     base_dir = os.path.dirname(os.path.abspath(__file__))
     root_dir = os.path.abspath(os.path.join(base_dir, '..'))
     config_path = os.getenv('INLAB_CONFIG', os.path.join(root_dir, 'config.yaml'))
     db_path = os.getenv('INLAB_DB', os.path.join(root_dir, 'yandex_metrics.db'))
+    since_date, before_date = search_window(days, month)
 
     print("=== YANDEX IMPORT START ===")
-    print("BASE DIR:", base_dir)
     print("ROOT DIR:", root_dir)
     print("CONFIG PATH:", config_path)
     print("DB PATH:", db_path)
-    print("SEARCH_DAYS:", SEARCH_DAYS, "FROM_ADDR:", FROM_ADDR)
+    print("WINDOW:", since_date, "..", before_date or "now", "FROM_ADDR:", FROM_ADDR,
+          "(full resync)" if full else "(window applies to mailboxes without checkpoint)")
     print("DEBUG (YANDEX_IMPORT_DEBUG):", DEBUG)
 
     with open(config_path, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
 
     imap_cfg = cfg["imap"]
-    camps = cfg.get("yandex_campaigns") or []
+
+    con = sqlite3.connect(db_path)
+    cur = con.cursor()
+
+    # привязки кампаний — из таблицы campaign_yandex; yandex_campaigns из этого
+    # config.yaml переносятся в неё при первом запуске (один раз)
+    yaml_camps = cfg.get("yandex_campaigns") or []
+    yandex_bindings.migrate_from_config(yaml_camps, con)
+    camps = yandex_bindings.list_enabled(con)
+    camps_src = "campaign_yandex"
+    known = {c["id"] for c in camps} | {int(r[0]) for r in con.execute("SELECT campaign_id FROM campaign_yandex")}
+    ignored = [c for c in yaml_camps if isinstance(c, dict) and str(c.get("id")).isdigit() and int(c["id"]) not in known]
+    if ignored:
+        print(f"WARNING: {len(ignored)} yandex_campaigns in config.yaml are not in campaign_yandex and are ignored "
+              f"(add them on the directory page or run scripts/yandex_bindings_from_config.py):")
+        for c in ignored:
+            print("  - id=", c.get("id"), "yandex_name=", repr(c.get("yandex_name")))
 
     print("IMAP CONFIG:",
           "host=", imap_cfg.get("host", "imap.yandex.com"),
           "port=", imap_cfg.get("port", 993),
           "user=", imap_cfg.get("user"))
 
-    print("Yandex campaigns from config (yandex_campaigns):")
+    print(f"Yandex campaigns from {camps_src}:")
     if not camps:
         print("  (empty list)")
     for c in camps:
@@ -282,9 +530,6 @@ def main():
               "yandex_name=", repr(c.get("yandex_name")),
               "mailbox=", repr(c.get("mailbox", "INBOX")))
 
-    con = sqlite3.connect(db_path)
-    cur = con.cursor()
-
     cur.execute(
         """CREATE TABLE IF NOT EXISTS yandex_daily_metrics(
            campaign_id INTEGER,
@@ -309,194 +554,86 @@ def main():
            UNIQUE(message_id, attachment_name)
          );"""
     )
+    imap_sync.ensure_schema(con)
     con.commit()
+    con.close()
+
+    boxes = group_by_mailbox(camps)
+    if mailboxes is not None:
+        boxes = {m: n for m, n in boxes.items() if m in set(mailboxes)}
+    workers = max(1, min(int(workers or imap_cfg.get("pool_size") or DEFAULT_POOL_SIZE), len(boxes) or 1))
+    account = imap_sync.account_key(imap_cfg["user"], imap_cfg.get("host", "imap.yandex.com"))
+    print(f"MAILBOXES: {len(boxes)}, IMAP connections: {workers}")
 
-    M = imaplib.IMAP4_SSL(
+    stats = ImportStats("yandex")
+    pipeline = ParsePipeline(setup=lambda: sqlite3.connect(db_path), teardown=lambda c: c.close())
+    pool = IMAPPool(
         imap_cfg.get("host", "imap.yandex.com"),
-        int(imap_cfg.get("port", 993))
+        int(imap_cfg.get("port", 993)),
+        imap_cfg["user"], imap_cfg["password"],
+        ssl=bool(imap_cfg.get("ssl", True)),
+        size=workers,
+        two_factor=imap_cfg.get("two_factor"),
     )
-    M.login(imap_cfg["user"], imap_cfg["password"])
-    print("IMAP login OK")
-
-    rows_total = 0
-    files_total = 0
-    msgs_total = 0
-
-    for c in camps:
-        yname = str(c["yandex_name"]).strip()
-        cid = int(c["id"])
-        mbox = str(c.get("mailbox", "INBOX")).strip() or "INBOX"
-
-        print(f"\n=== Campaign id={cid} yandex_name={yname!r} mailbox={mbox!r} ===")
 
+    def task(mbox, names):
+        reader = sqlite3.connect(db_path)
         try:
-            t, _ = M.select(mbox, readonly=True)
-        except Exception as e:
-            print(f"[{yname}] ERROR on SELECT {mbox!r}: {e}")
-            continue
-
-        print(f"[{yname}] SELECT mailbox -> {t}")
-        if t != "OK":
-            print(f"[{yname}] mailbox FAIL: {mbox}")
-            continue
+            with pool.connection() as client:
+                scan_mailbox(client, reader, pipeline, account, mbox, names,
+                             since_date, before_date, stats, full=full)
+        finally:
+            reader.close()
 
-        since_date = datetime.date.today() - datetime.timedelta(days=SEARCH_DAYS)
-        since_imap = imap_since_date(since_date).encode('ascii')
-
-        from_q = imap_utf8_quoted_bytes(FROM_ADDR)
-        subj_q = imap_utf8_quoted_bytes(yname)
-
-        print(f"[{yname}] SEARCH UTF-8 since={since_date} from={FROM_ADDR} subj={yname!r}")
-        try:
-            typ, data = M.search(
-                'UTF-8',
-                b'FROM', from_q,
-                b'SINCE', since_imap,
-                b'HEADER', b'Subject', subj_q
-            )
-            print(f"[{yname}] SEARCH UTF-8 result typ={typ} raw={data}")
-            if typ != 'OK':
-                raise imaplib.IMAP4.error('SEARCH failed')
-        except imaplib.IMAP4.error as e:
-            print(f"[{yname}] SEARCH UTF-8 failed ({e!s}), fallback to FROM+SINCE")
-            typ, data = M.search(
-                None,
-                'FROM', FROM_ADDR,
-                'SINCE', imap_since_date(since_date)
-            )
-            print(f"[{yname}] SEARCH fallback result typ={typ} raw={data}")
-
-        uids = data[0].split() if (typ == 'OK' and data and data[0]) else []
-        print(f"[{yname}] matched by search: {len(uids)} in {mbox}")
-
-        for uid in uids:
-            uid_str = uid.decode(errors='ignore') if isinstance(uid, bytes) else str(uid)
-            print(f"[{yname}] FETCH uid={uid_str}")
-            t, md = M.fetch(uid, '(RFC822)')
-            if t != 'OK' or not md or not md[0]:
-                print(f"  -> fetch FAILED: t={t}, md={md}")
-                continue
-
-            msg = email.message_from_bytes(md[0][1], policy=policy.default)
-            subj = dec_header(msg.get('Subject', ''))
-            print(f"  subject={subj!r}")
-
-            m = SUBJ_RE.search(subj)
-            if not m:
-                print("   -> skip: subject regex SUBJ_RE not matched")
-                continue
-
-            name = m.group(1).strip()
-            if name.lower() != yname.lower():
-                print(
-                    f"   -> skip: name mismatch in subject: "
-                    f"inner={name!r} vs yandex_name={yname!r}"
-                )
-                continue
-
-            rdate_subj = ru_date_to_date(m.group(2))
-            print(f"   subject OK, report_date_from_subject={rdate_subj}")
-            msgs_total += 1
-            mid = msg.get('Message-ID')
-            print(f"   Message-ID={mid!r}")
-
-            # --- Ищем xlsx (включая внутри .zip) ---
-            xlsx = list(iter_xlsx_blobs(msg))
-            print(f"   xlsx candidates: {[n for (n, _, __) in xlsx]}")
-
-            if not xlsx:
-                print("   -> no xlsx attachments found, logging empty import_files row")
-                # Логируем факт письма без xlsx, но не блокируем будущую обработку
-                cur.execute(
-                    """INSERT OR IGNORE INTO yandex_import_files
-                       (campaign_id, message_id, subject, attachment_name,
-                        report_date, processed_at)
-                       VALUES (?,?,?,?,?,?)""",
-                    (
-                        cid, mid, subj, None, None,
-                        datetime.datetime.now(datetime.timezone.utc).isoformat()
-                    )
-                )
-                con.commit()
-                continue
-
-            # «таблиц*» приоритетнее, иначе берём самый большой файл
-            xlsx.sort(key=lambda x: x[1], reverse=True)
-            chosen = None
-            for fn, sz, bl in xlsx:
-                if fn and re.search(r'таблиц', fn, flags=re.IGNORECASE):
-                    chosen = (fn, sz, bl)
-                    break
-            if not chosen:
-                chosen = xlsx[0]
-
-            fn, sz, blob = chosen
-            print(f"   chosen attachment: {fn!r}, size={sz}")
-
-            # --- ДЕДУП СЕЙЧАС: по паре (message_id, attachment_name) ---
-            if mid and cur.execute(
-                "SELECT 1 FROM yandex_import_files "
-                "WHERE message_id=? AND attachment_name=?",
-                (mid, fn)
-            ).fetchone():
-                print(
-                    f"   -> skip duplicate attachment "
-                    f"for message_id={mid!r}, attachment_name={fn!r}"
-                )
-                continue
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imap") as ex:
+            futures = {ex.submit(task, mbox, names): mbox for mbox, names in boxes.items()}
+            for fut in as_completed(futures):
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"[{futures[fut]}] ERROR: {e}")
+                    failed.append(e)
+    finally:
+        # pool первым: close() пайплайна поднимает ошибку его setup()
+        pool.close()
+        pipeline.close()
 
-            d_file, metrics = parse_xlsx(blob)
-            rdate = d_file or rdate_subj
-            print(
-                f"   parsed_xlsx -> report_date_from_file={d_file}, "
-                f"rdate_final={rdate}, metrics={metrics}"
-            )
-
-            if metrics and rdate:
-                print(
-                    f"   -> saving metrics: cid={cid}, date={rdate}, "
-                    f"visits={metrics['visits']}, visitors={metrics['visitors']}"
-                )
-                cur.execute(
-                    """INSERT OR REPLACE INTO yandex_daily_metrics
-                       (campaign_id, report_date, visits, visitors,
-                        bounce_rate, page_depth, avg_time_sec)
-                       VALUES (?,?,?,?,?,?,?)""",
-                    (
-                        cid, str(rdate), metrics['visits'], metrics['visitors'],
-                        metrics['bounce_rate'], metrics['page_depth'],
-                        metrics['avg_time_sec']
-                    )
-                )
-                rows_total += 1
-            else:
-                print(
-                    f"   -> no metrics or no date, skip metrics insert "
-                    f"(metrics={metrics}, rdate={rdate})"
-                )
-
-            cur.execute(
-                """INSERT OR IGNORE INTO yandex_import_files
-                   (campaign_id, message_id, subject, attachment_name,
-                    report_date, processed_at)
-                   VALUES (?,?,?,?,?,?)""",
-                (
-                    cid, mid, subj, fn,
-                    str(rdate) if rdate else None,
-                    datetime.datetime.now(datetime.timezone.utc).isoformat()
-                )
-            )
-            con.commit()
-            files_total += 1
-            print("   -> recorded import_files row")
-
-    M.logout()
     print(
-        f"\nSUMMARY: msgs={msgs_total}, files={files_total}, "
-        f"rows={rows_total}, db={db_path}"
+        f"\nSUMMARY: matched={stats['matched']}, files={stats['files']}, "
+        f"rows={stats['rows']}, duplicates={stats['dups']}, db={db_path}"
     )
-    con.close()
+    print(f"THROUGHPUT: {stats.rates()}; parse busy {pipeline.busy_sec:.1f}s, IMAP logins {pool.logins}")
     print("=== YANDEX IMPORT FINISHED ===")
+    if pipeline.errors:
+        print(f"PARSE ERRORS: {len(pipeline.errors)} in {sorted(pipeline.failed_groups)}; checkpoints kept")
+        failed.extend(pipeline.errors)
+    if failed:
+        # ни один ящик не должен молча выпасть из импорта: джоба считается упавшей
+        raise failed[0]
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Импорт отчётов Яндекс.Метрики из IMAP")
+    ap.add_argument("--days", type=int, default=None,
+                    help="окно поиска назад (по умолчанию YANDEX_IMPORT_DAYS или 35); задано явно — полный проход")
+    ap.add_argument("--month", action="store_true", help="только текущий календарный месяц (полный проход)")
+    ap.add_argument("--full", action="store_true", help="игнорировать контрольные точки UID и пройти окно дат заново")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="IMAP-соединений / ящиков параллельно (по умолчанию imap.pool_size или 4)")
+    args = ap.parse_args()
+    full = args.full or args.month or args.days is not None
+
+    # метрики живут в logs/metrics/yandex_import.prom и подхватываются /metrics
+    metrics.TEXTFILE_DIR = Path(ROOT_DIR) / "logs" / "metrics"
+    metrics.restore_textfile("yandex_import")
+    try:
+        with metrics.job("yandex"):
+            run_import(days=args.days or SEARCH_DAYS, month=args.month, full=full, workers=args.workers)
+    finally:
+        metrics.write_textfile("yandex_import")
 
 
 if __name__ == "__main__":